@@ -0,0 +1,36 @@
+"""Background tasks tests: tasks spawned with a key are waited for by the later readers of their data."""
+
+import asyncio
+
+import pytest
+
+from ya_gpt_bot.background.tasks import BackgroundTasks
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_wait_for_key():
+    """Waiting for a key returns once the tasks spawned with it finish, even failed ones, other tasks
+    are not waited for.
+    """
+    tasks = BackgroundTasks()
+    saved: list[str] = []
+    other = asyncio.Event()
+
+    async def save(text: str) -> None:
+        await asyncio.sleep(0.01)
+        saved.append(text)
+
+    async def fail() -> None:
+        raise ConnectionError("database is unavailable")
+
+    tasks.spawn(save("answer"), "save-1", key=("save_messages", 1))
+    tasks.spawn(fail(), "save-failing-1", key=("save_messages", 1))
+    tasks.spawn(other.wait(), "other", key=("save_messages", 2))
+    await tasks.wait_for(("save_messages", 1))
+    assert saved == ["answer"]
+    assert len(tasks) == 1
+    await tasks.wait_for(("save_messages", 3))
+    other.set()
+    await tasks.wait(1)
+    assert len(tasks) == 0
@@ -0,0 +1,72 @@
+"""Cached services tests: values read concurrently with an uncommitted change are not kept in the cache."""
+
+import asyncio
+
+import pytest
+
+from ya_gpt_bot.db.unit_of_work import UnitOfWork, current_unit
+from ya_gpt_bot.services.dtos import UserPreferences
+from ya_gpt_bot.services.impl.cached_user_preferences_service import CachedUserPreferencesService
+
+pytestmark = pytest.mark.asyncio
+
+
+class Connection:
+    """Connection making the pending temperature visible on commit."""
+
+    def __init__(self, store: "PreferencesStore"):
+        self.store = store
+
+    def in_transaction(self) -> bool:
+        """Transaction is always begun."""
+        return True
+
+    async def commit(self) -> None:
+        """Apply the pending change."""
+        if self.store.pending is not None:
+            self.store.temperature, self.store.pending = self.store.pending, None
+
+    async def rollback(self) -> None:
+        """Drop the pending change."""
+        self.store.pending = None
+
+    async def close(self) -> None:
+        """Nothing to close."""
+
+
+class PreferencesStore:
+    """Preferences service storing a temperature of the only user, changes are visible to others after commit."""
+
+    def __init__(self):
+        self.temperature = 0.5
+        self.pending: float | None = None
+        self.read = asyncio.Event()
+
+    async def connect(self) -> Connection:
+        """Return a new connection (the store acts as the engine of the unit of work)."""
+        return Connection(self)
+
+    async def get_preferences(self, _user_id: int) -> UserPreferences:
+        """Return committed preferences, the result is returned once `read` is set."""
+        temperature = self.temperature
+        await self.read.wait()
+        return UserPreferences(temperature)
+
+    async def set_temperature(self, _user_id: int, temperature: float) -> None:
+        """Change temperature in the transaction of the current unit of work."""
+        await current_unit().connection()
+        self.pending = temperature
+
+
+async def test_read_during_uncommitted_change():
+    """Value read before the change is committed is not cached, the changed one is read after the commit."""
+    store = PreferencesStore()
+    service = CachedUserPreferencesService(store)
+    async with UnitOfWork(store):
+        await service.set_temperature(1, 1.0)
+        reading = asyncio.create_task(service.get_preferences(1))
+        await asyncio.sleep(0)
+    store.read.set()
+    assert (await reading).temperature == 0.5
+    assert (await service.get_preferences(1)).temperature == 1.0
+    assert (await service.get_preferences(1)).temperature == 1.0
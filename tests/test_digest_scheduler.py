@@ -0,0 +1,122 @@
+"""Digest scheduler tests: only the replica holding the advisory lock runs the jobs, the lock is released on stop
+and on connection failure, so another replica takes the leadership.
+"""
+
+import asyncio
+from typing import Callable
+
+import pytest
+
+from ya_gpt_bot.background.digest_scheduler import DigestScheduler
+
+pytestmark = pytest.mark.asyncio
+
+
+class Connection:
+    """Connection of the database server, session-level lock is released when the session ends."""
+
+    def __init__(self, server: "Server"):
+        self.server = server
+        self.broken = False
+        self.invalidated = False
+        self.acquired = False
+
+    async def execute(self, statement) -> "Connection":
+        """Try to lock, unlock or check the connection."""
+        if self.broken:
+            raise ConnectionError("connection is lost")
+        sql = str(statement)
+        if "pg_try_advisory_lock" in sql:
+            self.acquired = self.server.holder in (None, self)
+            if self.acquired:
+                self.server.holder = self
+        elif "pg_advisory_unlock" in sql and self.server.holder is self:
+            self.server.holder = None
+        return self
+
+    def scalar_one(self) -> bool:
+        """Return whether the lock is acquired."""
+        return self.acquired
+
+    async def commit(self) -> None:
+        """Nothing to commit."""
+
+    async def invalidate(self) -> None:
+        """End the session."""
+        self.invalidated = True
+        if self.server.holder is self:
+            self.server.holder = None
+
+    async def close(self) -> None:
+        """Return the connection to the pool, the session and its locks are kept."""
+
+
+class Server:
+    """Database server keeping the holder of the scheduler advisory lock, acts as the engine."""
+
+    def __init__(self):
+        self.holder: Connection | None = None
+
+    async def connect(self) -> Connection:
+        """Return a new connection."""
+        return Connection(self)
+
+
+class DigestService:
+    """Digest service with a single chat due for the digest."""
+
+    def __init__(self):
+        self.generated: list[int] = []
+
+    async def get_due_chats(self, _retry_after) -> list[int]:
+        """Return the chat due for the digest."""
+        return [1]
+
+    async def generate_scheduled_digest(self, chat_id: int, _logger) -> bool:
+        """Record the generated digest."""
+        self.generated.append(chat_id)
+        return True
+
+
+async def _wait_until(predicate: Callable[[], bool]) -> None:
+    async def wait() -> None:
+        while not predicate():
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(wait(), 1)
+
+
+async def test_leadership():
+    """Only the leader runs the jobs, the other replica takes the leadership once the leader stops."""
+    server = Server()
+    first_service, second_service = DigestService(), DigestService()
+    first = DigestScheduler(server, first_service, poll_interval=0)
+    second = DigestScheduler(server, second_service, poll_interval=0)
+    first.start()
+    await _wait_until(lambda: len(first_service.generated) > 0)
+    second.start()
+    await asyncio.sleep(0.01)
+    assert first.is_leader and not second.is_leader
+    assert len(second_service.generated) == 0
+
+    await first.stop()
+    assert not first.is_leader
+    await _wait_until(lambda: len(second_service.generated) > 0)
+    assert second.is_leader
+    await second.stop()
+    assert server.holder is None
+
+
+async def test_connection_lost():
+    """Leadership is dropped with its connection when it fails and is acquired again on a new one."""
+    server = Server()
+    scheduler = DigestScheduler(server, DigestService(), poll_interval=0)
+    scheduler.start()
+    await _wait_until(lambda: scheduler.is_leader)
+    lost = server.holder
+    lost.broken = True
+    await _wait_until(lambda: server.holder not in (None, lost))
+    assert lost.invalidated
+    assert scheduler.is_leader
+    await scheduler.stop()
+    assert server.holder is None
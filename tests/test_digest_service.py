@@ -0,0 +1,92 @@
+"""Digest service tests: concurrent digest requests of a chat share a single generation and post, the posted digest
+is reused until a new message arrives.
+"""
+
+import asyncio
+
+import pytest
+
+from ya_gpt_bot.services.impl.digest_service import DigestService
+
+pytestmark = pytest.mark.asyncio
+
+
+class Chat:
+    """Chat posting digests as numbered messages, digest generation runs until `generated` is set."""
+
+    def __init__(self, service: DigestService):
+        self.generated = asyncio.Event()
+        self.generations = 0
+        self.posts: list[str | None] = []
+        self.error: Exception | None = None
+        service.get_digest = self.get_digest
+
+    async def get_digest(self, _chat_id: int, _logger=None) -> str:
+        """Return digest once it is allowed to."""
+        self.generations += 1
+        await self.generated.wait()
+        if self.error is not None:
+            raise self.error
+        return f"digest {self.generations}"
+
+    async def post(self, text: str | None) -> int:
+        """Post the digest and return the message id."""
+        self.posts.append(text)
+        return len(self.posts)
+
+
+@pytest.fixture(name="service")
+def fixture_service() -> DigestService:
+    """Digest service without storage, digests are generated by `Chat`."""
+    return DigestService(None, None, None)
+
+
+async def _request_concurrently(service: DigestService, chat: Chat, count: int = 3) -> list:
+    requests = [asyncio.create_task(service.post_digest(1, chat.post)) for _ in range(count)]
+    await asyncio.sleep(0)
+    chat.generated.set()
+    return await asyncio.gather(*requests, return_exceptions=True)
+
+
+async def test_single_flight(service: DigestService):
+    """Concurrent callers get the message posted by the first one, it is reused by the next requests."""
+    chat = Chat(service)
+    assert await _request_concurrently(service, chat) == [(1, True), (1, False), (1, False)]
+    assert await service.post_digest(1, chat.post) == (1, False)
+    assert (chat.generations, chat.posts) == (1, ["digest 1"])
+
+
+async def test_new_message_during_generation(service: DigestService):
+    """Digest prepared while a new message arrives is posted to the waiting callers but not reused later."""
+    chat = Chat(service)
+    requests = [asyncio.create_task(service.post_digest(1, chat.post)) for _ in range(2)]
+    await asyncio.sleep(0)
+    service.note_new_message(1)
+    chat.generated.set()
+    assert await asyncio.gather(*requests) == [(1, True), (1, False)]
+    assert await service.post_digest(1, chat.post) == (2, True)
+    assert chat.generations == 2
+
+
+async def test_error_shared(service: DigestService):
+    """Generation error is raised to all the waiting callers, the next request generates the digest again."""
+    chat = Chat(service)
+    chat.error = ConnectionError("model is unavailable")
+    results = await _request_concurrently(service, chat)
+    assert all(result is chat.error for result in results)
+    chat.error = None
+    assert await service.post_digest(1, chat.post) == (1, True)
+    assert chat.generations == 2
+
+
+async def test_waiter_cancelled(service: DigestService):
+    """Cancelling a waiting caller does not cancel the shared generation."""
+    chat = Chat(service)
+    first = asyncio.create_task(service.post_digest(1, chat.post))
+    waiting = asyncio.create_task(service.post_digest(1, chat.post))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    chat.generated.set()
+    assert await first == (1, True)
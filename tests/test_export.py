@@ -0,0 +1,73 @@
+"""Export tests: SQLite rows are streamed in batches and written to compressed JSON lines and CSV files."""
+
+import csv
+import datetime
+import gzip
+import json
+
+import pytest
+import pytest_asyncio
+
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.db.sqlite import export as sqlite_export
+from ya_gpt_bot.export.exporter import export_table
+from ya_gpt_bot.export.writers import get_writer
+from ya_gpt_bot.services.impl.sqlite_conversation_service import ConversationServiceSQLite
+
+pytestmark = pytest.mark.asyncio
+
+STARTED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def database_path(tmp_path):
+    """SQLite database with 10 conversation messages of 2 chats sent a day apart."""
+    path = str(tmp_path / "ya_gpt_bot.sqlite3")
+    database = SQLiteDatabase(path)
+    conversation = ConversationServiceSQLite(database)
+    for i in range(10):
+        await conversation.save_message(i % 2, "user", None, STARTED + datetime.timedelta(days=i), f"message,\n{i}")
+    await database.close()
+    return path
+
+
+async def _export(database_path: str, export_format, path, **filters):
+    conn = sqlite_export.connect_read_only(database_path)
+
+    async def batches():
+        for batch in sqlite_export.iter_rows(conn, "conversation", 3, **filters):
+            yield batch
+
+    try:
+        return await export_table("conversation", batches(), get_writer(export_format, path))
+    finally:
+        conn.close()
+
+
+async def test_jsonl_export(database_path, tmp_path):
+    """All rows are exported with timestamps as in PostgreSQL."""
+    stats = await _export(database_path, "jsonl", tmp_path / "conversation")
+    assert stats.rows == 10
+    assert stats.path.name == "conversation.jsonl.gz"
+    with gzip.open(stats.path, "rt", encoding="utf-8") as file:
+        rows = [json.loads(line) for line in file]
+    assert len(rows) == 10
+    assert {row["text"] for row in rows} == {f"message,\n{i}" for i in range(10)}
+    assert min(row["message_timestamp"] for row in rows) == STARTED.isoformat()
+
+
+async def test_filtered_csv_export(database_path, tmp_path):
+    """Rows are filtered by the time range and chats."""
+    stats = await _export(
+        database_path,
+        "csv",
+        tmp_path / "conversation",
+        since=STARTED + datetime.timedelta(days=2),
+        until=STARTED + datetime.timedelta(days=8),
+        chat_ids=[0],
+    )
+    with gzip.open(stats.path, "rt", encoding="utf-8", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["text"] for row in sorted(rows, key=lambda row: int(row["seq"]))] == [
+        f"message,\n{i}" for i in (2, 4, 6)
+    ]
@@ -0,0 +1,102 @@
+"""Generation limiter tests: per chat and per user limits, superseding of queued requests, cancelling
+of running ones and releasing the limits on errors.
+"""
+
+import asyncio
+
+import pytest
+
+from ya_gpt_bot.bot_config.middlewares.generation_limit import GenerationCancelled, GenerationLimiter
+
+pytestmark = pytest.mark.asyncio
+
+
+class Generation:
+    """Generation which runs until it is finished by the test."""
+
+    def __init__(self, result: str):
+        self.result = result
+        self.started = asyncio.Event()
+        self.finish = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.started.set()
+        await self.finish.wait()
+        return self.result
+
+
+async def test_limits():
+    """Requests above the user and the chat limits wait for the running ones."""
+    limiter = GenerationLimiter(max_per_chat=2, max_per_user=1)
+    first, second, third = Generation("first"), Generation("second"), Generation("third")
+    running = [
+        asyncio.create_task(limiter.run(-1, 1, first)),
+        asyncio.create_task(limiter.run(-1, 2, second)),
+        asyncio.create_task(limiter.run(-1, 3, third)),
+    ]
+    await asyncio.wait_for(asyncio.gather(first.started.wait(), second.started.wait()), 1)
+    assert not third.started.is_set()
+    assert (limiter.running_count, limiter.queued_count) == (2, 1)
+    first.finish.set()
+    await asyncio.wait_for(third.started.wait(), 1)
+    second.finish.set()
+    third.finish.set()
+    assert await asyncio.gather(*running) == ["first", "second", "third"]
+    assert (limiter.running_count, limiter.queued_count) == (0, 0)
+
+
+async def test_supersede_queued():
+    """A newer request of the user supersedes their queued one, the running one is not affected."""
+    limiter = GenerationLimiter(max_per_user=1)
+    running, queued, newer = Generation("running"), Generation("queued"), Generation("newer")
+    running_task = asyncio.create_task(limiter.run(-1, 1, running))
+    queued_task = asyncio.create_task(limiter.run(-1, 1, queued))
+    await asyncio.sleep(0)
+    newer_task = asyncio.create_task(limiter.run(-1, 1, newer))
+    with pytest.raises(GenerationCancelled, match="superseded"):
+        await queued_task
+    running.finish.set()
+    newer.finish.set()
+    assert await running_task == "running"
+    assert await newer_task == "newer"
+    assert not queued.started.is_set()
+
+
+async def test_cancel_running():
+    """Cancel aborts the running and the queued requests of the user only."""
+    limiter = GenerationLimiter(max_per_chat=3, max_per_user=1)
+    running, queued, other = Generation("running"), Generation("queued"), Generation("other")
+    running_task = asyncio.create_task(limiter.run(-1, 1, running))
+    queued_task = asyncio.create_task(limiter.run(-1, 1, queued))
+    other_task = asyncio.create_task(limiter.run(-1, 2, other))
+    await asyncio.wait_for(running.started.wait(), 1)
+    assert limiter.cancel(-1, 1) == 2
+    for task in (running_task, queued_task):
+        with pytest.raises(GenerationCancelled, match="cancelled"):
+            await task
+    other.finish.set()
+    assert await other_task == "other"
+    assert (limiter.running_count, limiter.queued_count) == (0, 0)
+
+
+async def test_release_on_error():
+    """Limits are released when the generation fails, so the next request of the user runs."""
+    limiter = GenerationLimiter(max_per_user=1)
+
+    async def fail() -> str:
+        raise ConnectionError("model is unavailable")
+
+    next_generation = Generation("next")
+    failing = asyncio.create_task(limiter.run(-1, 1, fail))
+    next_task = asyncio.create_task(limiter.run(-2, 1, next_generation))
+    waiting = asyncio.create_task(limiter.run(-1, 1, Generation("waiting")))
+    with pytest.raises(ConnectionError):
+        await failing
+    await asyncio.sleep(0)
+    assert limiter.running_count == 2
+    next_generation.finish.set()
+    assert await next_task == "next"
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert (limiter.running_count, limiter.queued_count) == (0, 0)
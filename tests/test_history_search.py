@@ -0,0 +1,50 @@
+"""History search tests: chat indexes are built from the saved conversation and the messages saved meanwhile."""
+
+import asyncio
+import datetime
+
+import pytest
+
+from ya_gpt_bot.services.impl.history_search_service import HistorySearchService
+
+pytestmark = pytest.mark.asyncio
+
+STARTED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class ConversationStore:
+    """Conversation of every chat is the same, messages are returned once `loaded` is set."""
+
+    def __init__(self, messages: list[tuple[str, datetime.datetime]]):
+        self.messages = messages
+        self.loaded = asyncio.Event()
+
+    async def get_recent_messages(self, _chat_id: int, limit: int) -> list[tuple[str, datetime.datetime]]:
+        """Return the latest messages."""
+        await self.loaded.wait()
+        return self.messages[-limit:]
+
+
+async def test_messages_saved_while_building():
+    """Messages saved while the index is built are indexed once, even if they are loaded from the database."""
+    loaded = [("user,,old question", STARTED), ("user,,last question", STARTED + datetime.timedelta(minutes=1))]
+    store = ConversationStore(loaded)
+    service = HistorySearchService(store, None)
+    searching = asyncio.create_task(service.search(1, "question"))
+    await asyncio.sleep(0)
+    for line, message_timestamp in loaded:
+        service.add_message(1, line, message_timestamp)
+    service.add_message(1, "user,,new question", STARTED + datetime.timedelta(minutes=1))
+    store.loaded.set()
+    found = await searching
+    assert sorted(found) == ["user,,last question", "user,,new question", "user,,old question"]
+
+
+async def test_evicted_while_waiting():
+    """Search does not fail if the index it waited for is evicted by the index of another chat."""
+    store = ConversationStore([("user,,question", STARTED)])
+    service = HistorySearchService(store, None, max_chats=1)
+    searching = asyncio.gather(service.search(1, "question"), service.search(2, "question"))
+    await asyncio.sleep(0)
+    store.loaded.set()
+    assert await searching == [["user,,question"], ["user,,question"]]
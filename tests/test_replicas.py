@@ -0,0 +1,87 @@
+"""Replica router tests: reads are routed to the replicas in sync, the primary is used for lagging, disconnected
+and unavailable replicas and for the data written recently.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from ya_gpt_bot.db import replicas as replicas_module
+from ya_gpt_bot.db.replicas import ReplicaRouter
+
+pytestmark = pytest.mark.asyncio
+
+
+class Engine:
+    """Engine returning the given replication lag, `None` is returned when the WAL receiver is not running."""
+
+    def __init__(self, host: str, lag: float | None = 0):
+        self.url = SimpleNamespace(host=host)
+        self.lag = lag
+        self.available = True
+
+    def connect(self) -> "Engine":
+        """Return connection (the stub acts as it)."""
+        return self
+
+    async def __aenter__(self) -> "Engine":
+        if not self.available:
+            raise ConnectionError("connection refused")
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+    async def execute(self, _statement) -> SimpleNamespace:
+        """Return the replication lag."""
+        return SimpleNamespace(scalar_one=lambda: self.lag)
+
+
+def _read_engines(router: ReplicaRouter, *keys, count: int = 4) -> set[str]:
+    return {router.read_engine(*keys).url.host for _ in range(count)}
+
+
+async def test_replicas_in_sync():
+    """Reads are spread between the replicas in sync, the primary is used until the first check."""
+    router = ReplicaRouter(Engine("primary"), [Engine("first", 0), Engine("second", 0.5)], max_lag=1)
+    assert _read_engines(router) == {"primary"}
+    await router.check()
+    assert _read_engines(router) == {"first", "second"}
+
+
+async def test_lagging_replica():
+    """Replica lagging more than allowed is not used until it catches up, the primary is used without replicas."""
+    replica = Engine("replica", 10)
+    router = ReplicaRouter(Engine("primary"), [replica], max_lag=1)
+    await router.check()
+    assert router.lags == {replica: 10}
+    assert _read_engines(router) == {"primary"}
+    replica.lag = 0
+    await router.check()
+    assert _read_engines(router) == {"replica"}
+
+
+async def test_disconnected_replica():
+    """Replica with the WAL receiver down or unavailable one is not used."""
+    disconnected, unavailable = Engine("disconnected"), Engine("unavailable")
+    router = ReplicaRouter(Engine("primary"), [disconnected, unavailable, Engine("replica")], max_lag=1)
+    await router.check()
+    assert _read_engines(router, count=6) == {"disconnected", "unavailable", "replica"}
+    disconnected.lag = None
+    unavailable.available = False
+    await router.check()
+    assert router.lags[disconnected] is None and router.lags[unavailable] is None
+    assert _read_engines(router) == {"replica"}
+
+
+async def test_recent_writes(monkeypatch):
+    """Data written recently is read from the primary for `max_lag` seconds."""
+    now = [0.0]
+    monkeypatch.setattr(replicas_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    router = ReplicaRouter(Engine("primary"), [Engine("replica")], max_lag=1)
+    await router.check()
+    router.note_write(("messages", 1))
+    assert _read_engines(router, ("messages", 1)) == {"primary"}
+    assert _read_engines(router, ("messages", 2)) == {"replica"}
+    now[0] = 1.5
+    assert _read_engines(router, ("messages", 1)) == {"replica"}
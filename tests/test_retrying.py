@@ -0,0 +1,95 @@
+"""Retrying middleware tests: only the failed stage is run again and retries stop at the request deadline."""
+
+from types import SimpleNamespace
+
+import pytest
+from loguru import logger
+
+from ya_gpt_bot.bot_config.middlewares import retrying
+from ya_gpt_bot.bot_config.middlewares.retrying import RetryingMiddleware
+from ya_gpt_bot.ya_gpt.exceptions import GenerationTimeoutError
+
+pytestmark = pytest.mark.asyncio
+
+
+class Clock:
+    """Monotonic clock advanced by the backoff sleeps only."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        """Return current time."""
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        """Advance the time by delay."""
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch) -> Clock:
+    """Clock patched into the retrying middleware."""
+    clock = Clock()
+    monkeypatch.setattr(retrying, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(retrying, "asyncio", SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+def _data() -> dict:
+    return {"logger": logger, "event_id": 1}
+
+
+async def test_failed_stage_is_retried(clock: Clock):
+    """Completed stages are not run again on retry, the failed one is."""
+    calls: list[str] = []
+    failures = [GenerationTimeoutError(), GenerationTimeoutError()]
+
+    async def stage(name: str, fail: bool = False) -> str:
+        calls.append(name)
+        if fail and len(failures) > 0:
+            raise failures.pop()
+        return name
+
+    async def handler(_event, data) -> str:
+        checkpoints = data["checkpoints"]
+        answer = await checkpoints.run("generate", lambda: stage("generate"))
+        await checkpoints.run("deliver", lambda: stage("deliver", fail=True))
+        return answer
+
+    middleware = RetryingMiddleware(max_retry_count=3, base_delay=1)
+    middleware.get_delay = lambda try_number: 2**try_number
+    assert await middleware(handler, None, _data()) == "generate"
+    assert calls == ["generate", "deliver", "deliver", "deliver"]
+    assert clock.sleeps == [1, 2]
+
+
+async def test_non_retryable_error(clock: Clock):
+    """Errors which are not worth retrying are raised at once."""
+
+    async def handler(_event, _data) -> None:
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await RetryingMiddleware(max_retry_count=3)(handler, None, _data())
+    assert not clock.sleeps
+
+
+async def test_backoff_stops_at_deadline(clock: Clock):
+    """Retry is not started if its backoff delay would end after the deadline."""
+    attempts = 0
+
+    async def handler(_event, _data) -> None:
+        nonlocal attempts
+        attempts += 1
+        clock.now += 10  # every attempt takes 10 seconds
+        raise GenerationTimeoutError()
+
+    middleware = RetryingMiddleware(max_retry_count=10, deadline=35)
+    middleware.get_delay = lambda try_number: 5
+    with pytest.raises(GenerationTimeoutError):
+        await middleware(handler, None, _data())
+    assert attempts == 3  # 10 + 5 + 10 + 5 + 10, the next delay would end at 45
+    assert clock.sleeps == [5, 5]
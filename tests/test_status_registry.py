@@ -0,0 +1,138 @@
+"""Statuses registry tests: statuses are loaded on start, changed by the notifications (including the ones received
+during the load) and not used while the replication connection is lost.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator
+
+import pytest
+import pytest_asyncio
+
+from ya_gpt_bot.background.status_registry import STATUS_CHANGES_CHANNEL, StatusRegistry
+from ya_gpt_bot.db.entities import t_chats, t_users
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+
+pytestmark = pytest.mark.asyncio
+
+
+class DriverConnection:
+    """asyncpg connection keeping the notifications listener."""
+
+    def __init__(self):
+        self.listeners = {}
+
+    async def add_listener(self, channel: str, callback) -> None:
+        """Register the notifications listener."""
+        self.listeners[channel] = callback
+
+
+class Connection:
+    """Connection returning statuses of the database, loading is paused until `database.load` is set."""
+
+    def __init__(self, database: "Database"):
+        self.database = database
+        self.driver_connection = DriverConnection()
+
+    async def __aenter__(self) -> "Connection":
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+    async def get_raw_connection(self) -> "Connection":
+        """Return the pooled connection (the stub acts as it)."""
+        return self
+
+    async def execute(self, statement) -> list[tuple]:
+        """Return statuses of the selected table or fail the connection check if the connection is lost."""
+        tables = statement.get_final_froms()
+        if len(tables) == 0:
+            await self.database.lost.wait()
+            raise ConnectionError("connection is lost")
+        await self.database.load.wait()
+        return list((self.database.users if tables[0] is t_users else self.database.chats).items())
+
+    async def commit(self) -> None:
+        """Nothing to commit."""
+
+    async def invalidate(self) -> None:
+        """Nothing to invalidate."""
+
+    def notify(self, change: dict) -> None:
+        """Publish the status change as the database trigger does."""
+        self.driver_connection.listeners[STATUS_CHANGES_CHANNEL](self, 1, STATUS_CHANGES_CHANNEL, json.dumps(change))
+
+
+class Database:
+    """Engine with statuses of users and chats."""
+
+    def __init__(self):
+        self.users = {1: UserStatus.AUTHORIZED, 2: UserStatus.PENDING}
+        self.chats = {-1: ChatStatus.AUTHORIZED}
+        self.load = asyncio.Event()
+        self.lost = asyncio.Event()
+        self.connections: list[Connection] = []
+        self.connected = asyncio.Event()
+
+    def connect(self) -> Connection:
+        """Return a new connection."""
+        self.connections.append(Connection(self))
+        self.connected.set()
+        return self.connections[-1]
+
+
+@pytest.fixture(name="database")
+def fixture_database() -> Database:
+    """Database stub."""
+    return Database()
+
+
+@pytest_asyncio.fixture(name="registry")
+async def fixture_registry(database: Database) -> AsyncIterator[StatusRegistry]:
+    """Started statuses registry."""
+    registry = StatusRegistry(database, check_interval=0, reconnect_delay=0)
+    registry.start()
+    yield registry
+    await registry.stop()
+
+
+async def test_notifications(database: Database, registry: StatusRegistry):
+    """Changes received during the load are applied after it, the later ones are applied right away."""
+    await asyncio.wait_for(database.connected.wait(), 1)
+    conn = database.connections[0]
+    conn.notify({"table": t_users.name, "id": 2, "status": UserStatus.AUTHORIZED.value})
+    assert not registry.is_ready
+    assert registry.get_user_status(2) is None
+    database.load.set()
+    assert await registry.wait_ready(1)
+    assert registry.get_user_status(1) == UserStatus.AUTHORIZED
+    assert registry.get_user_status(2) == UserStatus.AUTHORIZED
+    assert registry.get_chat_status(-1) == ChatStatus.AUTHORIZED
+
+    conn.notify({"table": t_users.name, "id": 1, "status": UserStatus.BLOCKED.value})
+    conn.notify({"table": t_chats.name, "id": -2, "status": ChatStatus.PENDING.value})
+    conn.notify({"table": t_chats.name, "id": -1, "status": None})
+    conn.notify({"table": "messages", "id": 1, "status": None})
+    assert registry.get_user_status(1) == UserStatus.BLOCKED
+    assert registry.get_chat_status(-2) == ChatStatus.PENDING
+    assert registry.get_chat_status(-1) is None
+    assert (registry.users_count, registry.chats_count) == (2, 1)
+
+
+async def test_connection_lost(database: Database, registry: StatusRegistry):
+    """Statuses are not returned while the connection is lost, they are loaded again on reconnect."""
+    database.load.set()
+    assert await registry.wait_ready(1)
+    database.load.clear()
+    database.connected.clear()
+    database.lost.set()
+    await asyncio.wait_for(database.connected.wait(), 1)
+    database.lost.clear()
+    assert not registry.is_ready
+    assert registry.get_user_status(1) is None
+    database.users[1] = UserStatus.BLOCKED
+    database.load.set()
+    assert await registry.wait_ready(1)
+    assert registry.get_user_status(1) == UserStatus.BLOCKED
+    assert len(database.connections) == 2
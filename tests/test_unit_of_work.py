@@ -0,0 +1,151 @@
+"""Unit of work tests: commit and rollback at the unit boundaries, callbacks called only after the transaction
+ends and tasks spawned outside of the unit using their own connections.
+"""
+
+import asyncio
+
+import pytest
+
+from ya_gpt_bot.db.unit_of_work import (
+    UnitOfWork,
+    call_after_transaction,
+    connection_scope,
+    create_task_outside_unit,
+    current_unit,
+    release_connection,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class Connection:
+    """Connection recording the transaction events to the engine log."""
+
+    def __init__(self, engine: "Engine", number: int):
+        self.engine = engine
+        self.number = number
+        self._in_transaction = False
+
+    def in_transaction(self) -> bool:
+        """Indicates whether the transaction is begun."""
+        return self._in_transaction
+
+    async def begin(self) -> None:
+        """Begin the transaction."""
+        self._in_transaction = True
+        self.engine.log.append(("begin", self.number))
+
+    async def commit(self) -> None:
+        """Commit the transaction."""
+        self._in_transaction = False
+        self.engine.log.append(("commit", self.number))
+
+    async def rollback(self) -> None:
+        """Rollback the transaction."""
+        self._in_transaction = False
+        self.engine.log.append(("rollback", self.number))
+
+    async def close(self) -> None:
+        """Return the connection to the pool."""
+        self.engine.log.append(("close", self.number))
+
+
+class Connect:
+    """Result of `Engine.connect`, both awaitable and an async context manager like the SQLAlchemy one."""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    def __await__(self):
+        return self._get().__await__()
+
+    async def _get(self) -> Connection:
+        return self.conn
+
+    async def __aenter__(self) -> Connection:
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.conn.close()
+
+
+class Engine:
+    """Engine creating numbered connections."""
+
+    def __init__(self):
+        self.log: list[tuple[str, int]] = []
+        self.connections = 0
+
+    def connect(self) -> Connect:
+        """Return a new connection."""
+        self.connections += 1
+        return Connect(Connection(self, self.connections))
+
+
+async def test_commit_on_exit():
+    """Connection is acquired on the first access, shared by the scopes and committed on leaving the unit."""
+    engine = Engine()
+    async with UnitOfWork(engine) as unit:
+        assert current_unit() is unit
+        assert engine.log == []
+        async with connection_scope(engine) as first:
+            pass
+        async with connection_scope(engine) as second:
+            pass
+        assert first is second
+        assert engine.log == [("begin", 1)]
+    assert current_unit() is None
+    assert engine.log == [("begin", 1), ("commit", 1), ("close", 1)]
+
+
+async def test_rollback_on_error():
+    """Transaction is not committed (closing the connection rolls it back) when the unit is left with an error,
+    callbacks are still called after it.
+    """
+    engine = Engine()
+    called: list[list[tuple[str, int]]] = []
+    with pytest.raises(ValueError):
+        async with UnitOfWork(engine):
+            async with connection_scope(engine):
+                call_after_transaction(lambda: called.append(list(engine.log)))
+            raise ValueError("handler failed")
+    assert engine.log == [("begin", 1), ("close", 1)]
+    assert called == [engine.log]
+
+
+async def test_callbacks_after_commit():
+    """Callbacks are called once the transaction is committed, or right away when there is no transaction."""
+    engine = Engine()
+    called: list[str] = []
+    call_after_transaction(lambda: called.append("outside"))
+    async with UnitOfWork(engine):
+        call_after_transaction(lambda: called.append("no connection"))
+        async with connection_scope(engine):
+            call_after_transaction(lambda: called.append("released"))
+        assert called == ["outside", "no connection"]
+        await release_connection()
+        assert called == ["outside", "no connection", "released"]
+        assert engine.log == [("begin", 1), ("commit", 1), ("close", 1)]
+        async with connection_scope(engine):
+            call_after_transaction(lambda: called.append("exit"))
+        assert called == ["outside", "no connection", "released"]
+    assert called == ["outside", "no connection", "released", "exit"]
+    assert engine.log[3:] == [("begin", 2), ("commit", 2), ("close", 2)]
+
+
+async def test_task_outside_unit():
+    """Task created outside of the unit acquires and commits its own connection."""
+    engine = Engine()
+
+    async def save() -> int:
+        assert current_unit() is None
+        async with connection_scope(engine) as conn:
+            return conn.number
+
+    async with UnitOfWork(engine):
+        async with connection_scope(engine) as conn:
+            task = create_task_outside_unit(save())
+            assert await asyncio.wait_for(task, 1) == 2
+        assert current_unit() is not None
+        assert conn.number == 1
+    assert engine.log == [("begin", 1), ("commit", 2), ("close", 2), ("commit", 1), ("close", 1)]
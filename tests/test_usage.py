@@ -0,0 +1,59 @@
+"""Model usage accounting tests: usage reported by the clients in an update scope is aggregated in memory and
+summed from the hourly rollups of SQLite database.
+"""
+
+import datetime
+
+import pytest
+import pytest_asyncio
+
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.gpt.usage import TokenUsage, report_usage, usage_scope
+from ya_gpt_bot.services.impl.sqlite_usage_service import UsageServiceSQLite
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def usage_service(tmp_path):
+    """Usage service over an empty SQLite database."""
+    database = SQLiteDatabase(str(tmp_path / "ya_gpt_bot.sqlite3"))
+    yield UsageServiceSQLite(database)
+    await database.close()
+
+
+async def test_usage_scope():
+    """Usage is collected only inside of the scope."""
+    report_usage(TokenUsage("yandexgpt", 1, 1))
+    with usage_scope() as usage:
+        report_usage(TokenUsage("yandexgpt", 10, 5))
+    report_usage(TokenUsage("yandexgpt", 1, 1))
+    assert usage == [TokenUsage("yandexgpt", 10, 5)]
+
+
+async def test_usage_totals(usage_service: UsageServiceSQLite):
+    """Updates are aggregated by hour, user, chat and model and summed by the requested grouping."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    aggregator = usage_service.aggregator
+    aggregator.add(1, -1, [TokenUsage("yandexgpt", 10, 5), TokenUsage("yandexgpt", 20, 5)], 1.5, now)
+    aggregator.add(1, -1, [TokenUsage("yandexgpt", 10, 5)], 0.5, now)
+    aggregator.add(2, -1, [TokenUsage("yandexgpt-lite", 100, 50)], 100, now)
+    aggregator.add(1, 1, [TokenUsage("yandexgpt", 1, 1)], 0.5, now - datetime.timedelta(days=2))
+    assert len(aggregator) == 3
+
+    since = now - datetime.timedelta(hours=1)
+    by_user = await usage_service.get_usage_totals("user_id", since)
+    assert len(aggregator) == 0
+    assert [total.key for total in by_user] == [2, 1]
+    first_user = by_user[1].counters
+    assert (first_user.requests, first_user.input_tokens, first_user.completion_tokens) == (3, 40, 15)
+    assert first_user.updates == 2
+    assert first_user.latency_percentile(0.5) == 1 and first_user.latency_percentile(0.95) == 2
+    assert by_user[0].counters.latency_percentile(0.95) == float("inf")
+
+    aggregator.add(1, -1, [TokenUsage("yandexgpt", 10, 5)], 0.5, now)
+    by_model = await usage_service.get_usage_totals("model", since, chat_id=-1)
+    assert [(total.key, total.counters.requests) for total in by_model] == [("yandexgpt-lite", 1), ("yandexgpt", 4)]
+    by_chat = await usage_service.get_usage_totals("chat_id", now - datetime.timedelta(days=3))
+    assert [total.key for total in by_chat] == [-1, 1]
+    assert await usage_service.get_usage_totals("user_id", since, chat_id=-2) == []
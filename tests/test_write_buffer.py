@@ -0,0 +1,142 @@
+"""Write buffer tests: batching, dropping items when the buffer is full, retries of the failed batches, splitting
+of the rejected ones and writing the buffered items on shutdown.
+"""
+
+import asyncio
+
+import pytest
+
+from ya_gpt_bot.services.write_buffer import WriteBuffer
+
+pytestmark = pytest.mark.asyncio
+
+
+class RejectedError(Exception):
+    """Error of an item the storage does not accept."""
+
+
+class Storage:
+    """Storage of written batches which fails a given number of writes or rejects batches with the given items."""
+
+    def __init__(self, failures: int = 0, rejected: tuple[int, ...] = ()):
+        self.batches: list[list[int]] = []
+        self.failures = failures
+        self.rejected = rejected
+
+    @property
+    def items(self) -> list[int]:
+        """Written items in order of writing."""
+        return [item for batch in self.batches for item in batch]
+
+    async def write(self, batch: list[int]) -> None:
+        """Save the batch or fail."""
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("database is unavailable")
+        if any(item in self.rejected for item in batch):
+            raise RejectedError(batch)
+        self.batches.append(batch)
+
+
+async def test_batches():
+    """Items are written in batches of at most `batch_size` in order of putting."""
+    storage = Storage()
+    buffer = WriteBuffer(storage.write, batch_size=3)
+    for item in range(7):
+        assert await buffer.put(item)
+    assert len(buffer) == 7
+    await buffer.flush()
+    assert storage.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert len(buffer) == 0
+
+
+async def test_flush_matching():
+    """Only the matching items are written in order, the others stay in the buffer. Items failed to be written
+    are returned to the head of the buffer.
+    """
+    storage = Storage(failures=1)
+    buffer = WriteBuffer(storage.write, batch_size=2)
+    for item in range(7):
+        await buffer.put(item)
+    with pytest.raises(ConnectionError):
+        await buffer.flush_matching(lambda item: item % 2 == 0)
+    assert len(buffer) == 7
+    await buffer.flush_matching(lambda item: item % 2 == 0)
+    assert storage.batches == [[0, 2], [4, 6]]
+    await buffer.flush_matching(lambda item: item > 10)
+    assert len(buffer) == 3
+    await buffer.flush()
+    assert storage.items == [0, 2, 4, 6, 1, 3, 5]
+
+
+async def test_full_buffer_drops():
+    """Putting to the full buffer waits for the space and drops the item after `max_wait`."""
+    storage = Storage()
+    buffer = WriteBuffer(storage.write, max_size=2, max_wait=0.1)
+    assert await buffer.put(0) and await buffer.put(1)
+    assert not await buffer.put(2)
+    assert buffer.dropped == 1
+
+    waiting = asyncio.create_task(buffer.put(3))
+    await asyncio.sleep(0)
+    await buffer.flush()
+    assert await waiting
+    await buffer.flush()
+    assert storage.items == [0, 1, 3]
+
+
+async def test_retry():
+    """Failed batch stays in the buffer and is written again in the original order."""
+    storage = Storage(failures=2)
+    buffer = WriteBuffer(storage.write, batch_size=2, max_attempts=3)
+    for item in range(3):
+        await buffer.put(item)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        assert len(buffer) == 3
+    await buffer.flush()
+    assert storage.batches == [[0, 1], [2]]
+
+
+async def test_rejected_item_is_dropped():
+    """Rejected batch is written by halves and the rejected item is dropped without blocking the others."""
+    storage = Storage(rejected=(2,))
+    buffer = WriteBuffer(storage.write, batch_size=4, rejects=lambda exc: isinstance(exc, RejectedError))
+    for item in range(6):
+        await buffer.put(item)
+    await buffer.flush()
+    assert storage.items == [0, 1, 3, 4, 5]
+    assert buffer.rejected == 1
+    assert len(buffer) == 0
+
+
+async def test_repeatedly_failing_item_is_dropped():
+    """Batch failing `max_attempts` times in a row is written by halves, so an item failing with an unknown error
+    is dropped eventually.
+    """
+    storage = Storage(rejected=(1,))
+    buffer = WriteBuffer(storage.write, batch_size=2, max_attempts=2)
+    for item in range(3):
+        await buffer.put(item)
+    for _ in range(2):  # the batch fails twice, then its first half is written and the second one fails
+        with pytest.raises(RejectedError):
+            await buffer.flush()
+    assert storage.items == [0]
+    await buffer.flush()
+    assert storage.items == [0, 2]
+    assert buffer.rejected == 1
+
+
+async def test_background_writing_and_shutdown():
+    """Full batches are written by the background task, the rest is written on stop."""
+    storage = Storage()
+    buffer = WriteBuffer(storage.write, batch_size=2, flush_interval=60)
+    buffer.start()
+    for item in range(2):
+        await buffer.put(item)
+    await asyncio.sleep(0.1)
+    assert storage.batches == [[0, 1]]
+    await buffer.put(2)
+    await buffer.stop()
+    assert storage.batches == [[0, 1], [2]]
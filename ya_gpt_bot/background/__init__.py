@@ -0,0 +1 @@
+"""Background workers running alongside the bot are located here."""
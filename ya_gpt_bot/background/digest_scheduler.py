@@ -0,0 +1,116 @@
+"""Background digests scheduler is defined here."""
+
+import asyncio
+import datetime
+from typing import Callable
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from ya_gpt_bot.services.impl.digest_service import DigestService
+
+func: Callable
+
+DIGEST_SCHEDULER_LOCK_KEY = 0x79615F6469676573
+"""PostgreSQL advisory lock key held by the replica running the digests scheduler."""
+
+
+class DigestScheduler:
+    """Background worker generating digests of chats which have opted-in according to their schedules.
+
+    Only one bot replica runs the jobs at a time: the leadership is held as a PostgreSQL session-level advisory
+    lock on a dedicated connection, other replicas try to acquire it every `poll_interval` seconds. If `engine`
+    is None (single-node storage such as SQLite), the jobs are always run by this process.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        engine: AsyncEngine | None,
+        digest_service: DigestService,
+        poll_interval: float = 60,
+        retry_after: float = 600,
+        logger: Logger = global_logger,
+    ):
+        self._engine = engine
+        self._digest_service = digest_service
+        self._poll_interval = poll_interval
+        self._retry_after = datetime.timedelta(seconds=retry_after)
+        self._logger = logger
+        self._lock_conn: AsyncConnection | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Indicates whether this replica is running the scheduled jobs."""
+        return self._engine is None or self._lock_conn is not None
+
+    def start(self) -> None:
+        """Start scheduler loop as a background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="digest-scheduler")
+
+    async def stop(self) -> None:
+        """Stop scheduler loop and release the leadership."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._drop_leadership()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self._ensure_leadership():
+                    await self._run_due_jobs()
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.warning("Digest scheduler iteration failed: {!r}", exc)
+                await self._drop_leadership()
+            await asyncio.sleep(self._poll_interval)
+
+    async def _ensure_leadership(self) -> bool:
+        if self._engine is None:
+            return True
+        if self._lock_conn is not None:
+            await self._lock_conn.execute(select(1))
+            await self._lock_conn.commit()
+            return True
+        conn = await self._engine.connect()
+        try:
+            acquired = (await conn.execute(select(func.pg_try_advisory_lock(DIGEST_SCHEDULER_LOCK_KEY)))).scalar_one()
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return False
+        self._logger.info("This replica is now running digests scheduler")
+        self._lock_conn = conn
+        return True
+
+    async def _drop_leadership(self) -> None:
+        if self._lock_conn is None:
+            return
+        conn, self._lock_conn = self._lock_conn, None
+        try:
+            # pooled connection keeps session-level locks when returned to the pool, so unlock explicitly
+            await conn.execute(select(func.pg_advisory_unlock(DIGEST_SCHEDULER_LOCK_KEY)))
+            await conn.commit()
+        except Exception as exc:  # pylint: disable=broad-except
+            self._logger.debug("Could not release digest scheduler lock, dropping the connection: {!r}", exc)
+            await conn.invalidate()
+        finally:
+            await conn.close()
+
+    async def _run_due_jobs(self) -> None:
+        chats = await self._digest_service.get_due_chats(self._retry_after)
+        if len(chats) > 0:
+            self._logger.info("Generating scheduled digests for {} chats", len(chats))
+        for chat_id in chats:
+            if await self._digest_service.generate_scheduled_digest(chat_id, self._logger):
+                self._logger.debug("Scheduled digest for chat {} is generated", chat_id)
@@ -0,0 +1,244 @@
+"""Background database maintenance (time partitions and old data pruning) is defined here."""
+
+import asyncio
+import datetime
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, TypeVar
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from ya_gpt_bot.config.app_config import MaintenanceConfig
+from ya_gpt_bot.db.entities.conversation import t_conversation
+from ya_gpt_bot.db.entities.messages import t_messages
+from ya_gpt_bot.db.entities.usage import t_usage
+from ya_gpt_bot.db.operations import maintenance, partitions
+
+func: Callable
+
+_T = TypeVar("_T")
+
+MAINTENANCE_LOCK_KEY = 0x79615F6D61696E74
+"""PostgreSQL advisory lock key held by the process running the maintenance."""
+
+PARTITIONS_LOCK_TIMEOUT_MS = 5000
+
+
+@dataclass
+class MaintenanceRun:
+    """Results of a single maintenance run: number of deleted rows and duration in seconds of every rule,
+    names of created and dropped partitions.
+    """
+
+    started_at: datetime.datetime
+    deleted: dict[str, int] = field(default_factory=dict)
+    durations: dict[str, float] = field(default_factory=dict)
+    created_partitions: list[str] = field(default_factory=list)
+    dropped_partitions: list[str] = field(default_factory=list)
+
+
+class MaintenanceScheduler:
+    """Background worker creating time partitions ahead and pruning old data by the retention rules every
+    `interval_seconds`, so the request handling never deletes anything.
+
+    Partitions beyond the time retention are detached concurrently and dropped. Other rows are deleted in batches
+    of `batch_size`, every batch is committed separately and followed by a pause of `batch_pause_seconds`.
+    Only one bot replica (or `maintenance` CLI command) runs the maintenance at a time, it is guarded
+    by a PostgreSQL session-level advisory lock held for the run.
+
+    There is no default partition, so rows are not saved at all once the partitions end. `ensure_partitions`
+    should be called on startup, and every run reports an error if the next partition is missing.
+    """
+
+    def __init__(self, engine: AsyncEngine, config: MaintenanceConfig, logger: Logger = global_logger):
+        self._engine = engine
+        self._config = config
+        self._logger = logger
+        self._task: asyncio.Task | None = None
+        self.last_run: MaintenanceRun | None = None
+        self.total_deleted: dict[str, int] = {}
+
+    def start(self) -> None:
+        """Start maintenance loop as a background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="maintenance")
+
+    async def stop(self) -> None:
+        """Stop maintenance loop, the current batch is rolled back."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> MaintenanceRun | None:
+        """Create partitions and apply all the retention rules once. Return None if the maintenance is already
+        running elsewhere.
+        """
+        run = await self._locked(self._apply_rules)
+        if run is None:
+            return None
+        self.last_run = run
+        for rule, deleted in run.deleted.items():
+            self.total_deleted[rule] = self.total_deleted.get(rule, 0) + deleted
+        return run
+
+    async def ensure_partitions(self) -> None:
+        """Create the missing partitions ahead (unless the maintenance is running elsewhere, which creates them)
+        and check that rows of the current moment can be saved to every partitioned table.
+        Raise RuntimeError if they can not.
+        """
+
+        async def create() -> None:
+            run = MaintenanceRun(datetime.datetime.now(datetime.timezone.utc))
+            await self._manage_partitions(run, drop=False)
+            if len(run.created_partitions) > 0:
+                self._logger.info("Created partitions {}", run.created_partitions)
+
+        await self._locked(create)
+        uncovered = await self.check_partitions()
+        if len(uncovered) > 0:
+            raise RuntimeError(
+                f"There are no partitions of {', '.join(uncovered)} for the current time,"
+                " run `maintenance` command to create them"
+            )
+
+    async def check_partitions(self) -> list[str]:
+        """Log an error for every partitioned table which has no partition for the next `partition_interval`.
+        Return names of the tables which have no partition for the current moment.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        next_start = partitions.partition_end(now, self._config.partition_interval)
+        uncovered = []
+        async with self._engine.connect() as conn:
+            for table in partitions.PARTITIONED_TABLES:
+                until = await partitions.covered_until(conn, table, now)
+                if until is None:
+                    uncovered.append(table.name)
+                    self._logger.error(
+                        "There is no partition of {} for the current time, rows are not saved", table.name
+                    )
+                elif until <= next_start:
+                    self._logger.error(
+                        "Partitions of {} end at {}, rows will not be saved after that unless maintenance creates"
+                        " the next partitions",
+                        table.name,
+                        until,
+                    )
+        return uncovered
+
+    async def _locked(self, action: Callable[[], Awaitable[_T]]) -> _T | None:
+        """Run action holding the maintenance lock, return None without running it if the lock is held
+        by another process.
+        """
+        async with self._engine.connect() as lock_conn:
+            acquired = (await lock_conn.execute(select(func.pg_try_advisory_lock(MAINTENANCE_LOCK_KEY)))).scalar_one()
+            await lock_conn.commit()
+            if not acquired:
+                self._logger.debug("Maintenance is running in another process, skipping")
+                return None
+            try:
+                return await action()
+            finally:
+                await self._unlock(lock_conn)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.warning("Maintenance run failed: {!r}", exc)
+            try:
+                await self.check_partitions()
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.warning("Partitions check failed: {!r}", exc)
+            await asyncio.sleep(self._config.interval_seconds)
+
+    async def _apply_rules(self) -> MaintenanceRun:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        run = MaintenanceRun(now)
+        config = self._config
+        started = time.monotonic()
+        await self._manage_partitions(run)
+        run.durations["partitions"] = time.monotonic() - started
+        if len(run.created_partitions) + len(run.dropped_partitions) > 0:
+            self._logger.info(
+                "Maintenance created partitions {} and dropped partitions {} in {:.1f}s",
+                run.created_partitions,
+                run.dropped_partitions,
+                run.durations["partitions"],
+            )
+        rules: dict[str, Callable[[AsyncConnection], Awaitable[int]]] = {}
+        if config.conversation_keep_length is not None:
+            rules["conversation_by_length"] = lambda conn: maintenance.prune_conversation_beyond_length(
+                conn, config.conversation_keep_length, config.batch_size
+            )
+        if config.usage_hourly_retention_days is not None:
+            usage_hourly_cutoff = now - datetime.timedelta(days=config.usage_hourly_retention_days)
+            rules["usage_hourly_by_time"] = lambda conn: maintenance.prune_usage_hourly_before(
+                conn, usage_hourly_cutoff, config.batch_size
+            )
+        for rule, prune in rules.items():
+            started = time.monotonic()
+            run.deleted[rule] = await self._prune(prune)
+            run.durations[rule] = time.monotonic() - started
+            if run.deleted[rule] > 0:
+                self._logger.info(
+                    "Maintenance rule {} deleted {} rows in {:.1f}s", rule, run.deleted[rule], run.durations[rule]
+                )
+        return run
+
+    async def _manage_partitions(self, run: MaintenanceRun, drop: bool = True) -> None:
+        """Create partitions for `partitions_ahead` intervals and drop the ones beyond the time retention
+        (unless `drop` is unset).
+        """
+        config = self._config
+        until = partitions.partition_start(run.started_at, config.partition_interval)
+        for _ in range(config.partitions_ahead):
+            until = partitions.partition_end(until, config.partition_interval)
+        retention_days = {
+            t_messages.name: config.messages_retention_days,
+            t_conversation.name: config.conversation_retention_days,
+            t_usage.name: config.usage_retention_days,
+        }
+        async with self._engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            # DDL of partitions locks the table, so do not make the queries wait behind it for long
+            await conn.execute(text(f"SET lock_timeout = {PARTITIONS_LOCK_TIMEOUT_MS}"))
+            try:
+                for table in partitions.PARTITIONED_TABLES:
+                    run.created_partitions.extend(
+                        await partitions.create_partitions(
+                            conn, table, until, config.partition_interval, since=run.started_at
+                        )
+                    )
+                    if drop and retention_days[table.name] is not None:
+                        cutoff = run.started_at - datetime.timedelta(days=retention_days[table.name])
+                        run.dropped_partitions.extend(await partitions.drop_partitions_before(conn, table, cutoff))
+            finally:
+                await conn.execute(text("RESET lock_timeout"))
+
+    async def _prune(self, prune: Callable[[AsyncConnection], Awaitable[int]]) -> int:
+        total = 0
+        while True:
+            async with self._engine.connect() as conn:
+                deleted = await prune(conn)
+                await conn.commit()
+            total += deleted
+            if deleted < self._config.batch_size:
+                return total
+            await asyncio.sleep(self._config.batch_pause_seconds)
+
+    async def _unlock(self, conn: AsyncConnection) -> None:
+        try:
+            # pooled connection keeps session-level locks when returned to the pool, so unlock explicitly
+            await conn.execute(select(func.pg_advisory_unlock(MAINTENANCE_LOCK_KEY)))
+            await conn.commit()
+        except Exception as exc:  # pylint: disable=broad-except
+            self._logger.debug("Could not release maintenance lock, dropping the connection: {!r}", exc)
+            await conn.invalidate()
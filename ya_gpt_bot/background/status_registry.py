@@ -0,0 +1,150 @@
+"""In-memory users and chats statuses registry replicated from the database is defined here."""
+
+import asyncio
+import json
+from typing import Any
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from ya_gpt_bot.db.entities import t_chats, t_users
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+
+STATUS_CHANGES_CHANNEL = "status_changes"
+"""PostgreSQL notifications channel which `users` and `chats` triggers publish status changes to."""
+
+
+class StatusRegistry:  # pylint: disable=too-many-instance-attributes
+    """Statuses of all users and chats kept in memory.
+
+    All statuses are loaded on start and then kept current by the notifications published by the database triggers,
+    which are received on a dedicated `LISTEN` connection. When the connection is lost, the registry is not ready
+    until it reconnects and loads all statuses again.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        check_interval: float = 30,
+        reconnect_delay: float = 5,
+        logger: Logger = global_logger,
+    ):
+        self._engine = engine
+        self._check_interval = check_interval
+        self._reconnect_delay = reconnect_delay
+        self._logger = logger
+        self._users: dict[int, UserStatus] = {}
+        self._chats: dict[int, ChatStatus] = {}
+        self._buffered: list[dict[str, Any]] | None = None
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        """Indicates whether the registry is loaded and receives the changes."""
+        return self._ready.is_set()
+
+    @property
+    def users_count(self) -> int:
+        """Number of users statuses in the registry."""
+        return len(self._users)
+
+    @property
+    def chats_count(self) -> int:
+        """Number of chats statuses in the registry."""
+        return len(self._chats)
+
+    def get_user_status(self, user_id: int) -> UserStatus | None:
+        """Return status of the user or None if it is unknown or the registry is not ready."""
+        return self._users.get(user_id) if self.is_ready else None
+
+    def get_chat_status(self, chat_id: int) -> ChatStatus | None:
+        """Return status of the chat or None if it is unknown or the registry is not ready."""
+        return self._chats.get(chat_id) if self.is_ready else None
+
+    def start(self) -> None:
+        """Start replication as a background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="status-registry")
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Wait for the registry to load for at most `timeout` seconds. Return whether it is ready."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        """Stop replication."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._ready.clear()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._engine.connect() as conn:
+                    await self._replicate(conn)
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.warning("Statuses replication connection is lost: {!r}", exc)
+            self._ready.clear()
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _replicate(self, conn: AsyncConnection) -> None:
+        raw_connection = (await conn.get_raw_connection()).driver_connection
+        self._buffered = []
+        await raw_connection.add_listener(STATUS_CHANGES_CHANNEL, self._on_notification)
+        try:
+            await self._load(conn)
+            self._logger.info("Statuses registry is loaded: {} users, {} chats", len(self._users), len(self._chats))
+            while True:
+                await asyncio.sleep(self._check_interval)
+                await conn.execute(select(1))
+                await conn.commit()
+        except BaseException:
+            await conn.invalidate()  # do not return listening connection to the pool
+            raise
+        finally:
+            self._buffered = None
+
+    async def _load(self, conn: AsyncConnection) -> None:
+        users = {row[0]: row[1] for row in await conn.execute(select(t_users.c.id, t_users.c.status))}
+        chats = {row[0]: row[1] for row in await conn.execute(select(t_chats.c.id, t_chats.c.status))}
+        await conn.commit()
+        self._users, self._chats = users, chats
+        buffered, self._buffered = self._buffered or [], None
+        for change in buffered:  # changes received during the load may be newer than the loaded data
+            self._apply(change)
+        self._ready.set()
+
+    def _on_notification(self, _connection, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            self._logger.warning("Invalid status change notification: {}", payload)
+            return
+        if self._buffered is not None:
+            self._buffered.append(change)
+        else:
+            self._apply(change)
+
+    def _apply(self, change: dict[str, Any]) -> None:
+        idx, status = int(change["id"]), change["status"]
+        if change["table"] == t_users.name:
+            registry, status_type = self._users, UserStatus
+        elif change["table"] == t_chats.name:
+            registry, status_type = self._chats, ChatStatus
+        else:
+            return
+        if status is None:
+            registry.pop(idx, None)
+        else:
+            registry[idx] = status_type(status)
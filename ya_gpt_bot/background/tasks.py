@@ -0,0 +1,60 @@
+"""Fire-and-forget tasks running off the request handling critical path are defined here."""
+
+import asyncio
+from typing import Awaitable, Hashable
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+
+from ya_gpt_bot.db.unit_of_work import create_task_outside_unit
+
+
+class BackgroundTasks:
+    """Set of tasks which results the update handling does not wait for (e.g. saving delivered messages).
+
+    Tasks are referenced until they finish, so they are not garbage collected, and their errors are logged.
+    `wait` should be called on shutdown so the started writes are not lost. Tasks spawned with a key (e.g. saving
+    messages of a chat) can be waited for by the later updates reading the data they write.
+    """
+
+    def __init__(self, logger: Logger = global_logger):
+        self._logger = logger
+        self._tasks: set[asyncio.Task] = set()
+        self._keyed: dict[Hashable, set[asyncio.Task]] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def spawn(
+        self, coro: Awaitable[None], name: str, logger: Logger | None = None, key: Hashable | None = None
+    ) -> asyncio.Task:
+        """Run coroutine in the background without sharing the connection of the current unit of work."""
+        task = create_task_outside_unit(coro, name=name)
+        self._tasks.add(task)
+        if key is not None:
+            self._keyed.setdefault(key, set()).add(task)
+        task.add_done_callback(lambda t: self._on_done(t, logger or self._logger, key))
+        return task
+
+    async def wait_for(self, key: Hashable) -> None:
+        """Wait for the running tasks spawned with the given key to finish, their errors are only logged."""
+        tasks = self._keyed.get(key)
+        if tasks is not None:
+            await asyncio.wait(set(tasks))
+
+    async def wait(self, timeout: float | None = None) -> None:
+        """Wait for all running tasks to finish for at most `timeout` seconds."""
+        if len(self._tasks) == 0:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if len(pending) > 0:
+            self._logger.warning("{} background tasks have not finished in time", len(pending))
+
+    def _on_done(self, task: asyncio.Task, logger: Logger, key: Hashable | None) -> None:
+        self._tasks.discard(task)
+        if key is not None:
+            self._keyed[key].discard(task)
+            if len(self._keyed[key]) == 0:
+                del self._keyed[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task '{}' failed: {!r}", task.get_name(), task.exception())
@@ -1,19 +1,30 @@
 """Common (group and direct) messages handlers are defined here."""
 
+import datetime
+
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import BufferedInputFile, Message, MessageReactionUpdated, ReactionTypeEmoji
 from loguru import logger as global_logger
 from loguru._logger import Logger
+from sqlalchemy.ext.asyncio import AsyncEngine
 
+from ya_gpt_bot.background.status_registry import StatusRegistry
 from ya_gpt_bot.bot_config.filters import ArtGenerationRequest
+from ya_gpt_bot.bot_config.middlewares.generation_limit import GenerationLimiter
 from ya_gpt_bot.bot_config.texts import get_responses
+from ya_gpt_bot.bot_config.utils.checkpoints import StageCheckpoints
 from ya_gpt_bot.bot_config.utils.reactions import has_new_reaction, react_or_pass_on_fail
 from ya_gpt_bot.bot_config.utils.response import reply_with_html_fallback
 from ya_gpt_bot.bot_config.utils.text import strip_command_by_space
 from ya_gpt_bot.db.entities.enums import UserStatus
+from ya_gpt_bot.db.pool_metrics import pool_stats
+from ya_gpt_bot.db.unit_of_work import release_connection
 from ya_gpt_bot.gpt.client import ArtClient
+from ya_gpt_bot.services.cache import DialogCache, TTLCache
 from ya_gpt_bot.services.dtos import ChatStatus
+from ya_gpt_bot.services.impl.digest_service import DigestService
+from ya_gpt_bot.services.usage_service import UsageService
 from ya_gpt_bot.services.user_preferences_service import UserPreferencesService
 from ya_gpt_bot.services.user_service import UserService
 from ya_gpt_bot.ya_gpt import exceptions as ya_exc
@@ -69,6 +80,84 @@ async def set_user_status_command(message: Message, user_service: UserService, l
     await message.reply(responses.SetStatus.unsufficient_permissions)
 
 
+@common_messages_router.message(Command("digest_jobs"))
+async def digest_jobs_command(message: Message, user_service: UserService, digest_service: DigestService) -> None:
+    """Return background digest jobs list if user has sufficient rights."""
+    user_status = await user_service.get_user_status(message.from_user.id, message.chat.type == "private")
+    if user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN):
+        await message.reply(responses.SetStatus.unsufficient_permissions)
+        return
+    jobs = await digest_service.get_jobs()
+    await reply_with_html_fallback(message, responses.Digest.format_jobs(jobs) if jobs else responses.Digest.no_jobs)
+
+
+@common_messages_router.message(Command("bot_stats"))
+async def bot_stats_command(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    message: Message,
+    user_service: UserService,
+    caches: dict[str, TTLCache | DialogCache],
+    engines: dict[str, AsyncEngine],
+    generation_limiter: GenerationLimiter,
+    status_registry: StatusRegistry | None = None,
+) -> None:
+    """Return in-memory caches, database pools and generation queue statistics if user has sufficient rights."""
+    user_status = await user_service.get_user_status(message.from_user.id, message.chat.type == "private")
+    if user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN):
+        await message.reply(responses.SetStatus.unsufficient_permissions)
+        return
+    await reply_with_html_fallback(
+        message,
+        responses.format_bot_stats(
+            {name: cache.stats() for name, cache in caches.items()},
+            {name: stats for name, engine in engines.items() if (stats := pool_stats(engine)) is not None},
+            generation_limiter.running_count,
+            generation_limiter.queued_count,
+            (
+                (status_registry.users_count, status_registry.chats_count)
+                if status_registry is not None and status_registry.is_ready
+                else None
+            ),
+        ),
+    )
+
+
+@common_messages_router.message(Command("usage"))
+async def usage_command(message: Message, user_service: UserService, usage_service: UsageService) -> None:
+    """Return model usage for the given number of hours (24 by default) from the hourly rollups if user has
+    sufficient rights: by chats, users and models in direct messages, by users and models of the current chat
+    in groups.
+    """
+    user_status = await user_service.get_user_status(message.from_user.id, message.chat.type == "private")
+    if user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN):
+        await message.reply(responses.SetStatus.unsufficient_permissions)
+        return
+    text = strip_command_by_space(message.text)
+    if text != "" and (not text.isdecimal() or int(text) == 0):
+        await message.reply(responses.Usage.wrong_format)
+        return
+    hours = int(text or 24)
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours)
+    if message.chat.type == "private":
+        chat_id, groupings = None, ("chat_id", "user_id", "model")
+    else:
+        chat_id, groupings = message.chat.id, ("user_id", "model")
+    totals = {grouping: await usage_service.get_usage_totals(grouping, since, chat_id) for grouping in groupings}
+    if all(len(group_totals) == 0 for group_totals in totals.values()):
+        await message.reply(responses.Usage.empty)
+        return
+    await reply_with_html_fallback(message, responses.Usage.format_report(hours, totals))
+
+
+@common_messages_router.message(Command("cancel"))
+async def cancel_command(
+    message: Message, generation_limiter: GenerationLimiter, logger: Logger = global_logger
+) -> None:
+    """Abort current and queued generation requests of the user in this chat."""
+    count = generation_limiter.cancel(message.chat.id, message.from_user.id)
+    logger.info("User {} cancelled {} generation requests in chat {}", message.from_user.id, count, message.chat.id)
+    await message.reply(responses.cancelled if count > 0 else responses.nothing_to_cancel)
+
+
 @common_messages_router.message(Command("get_preferences"))
 async def get_preferences_command(message: Message, user_preferences_service: UserPreferencesService) -> None:
     """Set temperature preference for user."""
@@ -154,11 +243,12 @@ async def delete_on_bad_reaction_from_admin(
 
 
 @common_messages_router.message(ArtGenerationRequest())
-async def art_generation_request(
+async def art_generation_request(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     message: Message,
     user_service: UserService,
     art_client: ArtClient,
     text: str,
+    checkpoints: StageCheckpoints,
     logger: Logger = global_logger,
 ) -> None:
     """Handle image generation request sending given text as prompt to ArtService."""
@@ -180,10 +270,11 @@ async def art_generation_request(
     await message.react([ReactionTypeEmoji(emoji="👀")])
 
     logger.info("Generating image for a given prompt: {}", text)
+    await release_connection()
     try:
-        img = await art_client.generate(text)
+        img = await checkpoints.run("generate", lambda: art_client.generate(text))
         logger.debug("Finished image generation")
-        await message.reply_photo(BufferedInputFile(img, "generation.jpg"))
+        await checkpoints.run("deliver", lambda: message.reply_photo(BufferedInputFile(img, "generation.jpg")))
         await react_or_pass_on_fail(message, None, logger)
     except ya_exc.ArtInvalidPrompt:
         await message.reply(responses.invalid_prompt_error)
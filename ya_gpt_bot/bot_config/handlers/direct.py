@@ -6,14 +6,18 @@ from aiogram.types import Message
 from loguru import logger as global_logger
 from loguru._logger import Logger
 
+from ya_gpt_bot.background.tasks import BackgroundTasks
 from ya_gpt_bot.bot_config.filters import DirectMessage, GPTGenerationRequest
 from ya_gpt_bot.bot_config.texts import get_responses
-from ya_gpt_bot.bot_config.utils.response import reply_with_html_fallback
+from ya_gpt_bot.bot_config.utils.checkpoints import StageCheckpoints
+from ya_gpt_bot.bot_config.utils.response import reply_with_html_fallback, split_to_multiple_messages
 from ya_gpt_bot.bot_config.utils.text import strip_command_by_space
 from ya_gpt_bot.db.entities.enums import ChatStatus, UserStatus
+from ya_gpt_bot.db.unit_of_work import release_connection
 from ya_gpt_bot.gpt.client import GPTClient
+from ya_gpt_bot.services.dtos import NewMessage
 from ya_gpt_bot.services.messages_service import MessagesService
-from ya_gpt_bot.services.user_preferences_service import UserPreferencesService
+from ya_gpt_bot.services.request_context_service import RequestContextService
 from ya_gpt_bot.services.user_service import UserService
 
 direct_messages_router = Router(name="direct_messages_router")
@@ -71,40 +75,51 @@ async def set_chat_status_command(
 @direct_messages_router.message(GPTGenerationRequest())
 async def text_generation_request(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     message: Message,
-    user_service: UserService,
+    request_context_service: RequestContextService,
     gpt_client: GPTClient,
-    user_preferences_service: UserPreferencesService,
     messages_service: MessagesService,
     text: str,
+    checkpoints: StageCheckpoints,
+    background_tasks: BackgroundTasks,
     logger: Logger = global_logger,
 ) -> None:
     """Handle text generation request sending full request to GPTService."""
     logger.info("Treating as a generation command from user: {}", message.text)
-    status = await user_service.get_user_status(message.from_user.id, False)
-    if status in (UserStatus.BLOCKED, UserStatus.PENDING, UserStatus.UNAUTHORIZED):
-        await message.reply(responses.StatusOnGenerate.get(status))
-        return
-    await messages_service.save_message(
-        message.message_id,
-        (message.reply_to_message.message_id if message.reply_to_message is not None else None),
-        message.chat.id,
-        text,
-        False,
+    reply_id = message.reply_to_message.message_id if message.reply_to_message is not None else None
+    # the replied response may be being saved yet, its dialog would be loaded truncated then
+    await background_tasks.wait_for(("save_messages", message.chat.id))
+    context = await checkpoints.run(
+        "load_context",
+        lambda: request_context_service.get_context(message.from_user.id, message.chat.id, reply_id, True, text),
     )
-    dialog = await messages_service.get_dialog(message.chat.id, message.message_id)
+    if context.user_status in (UserStatus.BLOCKED, UserStatus.PENDING, UserStatus.UNAUTHORIZED):
+        await message.reply(responses.StatusOnGenerate.get(context.user_status))
+        return
+    dialog = context.dialog
     logger.debug("Current dialog: {}", dialog)
 
     await message.bot.send_chat_action(message.chat.id, "typing")
     if text in ("", "None"):
         message.reply(responses.empty_request)
         return
-    preferences = await user_preferences_service.get_preferences(message.from_user.id)
-    response = await gpt_client.request(
-        [e.message for e in dialog], preferences.temperature, preferences.instruction_text, preferences.timeout
+    preferences = context.preferences
+    await release_connection()  # do not hold database connection while the model generates
+    response = await checkpoints.run(
+        "generate",
+        lambda: gpt_client.request(
+            [e.message for e in dialog], preferences.temperature, preferences.instruction_text, preferences.timeout
+        ),
     )
     logger.debug("Generation response: {}", response)
-    results = await reply_with_html_fallback(message, response)
-    for result in results:
-        await messages_service.save_message(
-            result.message_id, result.reply_to_message.message_id, message.chat.id, response, True
-        )
+    results = await reply_with_html_fallback(message, response, checkpoints)
+    saving = [NewMessage(message.message_id, reply_id, message.chat.id, text, False)]
+    saving.extend(
+        NewMessage(result.message_id, message.message_id, message.chat.id, part, True)
+        for result, part in zip(results, split_to_multiple_messages(response))
+    )
+    background_tasks.spawn(
+        messages_service.save_messages(saving),
+        f"save-messages-{message.chat.id}",
+        logger,
+        key=("save_messages", message.chat.id),
+    )
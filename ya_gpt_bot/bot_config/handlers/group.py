@@ -5,15 +5,20 @@ from aiogram.filters import Command
 from aiogram.types import Message
 from loguru._logger import Logger
 
+from ya_gpt_bot.background.tasks import BackgroundTasks
 from ya_gpt_bot.bot_config.filters import DirectMessage, GPTGenerationRequest
 from ya_gpt_bot.bot_config.texts import get_responses
-from ya_gpt_bot.bot_config.utils.response import reply_with_html_fallback
+from ya_gpt_bot.bot_config.utils.checkpoints import StageCheckpoints
+from ya_gpt_bot.bot_config.utils.response import reply_with_html_fallback, split_to_multiple_messages
 from ya_gpt_bot.bot_config.utils.text import strip_command_by_space
 from ya_gpt_bot.db.entities.enums import ChatStatus, UserStatus
+from ya_gpt_bot.db.unit_of_work import release_connection
 from ya_gpt_bot.gpt.client import GPTClient
-from ya_gpt_bot.services.impl.conversation_service import ConversationService
+from ya_gpt_bot.services.dtos import DigestSchedule, NewMessage
+from ya_gpt_bot.services.impl.digest_service import DigestService
+from ya_gpt_bot.services.impl.history_search_service import HistoryIndexNotReady, HistorySearchService
 from ya_gpt_bot.services.messages_service import MessagesService
-from ya_gpt_bot.services.user_preferences_service import UserPreferencesService
+from ya_gpt_bot.services.request_context_service import RequestContextService
 from ya_gpt_bot.services.user_service import UserService
 
 chat_messages_router = Router(name="group_messages_router")
@@ -21,8 +26,6 @@ chat_messages_router.message.filter(~DirectMessage())
 
 responses = get_responses()
 
-CONTEXT_LENGTH = 2**13
-
 
 @chat_messages_router.message(Command("tg_id"))
 async def get_tg_id_command(message: Message) -> None:
@@ -78,65 +81,154 @@ async def set_chat_status_command(message: Message, user_service: UserService, l
 @chat_messages_router.message(GPTGenerationRequest())
 async def text_generation_request(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     message: Message,
-    user_service: UserService,
+    request_context_service: RequestContextService,
     gpt_client: GPTClient,
-    user_preferences_service: UserPreferencesService,
     messages_service: MessagesService,
     logger: Logger,
     text: str,
+    checkpoints: StageCheckpoints,
+    background_tasks: BackgroundTasks,
 ) -> None:
     """Handle text generation request sending full request to GPTService"""
-    user_status = await user_service.get_user_status(message.from_user.id, False)
-    chat_status = await user_service.get_chat_status(message.chat.id)
-    if user_status == UserStatus.BLOCKED:
+    reply_id = message.reply_to_message.message_id if message.reply_to_message is not None else None
+    # the replied response may be being saved yet, its dialog would be loaded truncated then
+    await background_tasks.wait_for(("save_messages", message.chat.id))
+    context = await checkpoints.run(
+        "load_context",
+        lambda: request_context_service.get_context(message.from_user.id, message.chat.id, reply_id, False, text),
+    )
+    if context.user_status == UserStatus.BLOCKED:
         await message.reply(responses.StatusOnGenerate.blocked)
         return
     if (
-        user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN, UserStatus.AUTHORIZED)
-        and chat_status != ChatStatus.AUTHORIZED
+        context.user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN, UserStatus.AUTHORIZED)
+        and context.chat_status != ChatStatus.AUTHORIZED
     ):
         await message.reply(responses.StatusRequest.pending)
 
     logger.debug("Got generatinon request message: {}", text)
-    await messages_service.save_message(
-        message.message_id,
-        (message.reply_to_message.message_id if message.reply_to_message is not None else None),
-        message.chat.id,
-        text,
-        False,
-    )
-    dialog = await messages_service.get_dialog(message.chat.id, message.message_id)
+    dialog = context.dialog
     logger.debug("Current dialog: {}", dialog)
 
     await message.bot.send_chat_action(message.chat.id, "typing")
-    preferences = await user_preferences_service.get_preferences(message.from_user.id)
-
-    response = await gpt_client.request(
-        [e.message for e in dialog], preferences.temperature, preferences.instruction_text, preferences.timeout
+    preferences = context.preferences
+    await release_connection()  # do not hold database connection while the model generates
+
+    response = await checkpoints.run(
+        "generate",
+        lambda: gpt_client.request(
+            [e.message for e in dialog], preferences.temperature, preferences.instruction_text, preferences.timeout
+        ),
     )
     logger.debug("Generation response: {}", response)
-    results = await reply_with_html_fallback(message, response)
-    for result in results:
-        await messages_service.save_message(
-            result.message_id, result.reply_to_message.message_id, message.chat.id, response, True
-        )
+    results = await reply_with_html_fallback(message, response, checkpoints)
+    saving = [NewMessage(message.message_id, reply_id, message.chat.id, text, False)]
+    saving.extend(
+        NewMessage(result.message_id, message.message_id, message.chat.id, part, True)
+        for result, part in zip(results, split_to_multiple_messages(response))
+    )
+    background_tasks.spawn(
+        messages_service.save_messages(saving),
+        f"save-messages-{message.chat.id}",
+        logger,
+        key=("save_messages", message.chat.id),
+    )
 
 
 @chat_messages_router.message(Command("digest"))
-async def digest_request(
-    message: Message,
-    conversation_service: ConversationService,
-    gpt_client: GPTClient,
-):
-    """Launch chat digest and delete saved history."""
+async def digest_request(message: Message, digest_service: DigestService, logger: Logger):
+    """Return chat digest - the stored one with incremental top-up or a freshly generated. Repeated requests
+    are answered with a reply to the already posted digest.
+    """
     chat_id = message.chat.id
-    messages = await conversation_service.get_chat_messages_history(chat_id, CONTEXT_LENGTH)
-    if not messages:
-        await message.bot.send_message(chat_id, text="Что-то пошло не так - ни одно сообщение не попало в контекст")
+
+    async def post(model_response: str | None) -> int | None:
+        if model_response is None:
+            await message.bot.send_message(chat_id, text=responses.Digest.empty)
+            return None
+        results = await reply_with_html_fallback(message, model_response)
+        return results[0].message_id
+
+    message_id, is_posted = await digest_service.post_digest(chat_id, post, logger)
+    if not is_posted and message_id is not None:
+        await message.answer(responses.Digest.already_posted, reply_to_message_id=message_id)
+
+
+@chat_messages_router.message(Command("ask"))
+async def ask_command(
+    message: Message,
+    user_service: UserService,
+    history_search_service: HistorySearchService,
+    checkpoints: StageCheckpoints,
+    logger: Logger,
+) -> None:
+    """Answer the question using only relevant messages of the saved chat history."""
+    question = strip_command_by_space(message.text)
+    if question == "":
+        await message.reply(responses.Ask.empty_question)
         return
-    model_response = await gpt_client.request(
-        messages,
-        creativity_override=0.0,
-        instruction_text_override=conversation_service.get_instruction_prompt(),
-    )
-    await reply_with_html_fallback(message, model_response)
+    user_status = await user_service.get_user_status(message.from_user.id, False)
+    chat_status = await user_service.get_chat_status(message.chat.id)
+    if user_status == UserStatus.BLOCKED:
+        await message.reply(responses.StatusOnGenerate.blocked)
+        return
+    if (
+        user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN, UserStatus.AUTHORIZED)
+        and chat_status != ChatStatus.AUTHORIZED
+    ):
+        await message.reply(responses.StatusRequest.pending)
+        return
+
+    await message.bot.send_chat_action(message.chat.id, "typing")
+    try:
+        response = await checkpoints.run(
+            "generate", lambda: history_search_service.answer(message.chat.id, question, logger)
+        )
+    except HistoryIndexNotReady:
+        await message.reply(responses.Ask.index_building)
+        return
+    if response is None:
+        await message.reply(responses.Ask.not_found)
+        return
+    await reply_with_html_fallback(message, response, checkpoints)
+
+
+@chat_messages_router.message(Command("digest_schedule"))
+async def digest_schedule_command(
+    message: Message, user_service: UserService, digest_service: DigestService, logger: Logger
+) -> None:
+    """Show or set background digest schedule of the current chat if user has sufficient rights."""
+    parts = strip_command_by_space(message.text).split()
+    if len(parts) == 0:
+        schedule = await digest_service.get_schedule(message.chat.id)
+        await message.reply(
+            responses.Digest.format_schedule(schedule) if schedule is not None else responses.Digest.schedule_not_set
+        )
+        return
+    if not (
+        len(parts) == 1
+        and parts[0].lower() == "off"
+        or len(parts) == 2
+        and parts[0].lower() in ("messages", "hours")
+        and parts[1].isdecimal()
+        and int(parts[1]) > 0
+    ):
+        await message.reply(responses.Digest.wrong_format_schedule)
+        return
+    user_status = await user_service.get_user_status(message.from_user.id, False)
+    if user_status not in (UserStatus.SUPERADMIN, UserStatus.ADMIN):
+        await message.reply(responses.SetStatus.unsufficient_permissions)
+        return
+
+    if len(parts) == 1:
+        await digest_service.delete_schedule(message.chat.id)
+        logger.info("User {} disabled background digest for chat {}", message.from_user.id, message.chat.id)
+        await message.reply(responses.Digest.schedule_disabled)
+        return
+    if parts[0].lower() == "messages":
+        schedule = DigestSchedule(every_messages=int(parts[1]))
+    else:
+        schedule = DigestSchedule(every_minutes=int(parts[1]) * 60)
+    await digest_service.set_schedule(message.chat.id, schedule)
+    logger.info("User {} set background digest for chat {}: {}", message.from_user.id, message.chat.id, schedule)
+    await message.reply(responses.Digest.format_schedule(schedule))
@@ -1,62 +1,339 @@
 """Bot configuration is defined here."""
 
-from typing import NoReturn
+from dataclasses import dataclass
+from typing import Awaitable, Callable, NoReturn
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from loguru import logger as global_logger
 from loguru._logger import Logger
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine
 
+from ya_gpt_bot.background.digest_scheduler import DigestScheduler
+from ya_gpt_bot.background.maintenance import MaintenanceScheduler
+from ya_gpt_bot.background.status_registry import StatusRegistry
+from ya_gpt_bot.background.tasks import BackgroundTasks
 from ya_gpt_bot.bot_config.middlewares.digest import DigestHistorySavingMiddleware
+from ya_gpt_bot.bot_config.middlewares.generation_limit import GenerationLimiter, GenerationLimitMiddleware
 from ya_gpt_bot.bot_config.middlewares.generation_request import TreatPrefixesMiddleware
 from ya_gpt_bot.bot_config.middlewares.logging import LoggingMiddleware
 from ya_gpt_bot.bot_config.middlewares.retrying import RetryingMiddleware
+from ya_gpt_bot.bot_config.middlewares.unit_of_work import UnitOfWorkMiddleware
+from ya_gpt_bot.bot_config.middlewares.usage import UsageMiddleware
 from ya_gpt_bot.bot_config.utils.messages import get_should_ignore_func
-from ya_gpt_bot.config.app_config import AppConfig
+from ya_gpt_bot.config.app_config import BACKGROUND_CONNECTIONS, AppConfig
+from ya_gpt_bot.db.prepared import PreparedStatements
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.gpt.client import GPTClient
+from ya_gpt_bot.services.cache import DialogCache, TTLCache
+from ya_gpt_bot.services.conversation_store import ConversationStore
+from ya_gpt_bot.services.impl.cached_user_preferences_service import CachedUserPreferencesService
+from ya_gpt_bot.services.impl.cached_user_service import CachedUserService
 from ya_gpt_bot.services.impl.conversation_service import ConversationService
+from ya_gpt_bot.services.impl.digest_service import CONTEXT_LENGTH, DigestService
+from ya_gpt_bot.services.impl.history_search_service import HistorySearchService
 from ya_gpt_bot.services.impl.messages_service import MessagesServicePostgres
+from ya_gpt_bot.services.impl.prepared_messages_service import PreparedMessagesService
+from ya_gpt_bot.services.impl.prepared_user_preferences_service import PreparedUserPreferencesService
+from ya_gpt_bot.services.impl.prepared_user_service import PreparedUserService
+from ya_gpt_bot.services.impl.replicated_user_service import ReplicatedUserService
+from ya_gpt_bot.services.impl.request_context_service import RequestContextServicePostgres
+from ya_gpt_bot.services.impl.sqlite_conversation_service import ConversationServiceSQLite
+from ya_gpt_bot.services.impl.sqlite_digest_service import DigestServiceSQLite
+from ya_gpt_bot.services.impl.sqlite_messages_service import MessagesServiceSQLite
+from ya_gpt_bot.services.impl.sqlite_request_context_service import RequestContextServiceSQLite
+from ya_gpt_bot.services.impl.sqlite_usage_service import UsageServiceSQLite
+from ya_gpt_bot.services.impl.sqlite_user_preferences_service import UserPreferencesServiceSQLite
+from ya_gpt_bot.services.impl.sqlite_user_service import UserServiceSQLite
+from ya_gpt_bot.services.impl.usage_service import UsageServicePostgres
 from ya_gpt_bot.services.impl.user_preferences_service import UserPreferencesServicePostgres
 from ya_gpt_bot.services.impl.user_service import UserServicePostgres
+from ya_gpt_bot.services.messages_service import MessagesService
+from ya_gpt_bot.services.request_context_service import RequestContextService
+from ya_gpt_bot.services.usage_service import UsageService
+from ya_gpt_bot.services.user_service import UserService
 
 from .routers import routers_list
 
 
-async def run_bot(config: AppConfig, logger: Logger = global_logger) -> NoReturn:
-    """Launch bot handlers."""
-    gpt_client = config.yc.get_gpt_client()
-    art_client = config.yc.get_art_client()
+def _storage_services(
+    config: AppConfig, engine: AsyncEngine, dialog_cache: DialogCache, replica_router: ReplicaRouter | None
+) -> tuple[UserServicePostgres, UserPreferencesServicePostgres, MessagesServicePostgres]:
+    """Return users, preferences and messages storage services executing the hot queries as prepared asyncpg
+    statements if it is enabled by config.
+    """
+    if not config.db.prepared_statements:
+        return (
+            UserServicePostgres(engine),
+            UserPreferencesServicePostgres(engine, replica_router),
+            MessagesServicePostgres(engine, dialog_cache, replica_router),
+        )
+    statements = PreparedStatements(named=not config.db.pgbouncer)
+    return (
+        PreparedUserService(engine, statements),
+        PreparedUserPreferencesService(engine, statements, replica_router),
+        PreparedMessagesService(engine, statements, dialog_cache, replica_router),
+    )
+
+
+def _check_pool_size(config: AppConfig, logger: Logger) -> None:
+    """Warn if the updates handling pool can not serve all the generations allowed by waiters simultaneously,
+    as the requests would queue for connections instead, or the background pool can not serve all the jobs.
+    """
+    concurrency = sum(
+        waiter.kwargs.get("simultanious_requests", 1) for waiter in (config.yc.ya_gpt.waiter, config.yc.ya_art.waiter)
+    )
+    if config.db.pool_size + config.db.max_overflow < concurrency:
+        logger.warning(
+            "Database pool size {} (+{} overflow) is less than {} simultanious requests allowed by waiters,"
+            " requests will wait for connections",
+            config.db.pool_size,
+            config.db.max_overflow,
+            concurrency,
+        )
+    if config.db.background_pool_size < BACKGROUND_CONNECTIONS:
+        logger.warning(
+            "Background database pool size {} is less than {} connections taken by the background jobs,"
+            " they will wait for connections",
+            config.db.background_pool_size,
+            BACKGROUND_CONNECTIONS,
+        )
+
+
+@dataclass
+class _Storage:  # pylint: disable=too-many-instance-attributes
+    """Storage services of the configured database backend. `scheduler_engine` is used by the digests scheduler
+    leader election (None for single-node storages), `stop` stops the background workers and closes the database.
+    """
 
+    user_service: UserService
+    user_preferences_service: CachedUserPreferencesService
+    messages_service: MessagesService
+    request_context_service: RequestContextService
+    conversation_service: ConversationStore
+    digest_service: DigestService
+    usage_service: UsageService
+    caches: dict[str, TTLCache | DialogCache]
+    engines: dict[str, AsyncEngine]
+    status_registry: StatusRegistry | None
+    unit_of_work_engine: AsyncEngine | None
+    scheduler_engine: AsyncEngine | None
+    stop: Callable[[], Awaitable[None]]
+
+
+async def _postgres_storage(  # pylint: disable=too-many-locals
+    config: AppConfig, gpt_client: GPTClient, background_gpt_client: GPTClient | None, logger: Logger
+) -> _Storage:
+    """Return PostgreSQL storage services with the statuses registry, read replicas routing, conversation
+    write buffer and maintenance started. Missing partitions are created first, RuntimeError is raised
+    if rows of the current time can not be saved.
+    """
     logger.info(
-        "Creating connection pool with max_size = {} on postgresql://{}@{}:{}/{}",
+        "Creating connection pools of size {} (+{} overflow) and {} for background jobs on postgresql://{}@{}:{}/{}",
         config.db.pool_size,
+        config.db.max_overflow,
+        config.db.background_pool_size,
         config.db.user,
         config.db.host,
         config.db.port,
         config.db.name,
     )
-    engine = create_async_engine(
-        f"postgresql+asyncpg://{config.db.user}:{config.db.password}@{config.db.host}:"
-        f" {config.db.port}/{config.db.name}",
-        future=True,
-        pool_size=min(2, config.db.pool_size - 5),
-        max_overflow=5,
-        connect_args={"server_settings": {"application_name": config.db.application_name}},
+    _check_pool_size(config, logger)
+    engine = config.db.get_engine()
+    background_engine = config.db.get_background_engine()
+    maintenance_scheduler = MaintenanceScheduler(background_engine, config.maintenance, logger)
+    await maintenance_scheduler.ensure_partitions()
+
+    replica_engines = config.db.get_replica_engines()
+    replica_router = None
+    if len(replica_engines) > 0:
+        replica_router = ReplicaRouter(
+            engine,
+            replica_engines,
+            config.db.replica_max_lag_seconds,
+            config.db.replica_check_interval_seconds,
+            logger=logger,
+        )
+        replica_router.start()
+    dialog_cache = DialogCache(config.db.dialog_cache_max_bytes)
+    user_service_impl, user_preferences_service_impl, messages_service = _storage_services(
+        config, engine, dialog_cache, replica_router
+    )
+
+    status_registry = StatusRegistry(background_engine, logger=logger)
+    caches: dict[str, TTLCache | DialogCache] = {}
+    if config.db.status_replication:
+        status_registry.start()
+        if not await status_registry.wait_ready(10):
+            logger.warning("Statuses registry is not loaded yet, statuses are read from the database until it is")
+        user_service: UserService = ReplicatedUserService(user_service_impl, status_registry)
+    else:
+        user_service = CachedUserService(user_service_impl, config.db.cache_max_size, config.db.cache_ttl_seconds)
+        caches |= {"user_status": user_service.user_statuses, "chat_status": user_service.chat_statuses}
+    user_preferences_service = CachedUserPreferencesService(
+        user_preferences_service_impl, config.db.cache_max_size, config.db.cache_ttl_seconds
+    )
+    request_context_service = RequestContextServicePostgres(
+        engine, status_registry if config.db.status_replication else None, dialog_cache, replica_router
+    )
+    conversation_service = ConversationService(
+        engine,
+        write_buffer_size=config.digest.write_buffer_size,
+        write_batch_size=config.digest.write_batch_size,
+        write_interval=config.digest.write_interval_seconds,
+        write_max_wait=config.digest.write_max_wait_seconds,
+        history_capacity=CONTEXT_LENGTH,
+        history_max_chats=config.digest.history_max_chats,
+        replica_router=replica_router,
+        logger=logger,
+    )
+    conversation_service.start_write_buffer()
+    digest_service = DigestService(
+        engine,
+        conversation_service,
+        gpt_client,
+        background_gpt_client,
+        top_up_length=config.digest.top_up_length,
+        posted_digest_ttl=config.digest.posted_digest_ttl_seconds,
+    )
+    if config.maintenance.enabled:
+        maintenance_scheduler.start()
+    usage_service = UsageServicePostgres(
+        engine,
+        background_engine,
+        config.usage.flush_interval_seconds,
+        config.usage.max_pending_keys,
+        replica_router,
+        logger,
+    )
+    if config.usage.enabled:
+        usage_service.start()
+
+    async def stop() -> None:
+        await conversation_service.stop_write_buffer()
+        await usage_service.stop()
+        await maintenance_scheduler.stop()
+        await status_registry.stop()
+        if replica_router is not None:
+            await replica_router.stop()
+        await engine.dispose()
+        await background_engine.dispose()
+        for replica in replica_engines:
+            await replica.dispose()
+
+    return _Storage(
+        user_service,
+        user_preferences_service,
+        messages_service,
+        request_context_service,
+        conversation_service,
+        digest_service,
+        usage_service,
+        caches | {"preferences": user_preferences_service.preferences, "dialogs": dialog_cache},
+        {"requests": engine, "background": background_engine}
+        | {f"replica {replica.url.host}:{replica.url.port}": replica for replica in replica_engines},
+        status_registry,
+        engine,
+        background_engine,
+        stop,
+    )
+
+
+def _sqlite_storage(
+    config: AppConfig, gpt_client: GPTClient, background_gpt_client: GPTClient | None, logger: Logger
+) -> _Storage:
+    """Return SQLite storage services. Statuses and preferences are cached in memory, as there is the only
+    bot process writing them.
+    """
+    logger.info("Opening SQLite database {}", config.db.sqlite_path)
+    database = SQLiteDatabase(config.db.sqlite_path)
+    user_service = CachedUserService(UserServiceSQLite(database), config.db.cache_max_size, config.db.cache_ttl_seconds)
+    user_preferences_service = CachedUserPreferencesService(
+        UserPreferencesServiceSQLite(database), config.db.cache_max_size, config.db.cache_ttl_seconds
+    )
+    conversation_service = ConversationServiceSQLite(database)
+    digest_service = DigestServiceSQLite(
+        database,
+        conversation_service,
+        gpt_client,
+        background_gpt_client,
+        top_up_length=config.digest.top_up_length,
+        posted_digest_ttl=config.digest.posted_digest_ttl_seconds,
+    )
+    usage_service = UsageServiceSQLite(
+        database, config.usage.flush_interval_seconds, config.usage.max_pending_keys, logger
+    )
+    if config.usage.enabled:
+        usage_service.start()
+
+    async def stop() -> None:
+        await usage_service.stop()
+        await database.close()
+
+    return _Storage(
+        user_service,
+        user_preferences_service,
+        MessagesServiceSQLite(database),
+        RequestContextServiceSQLite(database),
+        conversation_service,
+        digest_service,
+        usage_service,
+        {
+            "user_status": user_service.user_statuses,
+            "chat_status": user_service.chat_statuses,
+            "preferences": user_preferences_service.preferences,
+        },
+        {},
+        None,
+        None,
+        None,
+        stop,
+    )
+
+
+async def run_bot(config: AppConfig, logger: Logger = global_logger) -> NoReturn:  # pylint: disable=too-many-locals
+    """Launch bot handlers."""
+    gpt_client = config.yc.get_gpt_client()
+    art_client = config.yc.get_art_client()
+    background_gpt_client = config.yc.get_background_gpt_client()
+
+    if config.db.backend == "sqlite":
+        storage = _sqlite_storage(config, gpt_client, background_gpt_client, logger)
+    else:
+        storage = await _postgres_storage(config, gpt_client, background_gpt_client, logger)
+    history_search_service = HistorySearchService(
+        storage.conversation_service,
+        gpt_client,
+        max_chats=config.history_search.max_chats,
+        max_documents=config.history_search.max_messages_per_chat,
+        top_k=config.history_search.top_k,
+        context_length=config.history_search.context_length,
+        build_timeout=config.history_search.build_timeout_seconds,
+    )
+    generation_limiter = GenerationLimiter(
+        config.tg_bot.max_generations_per_chat, config.tg_bot.max_generations_per_user
     )
 
-    user_service = UserServicePostgres(engine)
-    user_preferences_service = UserPreferencesServicePostgres(engine)
-    messages_service = MessagesServicePostgres(engine)
-    conversation_service = ConversationService(engine)
+    background_tasks = BackgroundTasks(logger)
 
     dp = Dispatcher(
         gpt_client=gpt_client,
         art_client=art_client,
-        user_service=user_service,
-        user_preferences_service=user_preferences_service,
-        messages_service=messages_service,
-        conversation_service=conversation_service,
+        user_service=storage.user_service,
+        user_preferences_service=storage.user_preferences_service,
+        messages_service=storage.messages_service,
+        request_context_service=storage.request_context_service,
+        conversation_service=storage.conversation_service,
+        digest_service=storage.digest_service,
+        usage_service=storage.usage_service,
+        history_search_service=history_search_service,
+        generation_limiter=generation_limiter,
+        caches=storage.caches,
+        engines=storage.engines,
+        status_registry=storage.status_registry,
+        background_tasks=background_tasks,
     )
 
     dp.include_routers(*routers_list)
@@ -65,6 +342,8 @@ async def run_bot(config: AppConfig, logger: Logger = global_logger) -> NoReturn
     if "/generate" not in config.tg_bot.art_trigger_prefixes:
         config.tg_bot.art_trigger_prefixes.append("/generate")
     dp.message.outer_middleware(LoggingMiddleware(logger, 2))
+    if config.usage.enabled:
+        dp.message.outer_middleware(UsageMiddleware(storage.usage_service))
     dp.message.outer_middleware(
         TreatPrefixesMiddleware(
             config.tg_bot.gpt_trigger_prefixes,
@@ -72,14 +351,41 @@ async def run_bot(config: AppConfig, logger: Logger = global_logger) -> NoReturn
             get_should_ignore_func(config.tg_bot.ignore_prefixes, config.tg_bot.ignore_postfixes),
         )
     )
-    dp.message.outer_middleware(DigestHistorySavingMiddleware(conversation_service))
-    dp.message.outer_middleware(RetryingMiddleware(config.tg_bot.max_retry_count))
+    if storage.unit_of_work_engine is not None:
+        dp.message.outer_middleware(UnitOfWorkMiddleware(storage.unit_of_work_engine))
+    dp.message.outer_middleware(
+        DigestHistorySavingMiddleware(storage.conversation_service, storage.digest_service, history_search_service)
+    )
+    dp.message.outer_middleware(GenerationLimitMiddleware(generation_limiter))
+    dp.message.outer_middleware(
+        RetryingMiddleware(
+            config.tg_bot.max_retry_count,
+            config.tg_bot.retry_base_delay_seconds,
+            config.tg_bot.retry_max_delay_seconds,
+            config.tg_bot.request_deadline_seconds,
+        )
+    )
 
     bot = Bot(config.tg_bot.token, default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN))
 
+    digest_scheduler = DigestScheduler(
+        storage.scheduler_engine,
+        storage.digest_service,
+        config.digest.poll_interval_seconds,
+        config.digest.retry_after_seconds,
+        logger,
+    )
+    if config.digest.scheduler_enabled:
+        digest_scheduler.start()
+
     logger.info("Starting polling Telegram bot.")
     try:
         await dp.start_polling(bot)
     finally:
+        await background_tasks.wait(10)
+        await digest_scheduler.stop()
+        await storage.stop()
         await gpt_client.close()
         await art_client.close()
+        if background_gpt_client is not None:
+            await background_gpt_client.close()
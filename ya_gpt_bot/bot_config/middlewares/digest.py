@@ -6,14 +6,25 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message, TelegramObject
 from loguru._logger import Logger
 
-from ya_gpt_bot.services.impl.conversation_service import ConversationService
+from ya_gpt_bot.db.unit_of_work import current_unit
+from ya_gpt_bot.services.conversation_store import ConversationStore
+from ya_gpt_bot.services.impl.conversation_service import format_message
+from ya_gpt_bot.services.impl.digest_service import DigestService
+from ya_gpt_bot.services.impl.history_search_service import HistorySearchService
 
 
 class DigestHistorySavingMiddleware(BaseMiddleware):  # pylint: disable=too-few-public-methods
     """Log every user action as info, exception tracebacks as debug."""
 
-    def __init__(self, conversation_service: ConversationService):
+    def __init__(
+        self,
+        conversation_service: ConversationStore,
+        digest_service: DigestService | None = None,
+        history_search_service: HistorySearchService | None = None,
+    ):
         self._conversation_service = conversation_service
+        self._digest_service = digest_service
+        self._history_search_service = history_search_service
 
     async def __call__(
         self,
@@ -28,6 +39,9 @@ class DigestHistorySavingMiddleware(BaseMiddleware):  # pylint: disable=too-few-
                 await self._handle_saving(event)
             except Exception as exc:  # pylint: disable=broad-except
                 logger.warning("Could not save message for a digest: {!r}", exc)
+                unit = current_unit()
+                if unit is not None:  # failed transaction would break the following handler queries
+                    await unit.rollback()
         return await handler(event, data)
 
     async def _handle_saving(self, message: Message) -> None:
@@ -42,3 +56,9 @@ class DigestHistorySavingMiddleware(BaseMiddleware):  # pylint: disable=too-few-
             message_timestamp=message.date,
             text=text,
         )
+        if self._digest_service is not None:
+            self._digest_service.note_new_message(message.chat.id)
+        if self._history_search_service is not None:
+            self._history_search_service.add_message(
+                message.chat.id, format_message(message.from_user.username, to_name, text), message.date
+            )
@@ -0,0 +1,154 @@
+"""Generation requests concurrency limiting middleware is defined here."""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from loguru._logger import Logger
+
+from ya_gpt_bot.db.unit_of_work import release_connection
+
+_T = TypeVar("_T")
+
+
+class GenerationCancelled(RuntimeError):
+    """Generation request is cancelled by the user or superseded by a newer one before it has started."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@dataclass
+class _Request:
+    chat_id: int
+    user_id: int
+    started: asyncio.Future[None]
+    task: asyncio.Task | None = None
+    cancelled: bool = False
+
+
+class GenerationLimiter:
+    """Limits the number of generations running at once in every chat and for every user in a chat.
+
+    Requests exceeding the limits are queued in order of arrival. A newer request of the user supersedes their older
+    request in the same chat which is still queued, `cancel` aborts queued and running requests of the user.
+    """
+
+    def __init__(self, max_per_chat: int = 2, max_per_user: int = 1):
+        self.max_per_chat = max_per_chat
+        self.max_per_user = max_per_user
+        self._queue: list[_Request] = []
+        self._running: list[_Request] = []
+        self._running_per_chat: dict[int, int] = {}
+        self._running_per_user: dict[tuple[int, int], int] = {}
+
+    @property
+    def running_count(self) -> int:
+        """Number of generations running at the moment."""
+        return len(self._running)
+
+    @property
+    def queued_count(self) -> int:
+        """Number of generations waiting for their turn."""
+        return len(self._queue)
+
+    async def run(self, chat_id: int, user_id: int, func: Callable[[], Awaitable[_T]]) -> _T:
+        """Run `func` as soon as the limits of the chat and the user allow it and return its result.
+
+        Raise `GenerationCancelled` if the request is superseded while queued or cancelled by the user.
+        """
+        for other in self._queue:
+            if other.chat_id == chat_id and other.user_id == user_id:
+                self._cancel_queued(other, "superseded")
+        request = _Request(chat_id, user_id, asyncio.get_running_loop().create_future())
+        self._queue.append(request)
+        self._dispatch()
+        try:
+            await request.started
+        except asyncio.CancelledError:
+            if request in self._queue:
+                self._queue.remove(request)
+            elif request in self._running:
+                self._release(request)
+            raise
+
+        try:
+            if request.cancelled:
+                raise GenerationCancelled("cancelled")
+            request.task = asyncio.create_task(func())
+            try:
+                return await request.task
+            except asyncio.CancelledError as exc:
+                if request.cancelled and request.task.cancelled():
+                    raise GenerationCancelled("cancelled") from exc
+                raise
+        finally:
+            self._release(request)
+
+    def cancel(self, chat_id: int, user_id: int) -> int:
+        """Cancel all queued and running generations of the user in the chat. Return the number of cancelled ones."""
+        count = 0
+        for request in list(self._queue):
+            if request.chat_id == chat_id and request.user_id == user_id:
+                self._cancel_queued(request, "cancelled")
+                count += 1
+        for request in self._running:
+            if request.chat_id == chat_id and request.user_id == user_id and not request.cancelled:
+                request.cancelled = True
+                if request.task is not None:
+                    request.task.cancel()
+                count += 1
+        return count
+
+    def _cancel_queued(self, request: _Request, reason: str) -> None:
+        self._queue.remove(request)
+        request.cancelled = True
+        request.started.set_exception(GenerationCancelled(reason))
+
+    def _dispatch(self) -> None:
+        for request in list(self._queue):
+            user_key = (request.chat_id, request.user_id)
+            if (
+                self._running_per_chat.get(request.chat_id, 0) < self.max_per_chat
+                and self._running_per_user.get(user_key, 0) < self.max_per_user
+            ):
+                self._queue.remove(request)
+                self._running.append(request)
+                self._running_per_chat[request.chat_id] = self._running_per_chat.get(request.chat_id, 0) + 1
+                self._running_per_user[user_key] = self._running_per_user.get(user_key, 0) + 1
+                request.started.set_result(None)
+
+    def _release(self, request: _Request) -> None:
+        self._running.remove(request)
+        user_key = (request.chat_id, request.user_id)
+        for counter, key in ((self._running_per_chat, request.chat_id), (self._running_per_user, user_key)):
+            counter[key] -= 1
+            if counter[key] == 0:  # do not keep counters of inactive chats
+                del counter[key]
+        self._dispatch()
+
+
+class GenerationLimitMiddleware(BaseMiddleware):  # pylint: disable=too-few-public-methods
+    """Run text and art generation requests through the `GenerationLimiter`."""
+
+    def __init__(self, limiter: GenerationLimiter):
+        self._limiter = limiter
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ):
+        if not isinstance(event, Message) or not (data.get("is_gpt_request") or data.get("is_art_request")):
+            return await handler(event, data)
+        logger: Logger = data["logger"]
+        await release_connection()  # do not hold database connection while waiting in the queue
+        try:
+            return await self._limiter.run(event.chat.id, event.from_user.id, lambda: handler(event, data))
+        except GenerationCancelled as exc:
+            logger.info("Generation request of user {} is {}", event.from_user.id, exc.reason)
+            return None
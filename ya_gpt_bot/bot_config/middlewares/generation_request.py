@@ -50,8 +50,8 @@ def _check_generation_commands(message: Message, data: dict[str, Any], prefixes:
             data[p.target] = True
             return
 
-    # generation by default in direct messages
-    if message.chat.type == "private":
+    # generation by default in direct messages, except for bot commands
+    if message.chat.type == "private" and not text.startswith("/"):
         data["text"] = text
         data["is_gpt_request"] = True
         return
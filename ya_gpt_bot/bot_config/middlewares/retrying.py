@@ -1,6 +1,8 @@
 """Retrying middleware is defined here."""
 
 import asyncio
+import random
+import time
 from typing import Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware
@@ -8,6 +10,7 @@ from aiogram.exceptions import TelegramNetworkError
 from aiogram.types import TelegramObject
 from loguru._logger import Logger
 
+from ya_gpt_bot.bot_config.utils.checkpoints import StageCheckpoints
 from ya_gpt_bot.ya_gpt import exceptions as ya_exc
 
 
@@ -21,11 +24,23 @@ def is_retryable(exc: Exception) -> bool:
 
 
 class RetryingMiddleware(BaseMiddleware):  # pylint: disable=too-few-public-methods
-    """Retry certain exceptions given amount of times."""
+    """Retry certain exceptions given amount of times with exponential backoff.
 
-    def __init__(self, max_retry_count: int):
+    Handlers split their work to stages with `StageCheckpoints` passed as `checkpoints` data key, so a retry
+    continues from the stage that has failed. Retries are not started if the backoff delay would exceed the
+    request deadline.
+    """
+
+    def __init__(self, max_retry_count: int, base_delay: float = 1.0, max_delay: float = 30.0, deadline: float = 120.0):
         super().__init__()
         self.max_retry_count = max_retry_count
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def get_delay(self, try_number: int) -> float:
+        """Return backoff delay before the retry following the given (zero-based) try: exponential with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**try_number))
 
     async def __call__(
         self,
@@ -34,17 +49,32 @@ class RetryingMiddleware(BaseMiddleware):  # pylint: disable=too-few-public-meth
         data: dict[str, Any],
     ):
         logger: Logger = data["logger"]
+        checkpoints = StageCheckpoints()
+        data["checkpoints"] = checkpoints
+        deadline = time.monotonic() + self.deadline
         for try_number in range(self.max_retry_count):
             try:
-                await handler(event, data)
-                break
+                return await handler(event, data)
             except Exception as exc:  # pylint: disable=broad-except
-                logger.warning("event {} failed with following error: {!r}", data["event_id"], exc)
+                stage = checkpoints.current_stage or "<handler>"
+                logger.warning("event {} failed on stage {} with following error: {!r}", data["event_id"], stage, exc)
                 if not is_retryable(exc):
                     logger.debug("Non-retryable error for event {}: {}", data["event_id"], type(exc))
                     raise
-                if try_number < self.max_retry_count - 1:
+                if try_number >= self.max_retry_count - 1:
                     logger.debug("Retry counts are finished for event {}", data["event_id"])
                     raise
-                logger.debug("retrying event {} in 5 seconds", data["event_id"])
-                asyncio.sleep(5)
+                delay = self.get_delay(try_number)
+                if time.monotonic() + delay >= deadline:
+                    logger.debug("Request deadline would be exceeded by retrying event {}", data["event_id"])
+                    raise
+                logger.debug(
+                    "retrying event {} from stage {} in {:.2f} seconds (try {} of {})",
+                    data["event_id"],
+                    stage,
+                    delay,
+                    try_number + 2,
+                    self.max_retry_count,
+                )
+                await asyncio.sleep(delay)
+        return None
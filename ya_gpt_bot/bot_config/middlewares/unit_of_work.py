@@ -0,0 +1,27 @@
+"""Unit of work middleware is defined here."""
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ya_gpt_bot.db.unit_of_work import UnitOfWork
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):  # pylint: disable=too-few-public-methods
+    """Handle every update within a `UnitOfWork`, so services share a single lazily acquired database connection.
+    Changes are committed when the update is handled and rolled back on error.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self._engine = engine
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ):
+        async with UnitOfWork(self._engine):
+            return await handler(event, data)
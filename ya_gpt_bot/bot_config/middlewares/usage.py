@@ -0,0 +1,38 @@
+"""Model usage accounting middleware is defined here."""
+
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+from ya_gpt_bot.gpt.usage import usage_scope
+from ya_gpt_bot.services.usage_service import UsageService
+
+
+class UsageMiddleware(BaseMiddleware):  # pylint: disable=too-few-public-methods
+    """Account tokens of the model requests made during a message handling (including retries and failed
+    handling) and the handling time by the user and the chat. Messages handled without model requests
+    are not accounted.
+    """
+
+    def __init__(self, usage_service: UsageService):
+        self._usage_service = usage_service
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ):
+        if not isinstance(event, Message) or event.from_user is None:
+            return await handler(event, data)
+        started = time.perf_counter()
+        with usage_scope() as usage:
+            try:
+                return await handler(event, data)
+            finally:
+                if len(usage) > 0:
+                    self._usage_service.record_usage(
+                        event.from_user.id, event.chat.id, usage, time.perf_counter() - started
+                    )
@@ -7,6 +7,9 @@ from loguru import logger as global_logger
 from loguru._logger import Logger
 
 from ya_gpt_bot.db.entities.enums import ChatStatus, UserStatus
+from ya_gpt_bot.db.pool_metrics import PoolStats
+from ya_gpt_bot.services.cache import CacheStats
+from ya_gpt_bot.services.dtos import DigestJob, DigestSchedule, UsageTotal
 
 
 class StatusRequest:
@@ -84,6 +87,85 @@ class Preferences:
         )
 
 
+class Digest:
+    """Digest commands responses"""
+
+    empty = "Что-то пошло не так - ни одно сообщение не попало в контекст"
+    already_posted = "Пересказ уже здесь, новых сообщений с тех пор не было."
+    wrong_format_schedule = (
+        "Ошибка в формате ввода. Корректный запрос: /digest_schedule **messages :N:** (каждые N сообщений),"
+        " /digest_schedule **hours :N:** (каждые N часов) или /digest_schedule **off** (отключить)."
+    )
+    schedule_disabled = "Фоновое составление пересказа отключено."
+    schedule_not_set = "Фоновое составление пересказа для чата не настроено."
+    no_jobs = "Ни один чат не включил фоновое составление пересказа."
+
+    @staticmethod
+    def format_period(schedule: DigestSchedule) -> str:
+        """Return formatted digest schedule period."""
+        parts = []
+        if schedule.every_messages is not None:
+            parts.append(f"каждые {schedule.every_messages} сообщений")
+        if schedule.every_minutes is not None:
+            parts.append(f"каждые {schedule.every_minutes // 60} ч.")
+        return ", ".join(parts)
+
+    @staticmethod
+    def format_schedule(schedule: DigestSchedule) -> str:
+        """Return formatted digest schedule string."""
+        return f"Пересказ составляется в фоне: {Digest.format_period(schedule)}"
+
+    @staticmethod
+    def format_jobs(jobs: list[DigestJob]) -> str:
+        """Return formatted list of background digest jobs for admins."""
+        lines = ["Фоновые задачи пересказа:"]
+        for job in jobs:
+            line = f" - {job.chat_id}: {Digest.format_period(job.schedule)}"
+            if job.created_at is not None:
+                line += f", составлен {job.created_at:%Y-%m-%d %H:%M} за {job.generation_seconds or 0:.1f} с."
+            else:
+                line += ", еще не составлялся"
+            if job.last_error is not None:
+                line += f", ошибка {job.last_attempt_at:%Y-%m-%d %H:%M}: {job.last_error}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class Usage:
+    """Model usage report responses"""
+
+    wrong_format = (
+        "Ошибка в формате ввода. Корректный запрос: /usage **:hours:** (за последние N часов, по умолчанию 24)."
+    )
+    empty = "Запросов к модели за этот период не было."
+    groupings = {"chat_id": "По чатам", "user_id": "По пользователям", "model": "По моделям"}
+
+    @staticmethod
+    def format_report(hours: int, totals: dict[str, list[UsageTotal]]) -> str:
+        """Return formatted model usage by users, chats or models (`totals` keys) for admins."""
+        lines = [f"Использование модели за последние {hours} ч.:"]
+        for grouping, group_totals in totals.items():
+            lines.append(f"{Usage.groupings[grouping]}:")
+            for total in group_totals:
+                counters = total.counters
+                p95 = counters.latency_percentile(0.95)
+                lines.append(
+                    f" - {total.key}: запросов {counters.requests}, токенов {counters.input_tokens}"
+                    f" + {counters.completion_tokens}; обработка в среднем"
+                    f" {counters.latency_seconds / max(counters.updates, 1):.1f} с., 95% до"
+                    f" {'∞' if p95 == float('inf') else p95} с."
+                )
+        return "\n".join(lines)
+
+
+class Ask:
+    """Chat history questions responses"""
+
+    empty_question = "Задайте вопрос после команды: /ask **:вопрос:**"
+    not_found = "В сохраненной истории чата не нашлось сообщений по этому вопросу."
+    index_building = "История чата еще загружается, повторите вопрос через несколько секунд."
+
+
 help = (
     "Данный бот предназначен для предоставления доступа к YandexGPT и YandexART через Телеграм.\n"
     "Для того, чтобы получать ответы на запросы, необходимо получить личный доступ или "
@@ -96,6 +178,7 @@ commands = """
 
 **/question** и префикс "Алиса" - запрос в YandexGPT
 **/generate** и префикс "Алиса, нарисуй" - запрос в YandexART
+**/cancel** - отменить свой текущий запрос
 
 **/set_temperature** - установить температуру ответа (0.0 - максимально точен к запросу и краток, 1.0 - больший полет фантазии)
 **/set_instructions** - установить пре-промпт к своим запросам
@@ -103,6 +186,8 @@ commands = """
 **/set_timeout** - установить таймаут на выполнение своих запросов (для дебага)
 **/get_preferences** - получить значения своих личных настроек
 **/digest** - краткий пересказ последних событий чата
+**/digest_schedule** __messages/hours :N:__ или __off__ - составлять пересказ в фоне каждые N сообщений/часов
+**/ask** __:вопрос:__ - ответ на вопрос по сохраненной истории чата
 
 **/tg_id** - получить значение своего или чужого (по реплаю) идентификатора Telegram
 **/chat_id** - получить значение идентификатора чата
@@ -111,6 +196,9 @@ commands = """
 
 **/set_user_status** __:user_tg_id:__ __:status:__ - установить статус пользователю
 **/set_group_status** __:chat_tg_id:__ __:status:__ (или просто __:status:__ в чате) - установить статус чата
+**/digest_jobs** - список фоновых задач пересказа
+**/bot_stats** - статистика кэшей и очереди запросов
+**/usage** __:hours:__ - расход токенов и время обработки по чатам, пользователям и моделям (в чате - только по нему)
 """.strip()
 
 timeout_error = (
@@ -119,6 +207,10 @@ timeout_error = (
 
 empty_request = "Передан пустой запрос."
 
+cancelled = "Запрос отменен."
+
+nothing_to_cancel = "Нет запросов, которые можно отменить."
+
 no_handler_available = "Произошла ошибка, запрос не может быть корректно обработан."
 
 invalid_prompt_error = "Данный запрос не может быть обработан. Попробуйте сменить формулировку."
@@ -144,3 +236,36 @@ def error(exc: Exception, logger: Logger = global_logger) -> str:
     logger.error("Exception occured: {!r}", exc)
     logger.debug("Traceback: {}", traceback.format_exc())
     return "Произошла программная ошибка, невозможно обработать запрос"
+
+
+def format_bot_stats(
+    caches: dict[str, CacheStats],
+    pools: dict[str, PoolStats],
+    running_generations: int,
+    queued_generations: int,
+    registry_size: tuple[int, int] | None,
+) -> str:
+    """Return formatted bot runtime statistics for admins. `registry_size` is a number of users and chats
+    in the statuses registry, None if it is not loaded.
+    """
+    if registry_size is not None:
+        lines = [f"Реестр статусов: {registry_size[0]} пользователей, {registry_size[1]} чатов"]
+    else:
+        lines = ["Реестр статусов не загружен, статусы читаются из базы данных"]
+    lines.append("Кэши:")
+    for name, stats in caches.items():
+        if stats.max_memory_bytes is not None:
+            size = f"{stats.size} записей, {stats.memory_bytes // 1024}/{stats.max_memory_bytes // 1024} КиБ"
+        else:
+            size = f"{stats.size}/{stats.max_size} записей"
+        lines.append(f" - {name}: {size}, попаданий {stats.hit_rate:.1%} ({stats.hits} из {stats.hits + stats.misses})")
+    lines.append("Пулы соединений с базой данных:")
+    for name, pool in pools.items():
+        lines.append(
+            f" - {name}: занято {pool.checked_out}/{pool.size + pool.max_overflow}, открыто {pool.opened},"
+            f" сверх размера {pool.overflow}; ожидание соединения {pool.acquire.average * 1000:.1f} мс"
+            f" (макс. {pool.acquire.max * 1000:.1f} мс, таймаутов {pool.timeouts}),"
+            f" подключение {pool.connect.average * 1000:.1f} мс (макс. {pool.connect.max * 1000:.1f} мс)"
+        )
+    lines.append(f"Генерации: выполняется {running_generations}, в очереди {queued_generations}")
+    return "\n".join(lines)
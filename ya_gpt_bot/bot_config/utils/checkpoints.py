@@ -0,0 +1,31 @@
+"""Handler stages checkpoints used to retry only the failed stage of an update are defined here."""
+
+from typing import Any, Awaitable, Callable, TypeVar
+
+_T = TypeVar("_T")
+
+
+class StageCheckpoints:
+    """Results of the completed stages of a single update handling.
+
+    The instance is kept between handler retries, so a stage that has already completed returns the stored result
+    instead of running again (e.g. the answer is not regenerated when only its delivery has failed).
+    """
+
+    def __init__(self):
+        self._results: dict[str, Any] = {}
+        self.current_stage: str | None = None
+        """The last started stage, it is the failed one if handler has raised an error."""
+
+    def is_done(self, stage: str) -> bool:
+        """Check if the given stage has already completed."""
+        return stage in self._results
+
+    async def run(self, stage: str, func: Callable[[], Awaitable[_T]]) -> _T:
+        """Run the stage if it has not completed yet and return its result."""
+        if stage in self._results:
+            return self._results[stage]
+        self.current_stage = stage
+        result = await func()
+        self._results[stage] = result
+        return result
@@ -7,6 +7,8 @@ from aiogram.enums import ParseMode
 from aiogram.types import Message
 from loguru import logger
 
+from ya_gpt_bot.bot_config.utils.checkpoints import StageCheckpoints
+
 TELEGRAM_MAX_MESSAGE_LENGTH = 4000  # 4096, 96 characters reserve for possible HTML tags escaping
 
 
@@ -25,16 +27,29 @@ def split_to_multiple_messages(text: str) -> list[str]:
     return texts
 
 
-async def reply_with_html_fallback(message: Message, text: str) -> list[Message]:
-    """Reply with a default parse_mode for client, on TelegramBadRequest error retry with HTML"""
+async def _reply_part(message: Message, text: str) -> Message:
+    try:
+        return await message.reply(text)
+    except aiogram.exceptions.TelegramBadRequest as exc:
+        logger.debug("Could not send response: {!r}. Trying with HTML parse_mode", exc)
+        return await message.reply(html.quote(text), parse_mode=ParseMode.HTML)
+
+
+async def reply_with_html_fallback(
+    message: Message, text: str, checkpoints: StageCheckpoints | None = None, stage: str = "deliver"
+) -> list[Message]:
+    """Reply with a default parse_mode for client, on TelegramBadRequest error retry with HTML.
+
+    If `checkpoints` are given, every part of a long message is sent as a separate stage, so the parts which have
+    already been delivered are not sent again on retry.
+    """
     texts = split_to_multiple_messages(text)
     messages: list[Message] = []
-    for sending_text in texts:
-        try:
-            message = await message.reply(sending_text)
-            messages.append(message)
-        except aiogram.exceptions.TelegramBadRequest as exc:
-            logger.debug("Could not send response: {!r}. Trying with HTML parse_mode", exc)
-            message = await message.reply(html.quote(sending_text), parse_mode=ParseMode.HTML)
-            messages.append(message)
+    for i, sending_text in enumerate(texts):
+        if checkpoints is None:
+            messages.append(await _reply_part(message, sending_text))
+        else:
+            messages.append(
+                await checkpoints.run(f"{stage}:{i}", lambda t=sending_text: _reply_part(message, t))  # type: ignore
+            )
     return messages
@@ -5,8 +5,11 @@ from pathlib import Path
 from typing import Any, Generic, Literal, TextIO, TypeVar
 
 import yaml
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 from ya_gpt_bot.bot_config.utils.dependencies import load_class
+from ya_gpt_bot.db.pool_metrics import create_measured_engine
 from ya_gpt_bot.gpt.client import ArtClient, GPTClient
 from ya_gpt_bot.gpt.waiter import AsyncWaiter
 from ya_gpt_bot.version import VERSION
@@ -14,6 +17,11 @@ from ya_gpt_bot.ya_gpt.auth_service import AuthService
 
 _T = TypeVar("_T")
 
+BACKGROUND_CONNECTIONS = 5
+"""Connections taken by the background jobs at most: statuses registry LISTEN, digests scheduler lock,
+maintenance lock and its working connection, usage flush.
+"""
+
 
 @dataclass
 class ClassInitializer(Generic[_T]):
@@ -101,46 +109,135 @@ class YCConfig:
     oauth_token: str
     ya_gpt: YaGPTConfig
     ya_art: YaArtConfig
+    ya_gpt_background: YaGPTConfig | None = None
+    """Optional low-priority client configuration used for background jobs (e.g. scheduled digests)."""
 
     def __str__(self) -> str:
-        return f"YC(ya_gpt={self.ya_gpt}, ya_art={self.ya_art}, oauth_token=...{self.oauth_token[-4:]})"
+        return (
+            f"YC(ya_gpt={self.ya_gpt}, ya_art={self.ya_art}, ya_gpt_background={self.ya_gpt_background},"
+            f" oauth_token=...{self.oauth_token[-4:]})"
+        )
 
     @property
     def __dict__(self) -> dict:
         """Dict transformer used in `vars()`."""
-        return {
+        res = {
             "oauth_token": self.oauth_token,
             "ya_gpt": vars(self.ya_gpt),
             "ya_art": vars(self.ya_art),
         }
+        if self.ya_gpt_background is not None:
+            res["ya_gpt_background"] = vars(self.ya_gpt_background)
+        return res
 
     @classmethod
     def from_init(cls, init_data: dict) -> "YCConfig":
         """Construct YaGPTConfig from init data passed as dict."""
         ya_gpt = YaGPTConfig.from_init(init_data["ya_gpt"])
         ya_art = YaGPTConfig.from_init(init_data["ya_art"])
-        return cls(init_data["oauth_token"], ya_gpt, ya_art)
+        ya_gpt_background = (
+            YaGPTConfig.from_init(init_data["ya_gpt_background"]) if "ya_gpt_background" in init_data else None
+        )
+        return cls(init_data["oauth_token"], ya_gpt, ya_art, ya_gpt_background)
 
     def get_gpt_client(self) -> GPTClient:
         """Construct GPTClient based on config."""
         return self.ya_gpt.get_client(self.oauth_token)
 
+    def get_background_gpt_client(self) -> GPTClient | None:
+        """Construct GPTClient for background jobs based on config, None if it is not configured."""
+        if self.ya_gpt_background is None:
+            return None
+        return self.ya_gpt_background.get_client(self.oauth_token)
+
     def get_art_client(self) -> ArtClient:
         """Construct ArtClient based on config."""
         return self.ya_art.get_client(self.oauth_token)
 
 
 @dataclass
-class DatabaseConfig:
-    """Database configuration class."""
-
-    host: str
-    port: int
-    name: str
-    user: str
-    password: str
+class DatabaseConfig:  # pylint: disable=too-many-instance-attributes
+    """Database configuration class. PostgreSQL is used by default, the embedded SQLite database file
+    `sqlite_path` is used for single-node deployments if `backend` is "sqlite" (connection and pools parameters
+    are ignored then).
+    """
+
+    host: str = "localhost"
+    port: int = 5432
+    name: str = "ya_gpt_bot"
+    user: str = "ya_gpt_bot"
+    password: str = ""
+    backend: Literal["postgresql", "sqlite"] = "postgresql"
+    sqlite_path: str = "ya_gpt_bot.sqlite3"
     pool_size: int = 15
+    max_overflow: int = 0
+    pool_timeout_seconds: float = 30
+    background_pool_size: int = BACKGROUND_CONNECTIONS
+    replicas: list[str] = field(default_factory=list)
+    replica_pool_size: int = 10
+    replica_max_lag_seconds: float = 5
+    replica_check_interval_seconds: float = 5
     application_name: str = f"YaGPTBotPy_v{VERSION}"
+    cache_max_size: int = 10_000
+    cache_ttl_seconds: float = 300
+    dialog_cache_max_bytes: int = 32 * 1024 * 1024
+    status_replication: bool = True
+    prepared_statements: bool = False
+    pgbouncer: bool = False
+
+    def get_engine(self) -> AsyncEngine:
+        """Construct SQLAlchemy async engine for the updates handling based on config. Its pool keeps up to
+        `pool_size` connections opened and opens up to `max_overflow` more ones under load.
+
+        If `pgbouncer` is set (the database is accessed through PgBouncer in transaction pooling mode),
+        prepared statements caches of both SQLAlchemy and asyncpg are disabled, so only unnamed prepared
+        statements are used.
+        """
+        return self._create_engine(self.pool_size, self.max_overflow, self.application_name)
+
+    def get_background_engine(self) -> AsyncEngine:
+        """Construct SQLAlchemy async engine for the background jobs with a separate pool of
+        `background_pool_size` connections, so they never take connections of the updates handling.
+        Statuses registry and digests scheduler hold a connection each, maintenance takes two while running
+        and usage flusher takes one while writing (see `BACKGROUND_CONNECTIONS`).
+        """
+        return self._create_engine(self.background_pool_size, 0, f"{self.application_name}_background")
+
+    def get_replica_engines(self) -> list[AsyncEngine]:
+        """Construct SQLAlchemy async engines for the read replicas given as `host` or `host:port` (the port
+        of the primary is used by default) with the same database name and credentials. Every replica has a pool
+        of `replica_pool_size` connections. Reads are routed to them by `ReplicaRouter`.
+        """
+        engines = []
+        for replica in self.replicas:
+            host, _, port = replica.partition(":")
+            engines.append(
+                self._create_engine(
+                    self.replica_pool_size, 0, f"{self.application_name}_replica", host, int(port or self.port)
+                )
+            )
+        return engines
+
+    def _create_engine(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, pool_size: int, max_overflow: int, application_name: str, host: str | None = None, port: int | None = None
+    ) -> AsyncEngine:
+        connect_args: dict[str, Any] = {"server_settings": {"application_name": application_name}}
+        if self.pgbouncer:
+            connect_args |= {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return create_measured_engine(
+            URL.create(
+                "postgresql+asyncpg",
+                self.user,
+                self.password,
+                host or self.host,
+                port or self.port,
+                self.name,
+            ),
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=self.pool_timeout_seconds,
+            connect_args=connect_args,
+        )
 
     def __str__(self) -> str:
         return (
@@ -150,7 +247,7 @@ class DatabaseConfig:
 
 
 @dataclass
-class TgBotConfig:
+class TgBotConfig:  # pylint: disable=too-many-instance-attributes
     """Telegram Bot configuration class."""
 
     token: str
@@ -159,6 +256,72 @@ class TgBotConfig:
     ignore_prefixes: list[str] = field(default_factory=list)
     ignore_postfixes: list[str] = field(default_factory=list)
     max_retry_count: int = 3
+    retry_base_delay_seconds: float = 1.0
+    retry_max_delay_seconds: float = 30.0
+    request_deadline_seconds: float = 120.0
+    max_generations_per_chat: int = 2
+    max_generations_per_user: int = 1
+
+
+@dataclass
+class DigestConfig:  # pylint: disable=too-many-instance-attributes
+    """Background digests configuration class."""
+
+    scheduler_enabled: bool = True
+    poll_interval_seconds: float = 60
+    retry_after_seconds: float = 600
+    top_up_length: int = 2048
+    posted_digest_ttl_seconds: float = 600
+    write_buffer_size: int = 10_000
+    write_batch_size: int = 500
+    write_interval_seconds: float = 1.0
+    write_max_wait_seconds: float = 5.0
+    history_max_chats: int = 1000
+
+
+@dataclass
+class HistorySearchConfig:
+    """Chat history search (`/ask` command) configuration class."""
+
+    max_chats: int = 64
+    max_messages_per_chat: int = 50_000
+    top_k: int = 30
+    context_length: int = 6000
+    build_timeout_seconds: float = 3.0
+
+
+@dataclass
+class MaintenanceConfig:  # pylint: disable=too-many-instance-attributes
+    """Background database maintenance (time partitions creation and old data pruning) configuration class.
+    Retention rule is disabled if it is set to null. Time retention rules drop whole partitions, so the data
+    is kept for up to `partition_interval` longer, except for `usage_hourly` rollups which are deleted in batches.
+
+    If the background maintenance is disabled, `maintenance` CLI command must be run regularly instead,
+    as new rows can not be saved until the partitions for them are created.
+    """
+
+    enabled: bool = True
+    interval_seconds: float = 3600
+    partition_interval: Literal["month", "week"] = "month"
+    partitions_ahead: int = 2
+    batch_size: int = 1000
+    batch_pause_seconds: float = 0.2
+    conversation_retention_days: float | None = 90
+    conversation_keep_length: int | None = 1_000_000
+    messages_retention_days: float | None = 365
+    usage_retention_days: float | None = 90
+    usage_hourly_retention_days: float | None = 365
+
+
+@dataclass
+class UsageConfig:
+    """Model usage accounting (`/usage` command) configuration class. Usage is accumulated in memory and written
+    every `flush_interval_seconds`, at most `max_pending_keys` users, chats and models are kept between writes.
+    """
+
+    enabled: bool = True
+    flush_interval_seconds: float = 5
+    max_pending_keys: int = 100_000
 
 
 @dataclass
@@ -196,12 +359,16 @@ class AppConfig:  # pylint: disable=too-many-instance-attributes
     and database configurations.
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self,
         yc: YCConfig = ...,  # type: ignore
         db: DatabaseConfig = ...,  # type: ignore
         tg_bot: TgBotConfig = ...,  # type: ignore
         logging: LoggingConfig = ...,  # type: ignore
+        digest: DigestConfig = ...,  # type: ignore
+        history_search: HistorySearchConfig = ...,  # type: ignore
+        maintenance: MaintenanceConfig = ...,  # type: ignore
+        usage: UsageConfig = ...,  # type: ignore
     ):
         if not hasattr(self, "ya_gpt") or yc is not ... and getattr(self, "ya_gpt") != yc:
             self.yc = yc
@@ -211,6 +378,18 @@ class AppConfig:  # pylint: disable=too-many-instance-attributes
             self.tg_bot = tg_bot
         if not hasattr(self, "logging") or logging is not ... and getattr(self, "logging") != logging:
             self.logging = logging
+        if not hasattr(self, "digest") or digest is not ... and getattr(self, "digest") != digest:
+            self.digest = digest if digest is not ... else DigestConfig()
+        if (
+            not hasattr(self, "history_search")
+            or history_search is not ...
+            and getattr(self, "history_search") != history_search
+        ):
+            self.history_search = history_search if history_search is not ... else HistorySearchConfig()
+        if not hasattr(self, "maintenance") or maintenance is not ... and getattr(self, "maintenance") != maintenance:
+            self.maintenance = maintenance if maintenance is not ... else MaintenanceConfig()
+        if not hasattr(self, "usage") or usage is not ... and getattr(self, "usage") != usage:
+            self.usage = usage if usage is not ... else UsageConfig()
 
     @classmethod
     def example(cls) -> "AppConfig":
@@ -265,6 +444,10 @@ class AppConfig:  # pylint: disable=too-many-instance-attributes
                 max_retry_count=3,
             ),
             LoggingConfig("INFO", sinks=[LoggingSink("DEBUG", "debug.log", "file")]),
+            DigestConfig(),
+            HistorySearchConfig(),
+            MaintenanceConfig(),
+            UsageConfig(),
         )
 
     @property
@@ -275,10 +458,18 @@ class AppConfig:  # pylint: disable=too-many-instance-attributes
             "db": vars(self.db),
             "tg_bot": vars(self.tg_bot),
             "logging": vars(self.logging),
+            "digest": vars(self.digest),
+            "history_search": vars(self.history_search),
+            "maintenance": vars(self.maintenance),
+            "usage": vars(self.usage),
         }
 
     def __str__(self) -> str:
-        return f"AppConfig(yc={self.yc}, db={self.db}, tg_bot={self.tg_bot}, logging={self.logging})"
+        return (
+            f"AppConfig(yc={self.yc}, db={self.db}, tg_bot={self.tg_bot}, logging={self.logging},"
+            f" digest={self.digest}, history_search={self.history_search}, maintenance={self.maintenance},"
+            f" usage={self.usage})"
+        )
 
     def dump(self, file: str | Path | TextIO) -> None:
         """Export current configuration to a file"""
@@ -309,6 +500,10 @@ class AppConfig:  # pylint: disable=too-many-instance-attributes
                 DatabaseConfig(**data["db"]),
                 TgBotConfig(**data["tg_bot"]),
                 LoggingConfig.from_init(data["logging"]),
+                DigestConfig(**data.get("digest", {})),
+                HistorySearchConfig(**data.get("history_search", {})),
+                MaintenanceConfig(**data.get("maintenance", {})),
+                UsageConfig(**data.get("usage", {})),
             )
         except Exception as exc:
             raise ValueError("Could not read app config file") from exc
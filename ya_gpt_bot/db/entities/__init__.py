@@ -1,5 +1,7 @@
 """Database entities are located here."""
 from .chats import t_chats
+from .digests import t_digest_schedules, t_digests
 from .messages import t_messages
+from .usage import t_usage, t_usage_hourly
 from .user_preferences import t_user_preferences
 from .users import t_users
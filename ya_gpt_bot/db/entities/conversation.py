@@ -1,6 +1,6 @@
 """Requests database table is defined here."""
 
-from sqlalchemy import TIMESTAMP, BigInteger, Column, String, Table
+from sqlalchemy import TIMESTAMP, BigInteger, Column, Index, PrimaryKeyConstraint, String, Table
 
 from ya_gpt_bot.db.metadata import metadata
 
@@ -10,16 +10,43 @@ t_conversation = Table(
     Column("chat_id", BigInteger(), nullable=False),
     Column("user_from", String(), autoincrement=False, nullable=False),
     Column("user_to", String(), autoincrement=False, nullable=True),
-    Column("message_timestamp", TIMESTAMP(timezone=True), autoincrement=False, nullable=True),
+    Column("message_timestamp", TIMESTAMP(timezone=True), autoincrement=False, nullable=False),
     Column("text", String(), autoincrement=False, nullable=False),
+    Column("seq", BigInteger(), autoincrement=False, nullable=False),
+    Column("preceding_length", BigInteger(), nullable=False),
+    PrimaryKeyConstraint("chat_id", "seq", "message_timestamp"),
+    Index(None, "chat_id", "message_timestamp"),
+    Index(None, "chat_id", "preceding_length"),
+    postgresql_partition_by="RANGE (message_timestamp)",
 )
 """
 Messages logging table for full conversation - purely for digest function
 
+Table is partitioned by `message_timestamp` ranges, partitions are created and dropped by the maintenance
+(see `ya_gpt_bot.db.operations.partitions`).
+
 Columns:
 - `chat_id` - identifier of a chat if the request was sent from chat, big integer nullable
 - `user_from` - message sender name
 - `user_to` - message reciever name
-- `message_timestamp` - time of a message sent
+- `message_timestamp` - time of a message sent, partitioning key
 - `text` - text of a message, string
+- `seq` - number of the message in the chat starting with 1, big integer
+- `preceding_length` - total length of message lines of the chat saved before this one, big integer
+"""
+
+t_conversation_counters = Table(
+    "conversation_counters",
+    metadata,
+    Column("chat_id", BigInteger(), primary_key=True, nullable=False),
+    Column("last_seq", BigInteger(), nullable=False),
+    Column("total_length", BigInteger(), nullable=False),
+)
+"""
+Conversation bookkeeping of a chat, updated on every message save.
+
+Columns:
+- `chat_id` - identifier of a chat, big integer
+- `last_seq` - `seq` of the last saved message of the chat, big integer
+- `total_length` - total length of message lines of the chat ever saved (including deleted ones), big integer
 """
@@ -0,0 +1,51 @@
+"""Scheduled digests database tables are defined here."""
+
+from typing import Callable
+
+from sqlalchemy import TIMESTAMP, BigInteger, CheckConstraint, Column, Float, Integer, String, Table, func
+
+from ya_gpt_bot.db.metadata import metadata
+
+func: Callable
+
+t_digest_schedules = Table(
+    "digest_schedules",
+    metadata,
+    Column("chat_id", BigInteger, primary_key=True, nullable=False),
+    Column("every_messages", Integer, CheckConstraint("every_messages > 0", "every_messages_positive")),
+    Column("every_minutes", Integer, CheckConstraint("every_minutes > 0", "every_minutes_positive")),
+    Column("added_at", TIMESTAMP(True), nullable=False, server_default=func.now()),
+    Column("updated_at", TIMESTAMP(True), nullable=False, server_default=func.now()),
+)
+"""Chats that have opted-in for the background digest generation.
+
+Columns:
+- `chat_id` - identifier of a chat, big integer
+- `every_messages` - generate digest after the given number of new messages, integer, optional
+- `every_minutes` - generate digest after the given number of minutes, integer, optional
+- `added_at` - time of schedule creation, timestamptz
+- `updated_at` - time of last schedule change, timestamptz
+"""
+
+t_digests = Table(
+    "digests",
+    metadata,
+    Column("chat_id", BigInteger, primary_key=True, nullable=False),
+    Column("text", String),
+    Column("covered_until", TIMESTAMP(True)),
+    Column("created_at", TIMESTAMP(True)),
+    Column("generation_seconds", Float),
+    Column("last_attempt_at", TIMESTAMP(True), nullable=False, server_default=func.now()),
+    Column("last_error", String),
+)
+"""Last digest generated for a chat (by the background scheduler or on user request).
+
+Columns:
+- `chat_id` - identifier of a chat, big integer
+- `text` - digest text, varchar, optional (empty until the first successful generation)
+- `covered_until` - timestamp of the last conversation message included in the digest, timestamptz
+- `created_at` - time of the digest generation, timestamptz
+- `generation_seconds` - duration of the digest generation, float
+- `last_attempt_at` - time of the last generation attempt, timestamptz
+- `last_error` - error of the last failed generation attempt, varchar, optional
+"""
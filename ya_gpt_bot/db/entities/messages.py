@@ -2,7 +2,7 @@
 
 from typing import Callable
 
-from sqlalchemy import TIMESTAMP, BigInteger, Boolean, Column, ForeignKeyConstraint, String, Table, func
+from sqlalchemy import TIMESTAMP, BigInteger, Boolean, Column, Index, Integer, String, Table, func
 
 from ya_gpt_bot.db.metadata import metadata
 
@@ -14,19 +14,30 @@ t_messages = Table(
     # not ForeignKey("chats.id") because direct messages chats are not dumped to chats table
     Column("chat_id", BigInteger, primary_key=True, nullable=False),
     Column("id", BigInteger, primary_key=True, nullable=False),
+    # no foreign key to the replied message: unique constraints of a partitioned table must include `datetime`
     Column("reply_id", BigInteger),
     Column("from_self", Boolean, nullable=False),
     Column("text", String, nullable=False),
-    Column("datetime", TIMESTAMP(True), nullable=False, server_default=func.now()),
-    ForeignKeyConstraint(["chat_id", "reply_id"], ["messages.chat_id", "messages.id"]),
+    Column("datetime", TIMESTAMP(True), primary_key=True, nullable=False, server_default=func.now()),
+    Column("thread_id", BigInteger, nullable=False),
+    Column("depth", Integer, nullable=False),
+    Index(None, "chat_id", "thread_id", "depth"),
+    Index(None, "chat_id", "datetime"),
+    postgresql_partition_by="RANGE (datetime)",
 )
 """Messages logging table
 
+Table is partitioned by `datetime` ranges, partitions are created and dropped by the maintenance
+(see `ya_gpt_bot.db.operations.partitions`). Already saved messages are skipped on saving, but (`chat_id`, `id`)
+uniqueness is not enforced (concurrent saves of the same message), so the readers must tolerate duplicates.
+
 Columns:
 - `chat_id` - identifier of a chat if the request was sent from chat, big integer nullable
 - `id` - request identifier, integer
 - `reply_id` - identifier of a message which this message replies, big integer, optional
 - `user_id` - identifier of a concrete user who created a request, big integer
 - `text` - text of request, varchar
-- `datetime` - time of request finish, timestamptz
+- `datetime` - time of request finish, timestamptz, partitioning key
+- `thread_id` - identifier of the first message of the reply chain (own identifier if not a reply), big integer
+- `depth` - number of messages before this one in the reply chain, integer
 """
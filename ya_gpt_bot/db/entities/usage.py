@@ -0,0 +1,78 @@
+"""Model usage accounting database tables are defined here."""
+
+from typing import Callable
+
+from sqlalchemy import TIMESTAMP, BigInteger, Column, Float, Index, Integer, PrimaryKeyConstraint, String, Table, func
+
+from ya_gpt_bot.db.metadata import metadata
+
+func: Callable
+
+LATENCY_BUCKET_COLUMNS = (
+    "latency_le_1s",
+    "latency_le_2s",
+    "latency_le_5s",
+    "latency_le_10s",
+    "latency_le_30s",
+    "latency_le_60s",
+    "latency_gt_60s",
+)
+"""Update counts columns of the latency buckets (see `ya_gpt_bot.services.dtos.LATENCY_BUCKETS_SECONDS`)."""
+
+
+def _counters_columns() -> list[Column]:
+    return [
+        Column("requests", Integer, nullable=False),
+        Column("input_tokens", BigInteger, nullable=False),
+        Column("completion_tokens", BigInteger, nullable=False),
+        Column("latency_seconds", Float, nullable=False),
+        *(Column(name, Integer, nullable=False) for name in LATENCY_BUCKET_COLUMNS),
+    ]
+
+
+t_usage = Table(
+    "usage",
+    metadata,
+    Column("recorded_at", TIMESTAMP(True), nullable=False, server_default=func.now()),
+    Column("hour", TIMESTAMP(True), nullable=False),
+    Column("user_id", BigInteger, nullable=False),
+    Column("chat_id", BigInteger, nullable=False),
+    Column("model", String, nullable=False),
+    *_counters_columns(),
+    Index(None, "chat_id", "recorded_at"),
+    postgresql_partition_by="RANGE (recorded_at)",
+)
+"""Model usage of users in chats accumulated in memory and written every few seconds (a row per user, chat
+and model of every write).
+
+Table is partitioned by `recorded_at` ranges, partitions are created and dropped by the maintenance
+(see `ya_gpt_bot.db.operations.partitions`). Reports are read from `usage_hourly` rollups instead.
+
+Columns:
+- `recorded_at` - time of the write, timestamptz, partitioning key
+- `hour` - start of the hour the updates were handled in, timestamptz
+- `user_id` - identifier of the user who sent the updates, big integer
+- `chat_id` - identifier of the chat, big integer
+- `model` - model name, varchar
+- `requests` - number of model requests, integer
+- `input_tokens` - number of prompt tokens, big integer
+- `completion_tokens` - number of generated tokens, big integer
+- `latency_seconds` - total handling time of the updates, float
+- `latency_le_1s` ... `latency_gt_60s` - numbers of the updates handled in the latency buckets, integer
+"""
+
+t_usage_hourly = Table(
+    "usage_hourly",
+    metadata,
+    Column("hour", TIMESTAMP(True), nullable=False),
+    Column("user_id", BigInteger, nullable=False),
+    Column("chat_id", BigInteger, nullable=False),
+    Column("model", String, nullable=False),
+    *_counters_columns(),
+    PrimaryKeyConstraint("hour", "user_id", "chat_id", "model"),
+)
+"""Hourly rollups of `usage` updated with every its write, columns are the same.
+
+Table is not partitioned as there is at most one row for a user, chat and model an hour, rows older than
+the retention are deleted in batches by the background maintenance.
+"""
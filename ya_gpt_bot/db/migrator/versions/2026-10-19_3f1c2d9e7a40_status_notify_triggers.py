@@ -0,0 +1,60 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring,too-many-statements
+"""notify on users and chats status changes
+
+Revision ID: 3f1c2d9e7a40
+Revises: 85b55a25a981
+Create Date: 2026-10-19 15:20:07.512804
+
+"""
+from textwrap import dedent
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2d9e7a40"
+down_revision: Union[str, None] = "85b55a25a981"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        sa.text(
+            dedent(
+                """
+                CREATE FUNCTION notify_status_change() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        PERFORM pg_notify(
+                            'status_changes',
+                            json_build_object('table', TG_TABLE_NAME, 'id', OLD.id, 'status', NULL)::text
+                        );
+                        RETURN OLD;
+                    END IF;
+                    PERFORM pg_notify(
+                        'status_changes',
+                        json_build_object('table', TG_TABLE_NAME, 'id', NEW.id, 'status', NEW.status)::text
+                    );
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+                """
+            )
+        )
+    )
+    for table in ("users", "chats"):
+        op.execute(
+            sa.text(
+                f"CREATE TRIGGER {table}_notify_status_change"
+                f" AFTER INSERT OR DELETE OR UPDATE OF status ON {table}"
+                " FOR EACH ROW EXECUTE FUNCTION notify_status_change()"
+            )
+        )
+
+
+def downgrade() -> None:
+    for table in ("users", "chats"):
+        op.execute(sa.text(f"DROP TRIGGER {table}_notify_status_change ON {table}"))
+    op.execute(sa.text("DROP FUNCTION notify_status_change()"))
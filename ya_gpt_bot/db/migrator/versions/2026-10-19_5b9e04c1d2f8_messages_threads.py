@@ -0,0 +1,81 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring,too-many-statements
+"""add thread identifier and depth to messages
+
+Revision ID: 5b9e04c1d2f8
+Revises: 3f1c2d9e7a40
+Create Date: 2026-10-19 17:42:56.203917
+
+"""
+from textwrap import dedent
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b9e04c1d2f8"
+down_revision: Union[str, None] = "3f1c2d9e7a40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10_000
+
+BACKFILL_ROOTS = dedent(
+    """
+    WITH batch AS (
+        SELECT chat_id, id FROM messages WHERE thread_id IS NULL AND reply_id IS NULL LIMIT :batch_size
+    )
+    UPDATE messages m SET thread_id = m.id, depth = 0
+    FROM batch
+    WHERE m.chat_id = batch.chat_id AND m.id = batch.id
+    """
+)
+
+BACKFILL_REPLIES = dedent(
+    """
+    WITH batch AS (
+        SELECT m.chat_id, m.id, p.thread_id, p.depth + 1 AS depth
+        FROM messages m JOIN messages p ON p.chat_id = m.chat_id AND p.id = m.reply_id
+        WHERE m.thread_id IS NULL AND p.thread_id IS NOT NULL
+        LIMIT :batch_size
+    )
+    UPDATE messages m SET thread_id = batch.thread_id, depth = batch.depth
+    FROM batch
+    WHERE m.chat_id = batch.chat_id AND m.id = batch.id
+    """
+)
+
+
+def _backfill(statement: str) -> None:
+    """Execute the batch update until there is nothing left to update, every batch is committed separately
+    so the rows are not locked for the whole backfill.
+    """
+    conn = op.get_bind()
+    while conn.execute(sa.text(statement), {"batch_size": BACKFILL_BATCH_SIZE}).rowcount > 0:
+        pass
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("thread_id", sa.BigInteger(), nullable=True))
+    op.add_column("messages", sa.Column("depth", sa.Integer(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        _backfill(BACKFILL_ROOTS)
+        _backfill(BACKFILL_REPLIES)  # parents are filled before children as only children of filled rows are taken
+        op.create_index(
+            op.f("ix_messages_chat_id_thread_id_depth"),
+            "messages",
+            ["chat_id", "thread_id", "depth"],
+            postgresql_concurrently=True,
+        )
+
+    _backfill(BACKFILL_ROOTS)  # messages saved during the backfill
+    _backfill(BACKFILL_REPLIES)
+    op.alter_column("messages", "thread_id", nullable=False)
+    op.alter_column("messages", "depth", nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_messages_chat_id_thread_id_depth"), table_name="messages")
+    op.drop_column("messages", "depth")
+    op.drop_column("messages", "thread_id")
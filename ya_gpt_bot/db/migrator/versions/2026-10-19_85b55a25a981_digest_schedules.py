@@ -0,0 +1,49 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring,too-many-statements
+"""add digest schedules and digests tables
+
+Revision ID: 85b55a25a981
+Revises: 7b45cbd137c6
+Create Date: 2026-10-19 12:04:31.118402
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "85b55a25a981"
+down_revision: Union[str, None] = "7b45cbd137c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "digest_schedules",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("every_messages", sa.Integer(), nullable=True),
+        sa.Column("every_minutes", sa.Integer(), nullable=True),
+        sa.Column("added_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.CheckConstraint("every_messages > 0", name=op.f("digest_schedules_check_every_messages_positive")),
+        sa.CheckConstraint("every_minutes > 0", name=op.f("digest_schedules_check_every_minutes_positive")),
+        sa.PrimaryKeyConstraint("chat_id", name=op.f("digest_schedules_pk")),
+    )
+
+    op.create_table(
+        "digests",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("covered_until", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("generation_seconds", sa.Float(), nullable=True),
+        sa.Column("last_attempt_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("chat_id", name=op.f("digests_pk")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("digests")
+    op.drop_table("digest_schedules")
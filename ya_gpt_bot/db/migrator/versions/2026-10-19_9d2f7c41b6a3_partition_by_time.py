@@ -0,0 +1,159 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring,too-many-statements
+"""partition conversation and messages by time ranges
+
+Revision ID: 9d2f7c41b6a3
+Revises: e4a1b6f29c83
+Create Date: 2026-10-19 22:08:13.540217
+
+Data is copied to the new partitioned tables, so the bot should be stopped during the upgrade.
+Monthly partitions are created from the oldest row up to `PARTITIONS_AHEAD` months ahead, the next ones are
+created by the bot maintenance (or `maintenance` CLI command).
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d2f7c41b6a3"
+down_revision: Union[str, None] = "e4a1b6f29c83"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS_AHEAD = 2
+
+MESSAGES_COLUMNS = "chat_id, id, reply_id, from_self, text, datetime, thread_id, depth"
+CONVERSATION_COLUMNS = "chat_id, user_from, user_to, message_timestamp, text, seq, preceding_length"
+
+
+def _create_monthly_partitions(table: str, column: str) -> None:
+    """Create partitions covering all rows of the `{table}_unpartitioned` table and `PARTITIONS_AHEAD` months."""
+    conn = op.get_bind()
+    bounds = conn.execute(
+        sa.text(
+            "SELECT start, start + interval '1 month' FROM generate_series("
+            f" date_trunc('month', coalesce((SELECT min({column}) FROM {table}_unpartitioned), now())),"
+            f" date_trunc('month', now()) + interval '{PARTITIONS_AHEAD} month',"
+            " interval '1 month'"
+            ") start"
+        )
+    ).fetchall()
+    for start, end in bounds:
+        op.execute(
+            f"CREATE TABLE {table}_p{start:%Y%m%d} PARTITION OF {table}"
+            f" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+
+def upgrade() -> None:
+    op.execute("SET LOCAL timezone = 'UTC'")  # partitions bounds are months of UTC
+
+    op.drop_constraint(op.f("messages_fk_reply_id__messages"), "messages", type_="foreignkey")
+    op.drop_constraint(op.f("messages_pk"), "messages", type_="primary")
+    op.drop_index(op.f("ix_messages_chat_id_thread_id_depth"), table_name="messages")
+    op.drop_index(op.f("ix_messages_chat_id_datetime"), table_name="messages")
+    op.rename_table("messages", "messages_unpartitioned")
+    op.create_table(
+        "messages",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("reply_id", sa.BigInteger(), nullable=True),
+        sa.Column("from_self", sa.Boolean(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("datetime", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("thread_id", sa.BigInteger(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("chat_id", "id", "datetime", name=op.f("messages_pk")),
+        postgresql_partition_by="RANGE (datetime)",
+    )
+    op.create_index(op.f("ix_messages_chat_id_thread_id_depth"), "messages", ["chat_id", "thread_id", "depth"])
+    op.create_index(op.f("ix_messages_chat_id_datetime"), "messages", ["chat_id", "datetime"])
+    _create_monthly_partitions("messages", "datetime")
+    op.execute(f"INSERT INTO messages ({MESSAGES_COLUMNS}) SELECT {MESSAGES_COLUMNS} FROM messages_unpartitioned")
+    op.drop_table("messages_unpartitioned")
+
+    op.drop_constraint(op.f("conversation_pk"), "conversation", type_="primary")
+    op.drop_index(op.f("ix_conversation_chat_id_message_timestamp"), table_name="conversation")
+    op.drop_index(op.f("ix_conversation_chat_id_preceding_length"), table_name="conversation")
+    op.rename_table("conversation", "conversation_unpartitioned")
+    op.create_table(
+        "conversation",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_from", sa.String(), nullable=False),
+        sa.Column("user_to", sa.String(), nullable=True),
+        sa.Column("message_timestamp", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.Column("preceding_length", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("chat_id", "seq", "message_timestamp", name=op.f("conversation_pk")),
+        postgresql_partition_by="RANGE (message_timestamp)",
+    )
+    op.create_index(op.f("ix_conversation_chat_id_message_timestamp"), "conversation", ["chat_id", "message_timestamp"])
+    op.create_index(op.f("ix_conversation_chat_id_preceding_length"), "conversation", ["chat_id", "preceding_length"])
+    _create_monthly_partitions("conversation", "message_timestamp")
+    # messages without timestamp (saved by the old versions) are placed at the very beginning
+    op.execute(
+        f"INSERT INTO conversation ({CONVERSATION_COLUMNS})"
+        " SELECT chat_id, user_from, user_to,"
+        "  coalesce(message_timestamp, (SELECT min(message_timestamp) FROM conversation_unpartitioned), now()),"
+        "  text, seq, preceding_length"
+        " FROM conversation_unpartitioned"
+    )
+    op.drop_table("conversation_unpartitioned")
+
+
+def downgrade() -> None:
+    op.rename_table("conversation", "conversation_partitioned")
+    op.drop_constraint(op.f("conversation_pk"), "conversation_partitioned", type_="primary")
+    op.drop_index(op.f("ix_conversation_chat_id_message_timestamp"), table_name="conversation_partitioned")
+    op.drop_index(op.f("ix_conversation_chat_id_preceding_length"), table_name="conversation_partitioned")
+    op.create_table(
+        "conversation",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_from", sa.String(), nullable=False),
+        sa.Column("user_to", sa.String(), nullable=True),
+        sa.Column("message_timestamp", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.Column("preceding_length", sa.BigInteger(), nullable=False),
+    )
+    op.execute(
+        f"INSERT INTO conversation ({CONVERSATION_COLUMNS})"
+        f" SELECT DISTINCT ON (chat_id, seq) {CONVERSATION_COLUMNS} FROM conversation_partitioned"
+    )
+    op.drop_table("conversation_partitioned")
+    op.create_primary_key(op.f("conversation_pk"), "conversation", ["chat_id", "seq"])
+    op.create_index(op.f("ix_conversation_chat_id_message_timestamp"), "conversation", ["chat_id", "message_timestamp"])
+    op.create_index(op.f("ix_conversation_chat_id_preceding_length"), "conversation", ["chat_id", "preceding_length"])
+
+    op.rename_table("messages", "messages_partitioned")
+    op.drop_constraint(op.f("messages_pk"), "messages_partitioned", type_="primary")
+    op.drop_index(op.f("ix_messages_chat_id_thread_id_depth"), table_name="messages_partitioned")
+    op.drop_index(op.f("ix_messages_chat_id_datetime"), table_name="messages_partitioned")
+    op.create_table(
+        "messages",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("reply_id", sa.BigInteger(), nullable=True),
+        sa.Column("from_self", sa.Boolean(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("datetime", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("thread_id", sa.BigInteger(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+    )
+    op.execute(
+        f"INSERT INTO messages ({MESSAGES_COLUMNS})"
+        f" SELECT DISTINCT ON (chat_id, id) {MESSAGES_COLUMNS} FROM messages_partitioned ORDER BY chat_id, id, datetime"
+    )
+    op.drop_table("messages_partitioned")
+    # replied messages may have been dropped with the old partitions
+    op.execute(
+        "UPDATE messages m SET reply_id = NULL WHERE reply_id IS NOT NULL"
+        " AND NOT EXISTS (SELECT 1 FROM messages p WHERE p.chat_id = m.chat_id AND p.id = m.reply_id)"
+    )
+    op.create_primary_key(op.f("messages_pk"), "messages", ["chat_id", "id"])
+    op.create_foreign_key(
+        op.f("messages_fk_reply_id__messages"), "messages", "messages", ["chat_id", "reply_id"], ["chat_id", "id"]
+    )
+    op.create_index(op.f("ix_messages_chat_id_thread_id_depth"), "messages", ["chat_id", "thread_id", "depth"])
+    op.create_index(op.f("ix_messages_chat_id_datetime"), "messages", ["chat_id", "datetime"])
@@ -0,0 +1,92 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring
+"""add model usage accounting and hourly rollups
+
+Revision ID: b2e86f0d4c17
+Revises: 9d2f7c41b6a3
+Create Date: 2026-10-19 23:41:27.319504
+
+Monthly partitions of `usage` are created for the current month and `PARTITIONS_AHEAD` months ahead, the next
+ones are created by the bot maintenance (or `maintenance` CLI command).
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b2e86f0d4c17"
+down_revision: Union[str, None] = "9d2f7c41b6a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS_AHEAD = 2
+
+LATENCY_BUCKET_COLUMNS = (
+    "latency_le_1s",
+    "latency_le_2s",
+    "latency_le_5s",
+    "latency_le_10s",
+    "latency_le_30s",
+    "latency_le_60s",
+    "latency_gt_60s",
+)
+
+
+def _counters_columns() -> list[sa.Column]:
+    return [
+        sa.Column("requests", sa.Integer(), nullable=False),
+        sa.Column("input_tokens", sa.BigInteger(), nullable=False),
+        sa.Column("completion_tokens", sa.BigInteger(), nullable=False),
+        sa.Column("latency_seconds", sa.Float(), nullable=False),
+        *(sa.Column(name, sa.Integer(), nullable=False) for name in LATENCY_BUCKET_COLUMNS),
+    ]
+
+
+def upgrade() -> None:
+    op.execute("SET LOCAL timezone = 'UTC'")  # partitions bounds are months of UTC
+
+    op.create_table(
+        "usage",
+        sa.Column("recorded_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("hour", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        *_counters_columns(),
+        postgresql_partition_by="RANGE (recorded_at)",
+    )
+    op.create_index(op.f("ix_usage_chat_id_recorded_at"), "usage", ["chat_id", "recorded_at"])
+    bounds = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT start, start + interval '1 month' FROM generate_series("
+                " date_trunc('month', now()),"
+                f" date_trunc('month', now()) + interval '{PARTITIONS_AHEAD} month',"
+                " interval '1 month'"
+                ") start"
+            )
+        )
+        .fetchall()
+    )
+    for start, end in bounds:
+        op.execute(
+            f"CREATE TABLE usage_p{start:%Y%m%d} PARTITION OF usage"
+            f" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+    op.create_table(
+        "usage_hourly",
+        sa.Column("hour", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        *_counters_columns(),
+        sa.PrimaryKeyConstraint("hour", "user_id", "chat_id", "model", name=op.f("usage_hourly_pk")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("usage_hourly")
+    op.drop_index(op.f("ix_usage_chat_id_recorded_at"), table_name="usage")
+    op.drop_table("usage")
@@ -0,0 +1,40 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring,too-many-statements
+"""add indexes for time-ordered access to conversation and messages
+
+Revision ID: c7d3a8e1f054
+Revises: 5b9e04c1d2f8
+Create Date: 2026-10-19 19:08:12.640231
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d3a8e1f054"
+down_revision: Union[str, None] = "5b9e04c1d2f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "conversation": ["chat_id", "message_timestamp"],
+    "messages": ["chat_id", "datetime"],
+}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():  # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        for table, columns in INDEXES.items():
+            op.create_index(
+                op.f(f"ix_{table}_{'_'.join(columns)}"),
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,  # index left invalid by an interrupted build must be dropped manually
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, columns in INDEXES.items():
+            op.drop_index(op.f(f"ix_{table}_{'_'.join(columns)}"), table_name=table, postgresql_concurrently=True)
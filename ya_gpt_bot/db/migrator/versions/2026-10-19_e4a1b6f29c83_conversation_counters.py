@@ -0,0 +1,73 @@
+# pylint: disable=no-member,invalid-name,missing-function-docstring,too-many-statements
+"""add conversation sequence, running length and counters
+
+Revision ID: e4a1b6f29c83
+Revises: c7d3a8e1f054
+Create Date: 2026-10-19 20:31:45.084316
+
+"""
+from textwrap import dedent
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a1b6f29c83"
+down_revision: Union[str, None] = "c7d3a8e1f054"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LINE_LENGTH = "length(user_from) + 1 + length(coalesce(user_to, '')) + 1 + length(text) + 1"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversation_counters",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("last_seq", sa.BigInteger(), nullable=False),
+        sa.Column("total_length", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("chat_id", name=op.f("conversation_counters_pk")),
+    )
+    op.add_column("conversation", sa.Column("seq", sa.BigInteger(), nullable=True))
+    op.add_column("conversation", sa.Column("preceding_length", sa.BigInteger(), nullable=True))
+
+    op.execute(
+        sa.text(
+            dedent(
+                f"""
+                UPDATE conversation c SET seq = numbered.seq, preceding_length = numbered.preceding_length
+                FROM (
+                    SELECT
+                        ctid,
+                        row_number() OVER chat_window AS seq,
+                        sum({LINE_LENGTH}) OVER chat_window - ({LINE_LENGTH}) AS preceding_length
+                    FROM conversation
+                    WINDOW chat_window AS (
+                        PARTITION BY chat_id ORDER BY message_timestamp, ctid ROWS UNBOUNDED PRECEDING
+                    )
+                ) numbered
+                WHERE c.ctid = numbered.ctid
+                """
+            )
+        )
+    )
+    op.execute(
+        sa.text(
+            "INSERT INTO conversation_counters (chat_id, last_seq, total_length)"
+            f" SELECT chat_id, max(seq), sum({LINE_LENGTH}) FROM conversation GROUP BY chat_id"
+        )
+    )
+
+    op.alter_column("conversation", "seq", nullable=False)
+    op.alter_column("conversation", "preceding_length", nullable=False)
+    op.create_primary_key(op.f("conversation_pk"), "conversation", ["chat_id", "seq"])
+    op.create_index(op.f("ix_conversation_chat_id_preceding_length"), "conversation", ["chat_id", "preceding_length"])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_conversation_chat_id_preceding_length"), table_name="conversation")
+    op.drop_constraint(op.f("conversation_pk"), "conversation", type_="primary")
+    op.drop_column("conversation", "preceding_length")
+    op.drop_column("conversation", "seq")
+    op.drop_table("conversation_counters")
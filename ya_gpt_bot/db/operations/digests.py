@@ -0,0 +1,161 @@
+"""Scheduled digests operations are defined here."""
+
+import datetime
+from typing import Callable
+
+from sqlalchemy import TIMESTAMP, cast, delete, exists, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ya_gpt_bot.db.entities import t_digest_schedules, t_digests
+from ya_gpt_bot.db.entities.conversation import t_conversation
+from ya_gpt_bot.services.dtos import DigestJob, DigestSchedule, StoredDigest
+
+func: Callable
+
+_MINUS_INFINITY = cast(literal("-infinity"), TIMESTAMP(timezone=True))
+
+
+async def set_schedule(conn: AsyncConnection, chat_id: int, schedule: DigestSchedule) -> None:
+    """Set digest schedule of the given chat, replacing the previous one."""
+    statement = insert(t_digest_schedules).values(
+        chat_id=chat_id, every_messages=schedule.every_messages, every_minutes=schedule.every_minutes
+    )
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_digest_schedules.c.chat_id],
+            set_={
+                "every_messages": statement.excluded.every_messages,
+                "every_minutes": statement.excluded.every_minutes,
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+async def delete_schedule(conn: AsyncConnection, chat_id: int) -> bool:
+    """Delete digest schedule of the given chat. Return True if the schedule existed."""
+    res = await conn.execute(delete(t_digest_schedules).where(t_digest_schedules.c.chat_id == chat_id))
+    return res.rowcount == 1
+
+
+async def get_schedule(conn: AsyncConnection, chat_id: int) -> DigestSchedule | None:
+    """Return digest schedule of the given chat or None if the chat has not opted-in."""
+    row = (
+        await conn.execute(
+            select(t_digest_schedules.c.every_messages, t_digest_schedules.c.every_minutes).where(
+                t_digest_schedules.c.chat_id == chat_id
+            )
+        )
+    ).one_or_none()
+    if row is None:
+        return None
+    return DigestSchedule(row[0], row[1])
+
+
+async def get_due_chats(conn: AsyncConnection, retry_after: datetime.timedelta) -> list[int]:
+    """Return identifiers of chats which digest should be regenerated according to their schedules.
+
+    Chats which generation has been attempted less than `retry_after` ago are skipped, as well as the chats
+    without messages newer than the digest (time scheduled ones included).
+    """
+    new_messages_condition = (
+        t_conversation.c.chat_id == t_digest_schedules.c.chat_id,
+        t_conversation.c.message_timestamp > func.coalesce(t_digests.c.covered_until, _MINUS_INFINITY),
+    )
+    new_messages = select(func.count()).where(*new_messages_condition).scalar_subquery()
+    statement = (
+        select(t_digest_schedules.c.chat_id)
+        .select_from(t_digest_schedules.outerjoin(t_digests, t_digests.c.chat_id == t_digest_schedules.c.chat_id))
+        .where(
+            or_(t_digests.c.last_attempt_at.is_(None), t_digests.c.last_attempt_at < func.now() - retry_after),
+            or_(
+                t_digest_schedules.c.every_minutes.is_not(None)
+                & or_(
+                    t_digests.c.created_at.is_(None),
+                    t_digests.c.created_at
+                    < func.now() - func.make_interval(0, 0, 0, 0, 0, t_digest_schedules.c.every_minutes),
+                )
+                & exists().where(*new_messages_condition),
+                t_digest_schedules.c.every_messages.is_not(None)
+                & (new_messages >= t_digest_schedules.c.every_messages),
+            ),
+        )
+        .order_by(func.coalesce(t_digests.c.created_at, _MINUS_INFINITY))
+    )
+    return list((await conn.execute(statement)).scalars())
+
+
+async def get_digest(conn: AsyncConnection, chat_id: int) -> StoredDigest | None:
+    """Return the last successfully generated digest of the given chat."""
+    row = (
+        await conn.execute(
+            select(t_digests.c.text, t_digests.c.covered_until, t_digests.c.created_at).where(
+                t_digests.c.chat_id == chat_id, t_digests.c.text.is_not(None)
+            )
+        )
+    ).one_or_none()
+    if row is None:
+        return None
+    return StoredDigest(row[0], row[1], row[2])
+
+
+async def save_digest(
+    conn: AsyncConnection, chat_id: int, text: str, covered_until: datetime.datetime | None, generation_seconds: float
+) -> None:
+    """Save successfully generated digest of the given chat."""
+    statement = insert(t_digests).values(
+        chat_id=chat_id,
+        text=text,
+        covered_until=covered_until,
+        created_at=func.now(),
+        generation_seconds=generation_seconds,
+        last_attempt_at=func.now(),
+        last_error=None,
+    )
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_digests.c.chat_id],
+            set_={
+                "text": statement.excluded.text,
+                "covered_until": statement.excluded.covered_until,
+                "created_at": statement.excluded.created_at,
+                "generation_seconds": statement.excluded.generation_seconds,
+                "last_attempt_at": statement.excluded.last_attempt_at,
+                "last_error": None,
+            },
+        )
+    )
+
+
+async def save_digest_error(conn: AsyncConnection, chat_id: int, error: str) -> None:
+    """Save failed digest generation attempt of the given chat keeping the previous digest text."""
+    statement = insert(t_digests).values(chat_id=chat_id, last_attempt_at=func.now(), last_error=error)
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_digests.c.chat_id],
+            set_={"last_attempt_at": statement.excluded.last_attempt_at, "last_error": statement.excluded.last_error},
+        )
+    )
+
+
+async def get_jobs(conn: AsyncConnection) -> list[DigestJob]:
+    """Return all scheduled digest jobs with the state of their last generation."""
+    statement = (
+        select(
+            t_digest_schedules.c.chat_id,
+            t_digest_schedules.c.every_messages,
+            t_digest_schedules.c.every_minutes,
+            t_digests.c.created_at,
+            t_digests.c.covered_until,
+            t_digests.c.generation_seconds,
+            t_digests.c.last_attempt_at,
+            t_digests.c.last_error,
+        )
+        .select_from(t_digest_schedules.outerjoin(t_digests, t_digests.c.chat_id == t_digest_schedules.c.chat_id))
+        .order_by(t_digest_schedules.c.chat_id)
+    )
+    return [
+        DigestJob(row[0], DigestSchedule(row[1], row[2]), row[3], row[4], row[5], row[6], row[7])
+        for row in await conn.execute(statement)
+    ]
@@ -0,0 +1,42 @@
+"""Stored messages and conversation export operations are defined here."""
+
+import datetime
+from typing import Any, AsyncIterator
+
+from sqlalchemy import Column, Table, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ya_gpt_bot.db.entities.conversation import t_conversation
+from ya_gpt_bot.db.entities.messages import t_messages
+
+EXPORTED_TABLES: dict[str, tuple[Table, Column]] = {
+    "messages": (t_messages, t_messages.c.datetime),
+    "conversation": (t_conversation, t_conversation.c.message_timestamp),
+}
+"""Exported tables by name with the timestamp columns used for filtering."""
+
+
+async def stream_rows(  # pylint: disable=too-many-arguments
+    conn: AsyncConnection,
+    table_name: str,
+    batch_size: int,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    chat_ids: list[int] | None = None,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yield rows of the table sent in [since, until) in batches of at most `batch_size` rows. Rows are fetched
+    through a server-side cursor, so only a single batch is kept in memory. The time range limits the scanned
+    partitions. Rows are not ordered.
+    """
+    table, timestamp = EXPORTED_TABLES[table_name]
+    statement = select(table)
+    if since is not None:
+        statement = statement.where(timestamp >= since)
+    if until is not None:
+        statement = statement.where(timestamp < until)
+    if chat_ids:
+        statement = statement.where(table.c.chat_id.in_(chat_ids))
+    result = await conn.stream(statement.execution_options(yield_per=batch_size))
+    async for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
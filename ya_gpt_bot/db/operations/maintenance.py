@@ -0,0 +1,55 @@
+"""Old data pruning operations used by the background maintenance are defined here.
+
+Old rows are removed by dropping whole time range partitions (see `partitions`), the rules which do not depend
+on time and the tables which are not partitioned delete rows in batches. Every such operation deletes at most
+`batch_size` rows and should be committed separately, so the rows are not locked for long and the deletion can be
+paced not to compete with the request handling for IO.
+"""
+
+import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ya_gpt_bot.db.entities.conversation import t_conversation, t_conversation_counters
+from ya_gpt_bot.db.entities.usage import t_usage_hourly
+
+
+async def prune_conversation_beyond_length(conn: AsyncConnection, keep_length: int, batch_size: int) -> int:
+    """Delete a batch of digest history messages which are followed by more than `keep_length` characters
+    of the newer messages of their chats. Return a number of deleted rows.
+    """
+    batch = (
+        select(t_conversation.c.chat_id, t_conversation.c.seq, t_conversation.c.message_timestamp)
+        .join(t_conversation_counters, t_conversation_counters.c.chat_id == t_conversation.c.chat_id)
+        .where(t_conversation.c.preceding_length <= t_conversation_counters.c.total_length - keep_length)
+        .limit(batch_size)
+        .cte("batch")
+    )
+    res = await conn.execute(
+        delete(t_conversation).where(
+            t_conversation.c.chat_id == batch.c.chat_id,
+            t_conversation.c.seq == batch.c.seq,
+            t_conversation.c.message_timestamp == batch.c.message_timestamp,
+        )
+    )
+    return res.rowcount
+
+
+async def prune_usage_hourly_before(conn: AsyncConnection, cutoff: datetime.datetime, batch_size: int) -> int:
+    """Delete a batch of hourly usage rollups of the hours before `cutoff`. Return a number of deleted rows."""
+    batch = (
+        select(t_usage_hourly.c.hour, t_usage_hourly.c.user_id, t_usage_hourly.c.chat_id, t_usage_hourly.c.model)
+        .where(t_usage_hourly.c.hour < cutoff)
+        .limit(batch_size)
+        .cte("batch")
+    )
+    res = await conn.execute(
+        delete(t_usage_hourly).where(
+            t_usage_hourly.c.hour == batch.c.hour,
+            t_usage_hourly.c.user_id == batch.c.user_id,
+            t_usage_hourly.c.chat_id == batch.c.chat_id,
+            t_usage_hourly.c.model == batch.c.model,
+        )
+    )
+    return res.rowcount
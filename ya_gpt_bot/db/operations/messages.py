@@ -1,23 +1,33 @@
 """Users common operations are defined here."""
 
-from dataclasses import dataclass
-from typing import Callable
+from typing import Any, Callable, Iterable
 
-from sqlalchemy import insert, select
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import BigInteger, ColumnElement, Select, exists, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 
 from ya_gpt_bot.db.entities import t_messages
+from ya_gpt_bot.services.dtos import DialogEntry, NewMessage
 
 func: Callable
 
+SAVE_MESSAGES_LOCK_CLASS = 0x6D736773
+"""First key of the PostgreSQL transaction-level advisory locks of chats held while their messages are saved,
+the second one is a hash of the chat id.
+"""
 
-@dataclass
-class DialogEntry:
-    """Dialog entry with indication whether the message was sent by the GPT bot."""
-
-    message: str
-    from_self: bool
+__all__ = [
+    "SAVE_MESSAGES_LOCK_CLASS",
+    "DialogEntry",
+    "NewMessage",
+    "get_dialog",
+    "get_dialog_chain",
+    "merge_dialog",
+    "save_message",
+    "save_messages",
+    "thread_dialog",
+    "thread_dialog_statement",
+]
 
 
 async def save_message(  # pylint: disable=too-many-arguments,too-many-positional-arguments
@@ -29,44 +39,171 @@ async def save_message(  # pylint: disable=too-many-arguments,too-many-positiona
     from_self: bool,
 ) -> None:
     """Save message (from user talking with GPT or model responsing to user)."""
-    try:
-        await conn.execute(
-            insert(t_messages).values(id=message_id, reply_id=reply_id, chat_id=chat_id, text=text, from_self=from_self)
+    await save_messages(conn, [NewMessage(message_id, reply_id, chat_id, text, from_self)])
+
+
+async def save_messages(conn: AsyncConnection, messages: list[NewMessage]) -> None:
+    """Save messages with a single multi-row statement, already saved ones are skipped. (`chat_id`, `id`) is not
+    unique for the partitioned table, so the saved messages are skipped explicitly holding a lock of the chat
+    until the end of the transaction, otherwise concurrent saves of the same message would both insert it.
+
+    Replied message is referenced only if it is saved already or is one of the given messages. Thread identifier
+    and depth are taken from the replied message.
+    """
+    if len(messages) == 0:
+        return
+    await conn.execute(
+        select(
+            *(
+                func.pg_advisory_xact_lock(SAVE_MESSAGES_LOCK_CLASS, func.hashint8(literal(chat_id, BigInteger)))
+                for chat_id in sorted({message.chat_id for message in messages})
+            )
         )
-    except IntegrityError:
-        await conn.rollback()
-        await conn.execute(insert(t_messages).values(id=message_id, chat_id=chat_id, text=text, from_self=from_self))
-
-    await conn.commit()
-
-
-async def get_dialog(conn: AsyncConnection, chat_id: int, reply_id: str) -> list[DialogEntry]:
-    """Return dialog starting with user"""
-    statement = select(
-        t_messages.c.chat_id,
-        t_messages.c.id,
-        t_messages.c.reply_id,
-        t_messages.c.text,
-        t_messages.c.from_self,
-        t_messages.c.datetime,
     )
-    cte_statement = statement.where(t_messages.c.chat_id == chat_id, t_messages.c.id == reply_id).cte(
-        name="messages_recursive", recursive=True
+    saving = {(message.chat_id, message.message_id): message for message in messages}
+    replied = t_messages.alias("replied")
+    threads: dict[tuple[int, int], tuple[Any, Any]] = {}
+
+    def thread_of(message: NewMessage) -> tuple[Any, Any]:
+        """Return thread identifier and depth (values or SQL expressions) of the message."""
+        key = (message.chat_id, message.message_id)
+        if key not in threads:
+            parent_key = (message.chat_id, message.reply_id)
+            if message.reply_id is None:
+                threads[key] = (message.message_id, 0)
+            elif parent_key in saving:
+                parent_thread_id, parent_depth = thread_of(saving[parent_key])
+                threads[key] = (parent_thread_id, parent_depth + 1)
+            else:
+                parent = (
+                    select(replied)
+                    .where(replied.c.chat_id == message.chat_id, replied.c.id == message.reply_id)
+                    .limit(1)
+                )
+                threads[key] = (
+                    func.coalesce(parent.with_only_columns(replied.c.thread_id).scalar_subquery(), message.message_id),
+                    func.coalesce(parent.with_only_columns(replied.c.depth + 1).scalar_subquery(), 0),
+                )
+        return threads[key]
+
+    rows = []
+    for message in saving.values():
+        reply_id = message.reply_id
+        if reply_id is not None and (message.chat_id, reply_id) not in saving:
+            reply_id = (
+                select(replied.c.id)
+                .where(replied.c.chat_id == message.chat_id, replied.c.id == reply_id)
+                .limit(1)
+                .scalar_subquery()
+            )
+        thread_id, depth = thread_of(message)
+        values = {
+            "id": message.message_id,
+            "reply_id": reply_id,
+            "chat_id": message.chat_id,
+            "text": message.text,
+            "from_self": message.from_self,
+            "thread_id": thread_id,
+            "depth": depth,
+        }
+        rows.append(
+            select(
+                *(
+                    (value if isinstance(value, ColumnElement) else literal(value, t_messages.c[name].type)).label(name)
+                    for name, value in values.items()
+                )
+            ).where(~exists().where(t_messages.c.chat_id == message.chat_id, t_messages.c.id == message.message_id))
+        )
+    await conn.execute(
+        insert(t_messages).from_select(
+            list(rows[0].selected_columns.keys()), union_all(*rows) if len(rows) > 1 else rows[0]
+        )
     )
 
-    recursive_part = statement.join(
-        cte_statement, (t_messages.c.chat_id == cte_statement.c.chat_id) & (t_messages.c.id == cte_statement.c.reply_id)
+
+def thread_dialog_statement(chat_id: int, reply_id: int, max_depth: int | None = None) -> Select:
+    """Return statement selecting (id, reply_id, text, from_self) of the thread messages which may be a part of
+    the dialog ending with the given message (the ones not deeper than it) with a single index range scan.
+    Only `max_depth` last levels of the thread are selected if it is set.
+
+    Messages of the dialog are not newer than the given one, so the newer partitions are pruned at execution.
+    """
+    replied = (
+        select(t_messages.c.thread_id, t_messages.c.depth, t_messages.c.datetime)
+        .where(t_messages.c.chat_id == chat_id, t_messages.c.id == reply_id)
+        .limit(1)
+        .cte("replied")
+    )
+    depth_condition = (t_messages.c.depth <= replied.c.depth) & (t_messages.c.datetime <= replied.c.datetime)
+    if max_depth is not None:
+        depth_condition &= t_messages.c.depth > replied.c.depth - max_depth
+    return (
+        select(t_messages.c.id, t_messages.c.reply_id, t_messages.c.text, t_messages.c.from_self)
+        .join(replied, (t_messages.c.thread_id == replied.c.thread_id) & depth_condition)
+        .where(t_messages.c.chat_id == chat_id)
+        .order_by(t_messages.c.depth, t_messages.c.id)
     )
 
-    statement = select(cte_statement.union_all(recursive_part)).order_by(cte_statement.c.datetime)
 
+async def get_dialog(
+    conn: AsyncConnection, chat_id: int, reply_id: str, max_depth: int | None = None
+) -> list[DialogEntry]:
+    """Return dialog ending with the given message, at most `max_depth` last messages (not counting the parts
+    of long responses) if set.
+    """
+    return merge_dialog(await get_dialog_chain(conn, chat_id, reply_id, max_depth))
+
+
+async def get_dialog_chain(
+    conn: AsyncConnection, chat_id: int, reply_id: str, max_depth: int | None = None
+) -> list[tuple[str, bool]]:
+    """Return (text, from_self) pairs of the dialog ending with the given message without merging response parts."""
+    rows = await conn.execute(thread_dialog_statement(chat_id, reply_id, max_depth))
+    return thread_dialog(rows, reply_id)
+
+
+def thread_dialog(rows: Iterable[tuple[int, int | None, str, bool]], reply_id: int) -> list[tuple[str, bool]]:
+    """Return (text, from_self) pairs of the dialog ending with the given message from the thread messages
+    (id, reply_id, text, from_self) ordered by depth.
+
+    All parts of a long bot response reply to the request, so the response is taken whole whichever part
+    the dialog continues from.
+    """
+    messages = {row[0]: row for row in rows}
+    path = []
+    message_id = reply_id
+    while message_id in messages:
+        path.append(messages[message_id])
+        message_id = messages[message_id][1]
+    path.reverse()
+
+    response_parts: dict[int | None, list[tuple[int, str]]] = {}
+    for idx, parent_id, text, from_self in messages.values():
+        if from_self:
+            response_parts.setdefault(parent_id, []).append((idx, text))
+
+    dialog = []
+    for _idx, parent_id, text, from_self in path:
+        if from_self and parent_id is not None:
+            dialog.extend((part, True) for _, part in sorted(response_parts[parent_id]))
+        else:
+            dialog.append((text, from_self))
+    return dialog
+
+
+def merge_dialog(messages: Iterable[tuple[str, bool]]) -> list[DialogEntry]:
+    """Build dialog from (text, from_self) pairs in chronological order joining consecutive bot messages
+    (parts of a long response).
+    """
     dialog: list[DialogEntry] = []
-    prev_from_self = True
-    for entry in await conn.execute(statement):
-        text, from_self = entry[3], entry[4]
-        if prev_from_self and from_self:
-            dialog[-1].message += f"\n{text}"
+    parts: list[list[str]] = []
+    for text, from_self in messages:
+        if from_self and len(dialog) > 0 and dialog[-1].from_self:
+            parts[-1].append(text)
         else:
             dialog.append(DialogEntry(text, from_self))
-        prev_from_self = from_self
+            parts.append([text])
+    for entry, entry_parts in zip(dialog, parts):
+        if len(entry_parts) > 1:
+            entry.message = "\n".join(entry_parts)
     return dialog
@@ -0,0 +1,135 @@
+"""Time range partitions management operations are defined here.
+
+Partitions of a table are contiguous ranges of its partitioning key named `{table}_p{YYYYMMDD}` by their
+(UTC) start. New partitions continue the last one, so partitions of different lengths may follow each other
+after `interval` is changed.
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import Literal
+
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ya_gpt_bot.db.entities.conversation import t_conversation
+from ya_gpt_bot.db.entities.messages import t_messages
+from ya_gpt_bot.db.entities.usage import t_usage
+
+PartitionInterval = Literal["month", "week"]
+
+PARTITIONED_TABLES: tuple[Table, ...] = (t_messages, t_conversation, t_usage)
+
+_PARTITIONS_STATEMENT = text(
+    """
+    SELECT
+        c.relname,
+        substring(bound FROM 'FROM \\(''([^'']+)''\\)')::timestamptz,
+        substring(bound FROM 'TO \\(''([^'']+)''\\)')::timestamptz,
+        i.inhdetachpending
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    CROSS JOIN pg_get_expr(c.relpartbound, c.oid) bound
+    WHERE i.inhparent = CAST(:table AS regclass)
+    ORDER BY 2
+    """
+)
+
+
+@dataclass
+class Partition:
+    """Partition of a table holding rows with partitioning key in [start, end) range."""
+
+    name: str
+    start: datetime.datetime
+    end: datetime.datetime
+    detach_pending: bool = False
+
+
+def partition_start(moment: datetime.datetime, interval: PartitionInterval) -> datetime.datetime:
+    """Return start of the partition range (in UTC) which the given moment falls into."""
+    day = moment.astimezone(datetime.timezone.utc).date()
+    if interval == "month":
+        day = day.replace(day=1)
+    else:
+        day -= datetime.timedelta(days=day.weekday())
+    return datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+
+
+def partition_end(start: datetime.datetime, interval: PartitionInterval) -> datetime.datetime:
+    """Return end of the partition range which starts at `start`, the next interval boundary after it."""
+    if interval == "month":
+        return partition_start(partition_start(start, "month") + datetime.timedelta(days=32), "month")
+    return partition_start(start, "week") + datetime.timedelta(days=7)
+
+
+async def get_partitions(conn: AsyncConnection, table: Table) -> list[Partition]:
+    """Return partitions of the table ordered by their ranges."""
+    rows = await conn.execute(_PARTITIONS_STATEMENT, {"table": table.name})
+    return [Partition(*row) for row in rows]
+
+
+async def covered_until(conn: AsyncConnection, table: Table, moment: datetime.datetime) -> datetime.datetime | None:
+    """Return end of the contiguous partitions of the table starting from the one containing `moment`, None if
+    there is no such partition (rows of that moment can not be saved).
+    """
+    until = None
+    for partition in await get_partitions(conn, table):
+        if partition.detach_pending:
+            continue
+        if until is None:
+            if partition.start <= moment < partition.end:
+                until = partition.end
+        elif partition.start == until:
+            until = partition.end
+        else:
+            break
+    return until
+
+
+async def create_partitions(
+    conn: AsyncConnection,
+    table: Table,
+    until: datetime.datetime,
+    interval: PartitionInterval,
+    since: datetime.datetime | None = None,
+) -> list[str]:
+    """Create partitions of the table following the existing ones up to the one containing `until` moment
+    (starting from the partition of `since` or `until` moment if there are none). Return names of created
+    partitions.
+    """
+    partitions = await get_partitions(conn, table)
+    start = partitions[-1].end if len(partitions) > 0 else partition_start(since or until, interval)
+    quote = conn.dialect.identifier_preparer.quote
+    created = []
+    while start <= until:
+        end = partition_end(start, interval)
+        name = f"{table.name}_p{start:%Y%m%d}"
+        await conn.execute(
+            text(
+                f"CREATE TABLE {quote(name)} PARTITION OF {quote(table.name)}"
+                f" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+        created.append(name)
+        start = end
+    return created
+
+
+async def drop_partitions_before(conn: AsyncConnection, table: Table, cutoff: datetime.datetime) -> list[str]:
+    """Detach and drop partitions of the table holding only rows older than `cutoff`. Return names of dropped
+    partitions.
+
+    Partitions are detached concurrently not to block the queries of the table, so the connection must be
+    in autocommit mode. Detaching interrupted earlier is finished first.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    dropped = []
+    for partition in await get_partitions(conn, table):
+        if partition.end > cutoff:
+            break
+        mode = "FINALIZE" if partition.detach_pending else "CONCURRENTLY"
+        await conn.execute(text(f"ALTER TABLE {quote(table.name)} DETACH PARTITION {quote(partition.name)} {mode}"))
+        await conn.execute(text(f"DROP TABLE {quote(partition.name)}"))
+        dropped.append(partition.name)
+    return dropped
@@ -0,0 +1,165 @@
+"""Hot operations executed as prepared asyncpg statements are defined here.
+
+Operations are equivalent to the SQLAlchemy ones of `users`, `users_preferences` and `messages` modules
+and must be kept in sync with them.
+"""
+
+from textwrap import dedent
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ya_gpt_bot.db.operations.messages import SAVE_MESSAGES_LOCK_CLASS, thread_dialog
+from ya_gpt_bot.db.prepared import PreparedStatements, Query
+from ya_gpt_bot.services.dtos import ChatStatus, NewMessage, UserPreferences, UserStatus
+
+USER_STATUS = Query(
+    "user_status",
+    dedent(
+        """
+        WITH new_user AS (
+            INSERT INTO users (id, status, direct) VALUES ($1, 'PENDING', $2)
+            ON CONFLICT (id) DO NOTHING
+            RETURNING status
+        )
+        SELECT status::text FROM new_user
+        UNION ALL
+        SELECT status::text FROM users WHERE id = $1
+        LIMIT 1
+        """
+    ),
+)
+
+CHAT_STATUS = Query(
+    "chat_status",
+    dedent(
+        """
+        WITH new_chat AS (
+            INSERT INTO chats (id, status) VALUES ($1, 'PENDING')
+            ON CONFLICT (id) DO NOTHING
+            RETURNING status
+        )
+        SELECT status::text FROM new_chat
+        UNION ALL
+        SELECT status::text FROM chats WHERE id = $1
+        LIMIT 1
+        """
+    ),
+)
+
+COMMITTED_USER_STATUS = Query("committed_user_status", "SELECT status::text FROM users WHERE id = $1")
+"""Status of a user created by a concurrent transaction, see `users.get_committed_user_status`."""
+
+COMMITTED_CHAT_STATUS = Query("committed_chat_status", "SELECT status::text FROM chats WHERE id = $1")
+
+SET_USER_DIRECT = Query(
+    "set_user_direct",
+    dedent(
+        """
+        INSERT INTO users (id, status, direct) VALUES ($1, 'PENDING', true)
+        ON CONFLICT (id) DO UPDATE SET direct = true, updated_at = now() WHERE users.direct IS false
+        """
+    ),
+)
+
+PREFERENCES = Query(
+    "preferences",
+    dedent(
+        """
+        WITH new_user AS (
+            INSERT INTO users (id, status, direct) VALUES ($1, 'PENDING', false)
+            ON CONFLICT (id) DO NOTHING
+        )
+        SELECT temperature, instruction_text, timeout FROM users_preferences WHERE user_id = $1
+        """
+    ),
+)
+
+LOCK_CHAT_MESSAGES = Query(
+    "lock_chat_messages",
+    f"SELECT pg_advisory_xact_lock({SAVE_MESSAGES_LOCK_CLASS}, hashint8(chat_id)) FROM unnest($1::bigint[]) chat_id",
+)
+
+# executed for every message of a batch in order, so the replied message may be one of the previous ones
+SAVE_MESSAGE = Query(
+    "save_message",
+    dedent(
+        """
+        INSERT INTO messages (chat_id, id, reply_id, from_self, text, thread_id, depth)
+        SELECT $1::bigint, $2::bigint, replied.id, $4::boolean, $5::text,
+            coalesce(replied.thread_id, $2::bigint), coalesce(replied.depth + 1, 0)
+        FROM (VALUES (1)) single
+        LEFT JOIN LATERAL (
+            SELECT id, thread_id, depth FROM messages WHERE chat_id = $1::bigint AND id = $3::bigint LIMIT 1
+        ) replied ON true
+        WHERE NOT EXISTS (SELECT FROM messages WHERE chat_id = $1::bigint AND id = $2::bigint)
+        """
+    ),
+)
+
+DIALOG = Query(
+    "dialog",
+    dedent(
+        """
+        WITH replied AS (
+            SELECT thread_id, depth, datetime FROM messages WHERE chat_id = $1 AND id = $2 LIMIT 1
+        )
+        SELECT m.id, m.reply_id, m.text, m.from_self
+        FROM messages m
+        JOIN replied ON m.thread_id = replied.thread_id AND m.depth <= replied.depth AND m.datetime <= replied.datetime
+        WHERE m.chat_id = $1
+        ORDER BY m.depth, m.id
+        """
+    ),
+)
+
+
+async def get_user_status(
+    statements: PreparedStatements, conn: AsyncConnection, user_id: int, direct: bool
+) -> UserStatus:
+    """Return status of a user given by id, create a new one with status `PENDING` if not found."""
+    status = await statements.fetchval(conn, USER_STATUS, user_id, direct)
+    if status is None:
+        status = await statements.fetchval(conn, COMMITTED_USER_STATUS, user_id)
+    return UserStatus(status)
+
+
+async def get_chat_status(statements: PreparedStatements, conn: AsyncConnection, chat_id: int) -> ChatStatus:
+    """Return status of a chat given by id, create a new one with status `PENDING` if not found."""
+    status = await statements.fetchval(conn, CHAT_STATUS, chat_id)
+    if status is None:
+        status = await statements.fetchval(conn, COMMITTED_CHAT_STATUS, chat_id)
+    return ChatStatus(status)
+
+
+async def set_user_direct(statements: PreparedStatements, conn: AsyncConnection, user_id: int) -> None:
+    """Set `direct=True` for a user with given id, create a new one with status `PENDING` is not found."""
+    await statements.fetch(conn, SET_USER_DIRECT, user_id)
+
+
+async def get_preferences(statements: PreparedStatements, conn: AsyncConnection, user_id: int) -> UserPreferences:
+    """Return preferences of the given user, empty ones if they are not set."""
+    rows = await statements.fetch(conn, PREFERENCES, user_id)
+    if len(rows) == 0:
+        return UserPreferences()
+    return UserPreferences(*rows[0])
+
+
+async def save_messages(statements: PreparedStatements, conn: AsyncConnection, messages: list[NewMessage]) -> None:
+    """Save messages in two round trips (locking the chats as `messages.save_messages` does), already saved ones
+    are skipped. Replied messages must precede the replies to them.
+    """
+    if len(messages) == 0:
+        return
+    await statements.fetch(conn, LOCK_CHAT_MESSAGES, sorted({m.chat_id for m in messages}))
+    await statements.executemany(
+        conn,
+        SAVE_MESSAGE,
+        [(m.chat_id, m.message_id, m.reply_id, m.from_self, m.text) for m in messages],
+    )
+
+
+async def get_dialog_chain(
+    statements: PreparedStatements, conn: AsyncConnection, chat_id: int, reply_id: int
+) -> list[tuple[str, bool]]:
+    """Return (text, from_self) pairs of the dialog ending with the given message without merging response parts."""
+    return thread_dialog(await statements.fetch(conn, DIALOG, chat_id, reply_id), reply_id)
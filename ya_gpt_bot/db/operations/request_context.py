@@ -0,0 +1,93 @@
+"""Generation request context operations are defined here."""
+
+from typing import Callable
+
+from sqlalchemy import func, null, select, tuple_, type_coerce
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.types import NullType
+
+from ya_gpt_bot.db.entities import t_chats, t_user_preferences, t_users
+from ya_gpt_bot.db.entities.enums import ChatStatus, UserStatus
+from ya_gpt_bot.db.operations.messages import DialogEntry, merge_dialog, thread_dialog, thread_dialog_statement
+from ya_gpt_bot.db.operations.users import (
+    get_committed_chat_status,
+    get_committed_user_status,
+    insert_user_if_missing_cte,
+)
+from ya_gpt_bot.services.dtos import RequestContext, UserPreferences
+
+func: Callable
+
+
+async def get_request_context(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    conn: AsyncConnection,
+    user_id: int,
+    chat_id: int,
+    reply_id: int | None,
+    direct: bool,
+    text: str,
+    known_user_status: UserStatus | None = None,
+    known_chat_status: ChatStatus | None = None,
+    max_depth: int | None = None,
+    known_dialog: tuple[tuple[str, bool], ...] | None = None,
+) -> RequestContext:
+    """Return statuses of the user and the chat (None for direct messages), user preferences and the dialog
+    which ends with the given reply-to message and the request text with a single statement.
+
+    User and chat are created with `PENDING` status if they are not found (statuses of the ones created
+    concurrently are selected by another statement). Statuses which are already known
+    are not queried, as well as the replied dialog if it is known. Only `max_depth` last messages of the dialog
+    are loaded if it is set.
+    """
+    columns = []
+    if known_user_status is None:
+        user_cte = insert_user_if_missing_cte(user_id, direct)
+        user_status = select(t_users.c.status).where(t_users.c.id == user_id).scalar_subquery()
+        columns.append(func.coalesce(user_status, select(user_cte.c.status).scalar_subquery()).label("user_status"))
+
+    if known_chat_status is None and not direct:
+        chat_cte = (
+            insert(t_chats)
+            .values(id=chat_id, status=ChatStatus.PENDING)
+            .on_conflict_do_nothing(index_elements=[t_chats.c.id])
+            .returning(t_chats.c.status)
+            .cte("new_chat")
+        )
+        chat_status = select(t_chats.c.status).where(t_chats.c.id == chat_id).scalar_subquery()
+        columns.append(func.coalesce(chat_status, select(chat_cte.c.status).scalar_subquery()).label("chat_status"))
+
+    preferences = select(
+        t_user_preferences.c.temperature, t_user_preferences.c.instruction_text, t_user_preferences.c.timeout
+    ).where(t_user_preferences.c.user_id == user_id)
+    columns.extend(
+        preferences.with_only_columns(column).scalar_subquery().label(column.name)
+        for column in preferences.selected_columns
+    )
+
+    if reply_id is not None and known_dialog is None:
+        # rows are aggregated as records, the driver returns them as (id, reply_id, text, from_self) tuples
+        dialog_cte = thread_dialog_statement(chat_id, reply_id, max_depth).cte("dialog")
+        dialog_rows = func.array_agg(tuple_(*dialog_cte.c))
+        columns.append(select(type_coerce(dialog_rows, NullType())).scalar_subquery().label("dialog"))
+    else:
+        columns.append(null().label("dialog"))
+
+    row = (await conn.execute(select(*columns))).mappings().one()
+
+    chain = known_dialog or ()
+    if reply_id is not None and known_dialog is None and row["dialog"] is not None:
+        chain = tuple(thread_dialog(row["dialog"], reply_id))
+    dialog = merge_dialog(chain)
+    dialog.append(DialogEntry(text, False))
+    user_status = known_user_status or row["user_status"] or await get_committed_user_status(conn, user_id)
+    chat_status = None
+    if not direct:
+        chat_status = known_chat_status or row["chat_status"] or await get_committed_chat_status(conn, chat_id)
+    return RequestContext(
+        user_status=user_status,
+        chat_status=chat_status,
+        preferences=UserPreferences(row["temperature"], row["instruction_text"], row["timeout"]),
+        dialog=dialog,
+        chain=chain,
+    )
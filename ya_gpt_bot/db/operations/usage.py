@@ -0,0 +1,85 @@
+"""Model usage accounting operations are defined here."""
+
+import datetime
+from typing import Any, Callable, Literal
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ya_gpt_bot.db.entities.usage import LATENCY_BUCKET_COLUMNS, t_usage, t_usage_hourly
+from ya_gpt_bot.services.dtos import UsageCounters, UsageRecord, UsageTotal
+
+func: Callable
+
+UsageGrouping = Literal["user_id", "chat_id", "model"]
+
+_COUNTERS_COLUMNS = ("requests", "input_tokens", "completion_tokens", "latency_seconds", *LATENCY_BUCKET_COLUMNS)
+
+
+def usage_row(record: UsageRecord) -> dict[str, Any]:
+    """Return columns values of the usage record."""
+    counters = record.counters
+    return {
+        "hour": record.hour,
+        "user_id": record.user_id,
+        "chat_id": record.chat_id,
+        "model": record.model,
+        "requests": counters.requests,
+        "input_tokens": counters.input_tokens,
+        "completion_tokens": counters.completion_tokens,
+        "latency_seconds": counters.latency_seconds,
+        **dict(zip(LATENCY_BUCKET_COLUMNS, counters.latency_buckets)),
+    }
+
+
+def usage_counters(values: Any) -> UsageCounters:
+    """Return counters from the row with `_COUNTERS_COLUMNS` in order (sums of big integers are decimals)."""
+    requests, input_tokens, completion_tokens, latency_seconds, *buckets = values
+    return UsageCounters(
+        int(requests), int(input_tokens), int(completion_tokens), float(latency_seconds), [int(b) for b in buckets]
+    )
+
+
+async def save_usage(conn: AsyncConnection, records: list[UsageRecord]) -> None:
+    """Save usage records and add them to the hourly rollups. Records must not repeat the same hour, user,
+    chat and model.
+    """
+    if len(records) == 0:
+        return
+    rows = [usage_row(record) for record in records]
+    await conn.execute(insert(t_usage), rows)
+    statement = pg_insert(t_usage_hourly).values(rows)
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[
+                t_usage_hourly.c.hour,
+                t_usage_hourly.c.user_id,
+                t_usage_hourly.c.chat_id,
+                t_usage_hourly.c.model,
+            ],
+            set_={column: t_usage_hourly.c[column] + statement.excluded[column] for column in _COUNTERS_COLUMNS},
+        )
+    )
+
+
+async def get_usage_totals(
+    conn: AsyncConnection,
+    group_by: UsageGrouping,
+    since: datetime.datetime,
+    chat_id: int | None = None,
+    limit: int = 10,
+) -> list[UsageTotal]:
+    """Return usage since the given hour summed from the hourly rollups by users, chats or models, the ones
+    with the most tokens spent first. Usage of a single chat is returned if `chat_id` is set.
+    """
+    statement = (
+        select(t_usage_hourly.c[group_by], *(func.sum(t_usage_hourly.c[column]) for column in _COUNTERS_COLUMNS))
+        .where(t_usage_hourly.c.hour >= since)
+        .group_by(t_usage_hourly.c[group_by])
+        .order_by(func.sum(t_usage_hourly.c.input_tokens + t_usage_hourly.c.completion_tokens).desc())
+        .limit(limit)
+    )
+    if chat_id is not None:
+        statement = statement.where(t_usage_hourly.c.chat_id == chat_id)
+    return [UsageTotal(row[0], usage_counters(row[1:])) for row in await conn.execute(statement)]
@@ -1,7 +1,8 @@
 """Users common operations are defined here."""
 from typing import Callable
 
-from sqlalchemy import exists, func, insert, select, update
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 
 from ya_gpt_bot.db.entities import t_chats, t_users
@@ -10,57 +11,95 @@ from ya_gpt_bot.db.entities.enums import ChatStatus, UserStatus
 func: Callable
 
 
+def insert_user_if_missing_cte(user_id: int, direct: bool = False):
+    """Return CTE inserting a user with `pending` status if it does not exist and returning the inserted status."""
+    return (
+        insert(t_users)
+        .values(id=user_id, status=UserStatus.PENDING, direct=direct)
+        .on_conflict_do_nothing(index_elements=[t_users.c.id])
+        .returning(t_users.c.status)
+        .cte("new_user")
+    )
+
+
 async def ensure_user_exists(conn: AsyncConnection, user_id: int) -> None:
     """Check user for existance, insert one with `pending` status and `direct=False` otherwise."""
-    exist = (await conn.execute(select(exists().where(t_users.c.id == user_id)))).scalar_one()
-    if exist:
-        return
-    await conn.execute(insert(t_users).values(id=user_id, status=UserStatus.PENDING, direct=False))
-    await conn.commit()
+    await conn.execute(
+        insert(t_users)
+        .values(id=user_id, status=UserStatus.PENDING, direct=False)
+        .on_conflict_do_nothing(index_elements=[t_users.c.id])
+    )
 
 
 async def get_user_status(conn: AsyncConnection, user_id: int, direct: bool) -> UserStatus:
     """Return status of a user given by id, create a new one with status `PENDING` if not found."""
-    status = (await conn.execute(select(t_users.c.status).where(t_users.c.id == user_id))).scalar_one_or_none()
+    new_user = insert_user_if_missing_cte(user_id, direct)
+    statement = union_all(select(new_user.c.status), select(t_users.c.status).where(t_users.c.id == user_id)).limit(1)
+    status = (await conn.execute(statement)).scalar_one_or_none()
     if status is None:
-        status = UserStatus.PENDING
-        await conn.execute(insert(t_users).values(id=user_id, status=status, direct=direct))
+        status = await get_committed_user_status(conn, user_id)
     return status
 
 
+async def get_committed_user_status(conn: AsyncConnection, user_id: int) -> UserStatus:
+    """Return status of a user which is created by a concurrent transaction.
+
+    Insertion of a user waits for the concurrent transaction inserting the same one to commit and inserts nothing,
+    but the inserted row is not visible to the statement snapshot, so it is selected by a new statement.
+    """
+    return (await conn.execute(select(t_users.c.status).where(t_users.c.id == user_id))).scalar_one()
+
+
 async def get_chat_status(conn: AsyncConnection, chat_id: int) -> ChatStatus:
     """Return status of a chat (group/supergroup/etc) given by id, create a new one with status `PENDING`
     if not found.
     """
-    status = (await conn.execute(select(t_chats.c.status).where(t_chats.c.id == chat_id))).scalar_one_or_none()
+    new_chat = (
+        insert(t_chats)
+        .values(id=chat_id, status=ChatStatus.PENDING)
+        .on_conflict_do_nothing(index_elements=[t_chats.c.id])
+        .returning(t_chats.c.status)
+        .cte("new_chat")
+    )
+    statement = union_all(select(new_chat.c.status), select(t_chats.c.status).where(t_chats.c.id == chat_id)).limit(1)
+    status = (await conn.execute(statement)).scalar_one_or_none()
     if status is None:
-        status = ChatStatus.PENDING
-        await conn.execute(insert(t_chats).values(id=chat_id, status=status))
+        status = await get_committed_chat_status(conn, chat_id)
     return status
 
 
+async def get_committed_chat_status(conn: AsyncConnection, chat_id: int) -> ChatStatus:
+    """Return status of a chat which is created by a concurrent transaction (see `get_committed_user_status`)."""
+    return (await conn.execute(select(t_chats.c.status).where(t_chats.c.id == chat_id))).scalar_one()
+
+
 async def set_user_status(conn: AsyncConnection, user_id: int, status: UserStatus) -> None:
     """Set status of the given user, create a new one with the given status is not found."""
-    is_updated = (
-        await conn.execute(update(t_users).values(status=status, updated_at=func.now()).where(t_users.c.id == user_id))
-    ).rowcount == 1
-    if not is_updated:
-        await conn.execute(insert(t_users).values(id=user_id, status=status, direct=False))
+    statement = insert(t_users).values(id=user_id, status=status, direct=False)
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_users.c.id], set_={"status": statement.excluded.status, "updated_at": func.now()}
+        )
+    )
 
 
 async def set_chat_status(conn: AsyncConnection, chat_id: int, status: ChatStatus) -> None:
     """Set status of the given chat, create a new one with the given status is not found."""
-    is_updated = (
-        await conn.execute(update(t_chats).values(status=status, updated_at=func.now()).where(t_chats.c.id == chat_id))
-    ).rowcount == 1
-    if not is_updated:
-        await conn.execute(insert(t_chats).values(id=chat_id, status=status))
+    statement = insert(t_chats).values(id=chat_id, status=status)
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_chats.c.id], set_={"status": statement.excluded.status, "updated_at": func.now()}
+        )
+    )
 
 
 async def set_user_direct(conn: AsyncConnection, user_id: int) -> None:
     """Set `direct=True` for a user with given id, create a new one with status `PENDING` is not found."""
-    is_updated = (
-        await conn.execute(update(t_users).values(direct=True, updated=func.now()).where(t_users.c.id == user_id))
-    ).rowcount == 1
-    if not is_updated:
-        await conn.execute(insert(t_users).values(id=user_id, status=UserStatus.PENDING, direct=True))
+    statement = insert(t_users).values(id=user_id, status=UserStatus.PENDING, direct=True)
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_users.c.id],
+            set_={"direct": literal(True), "updated_at": func.now()},
+            where=t_users.c.direct.is_(False),
+        )
+    )
@@ -1,12 +1,13 @@
 """Users preferences operations are defined here."""
 
-from typing import Callable
+from typing import Any, Callable
 
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 
 from ya_gpt_bot.db.entities import t_user_preferences
-from ya_gpt_bot.db.operations.users import ensure_user_exists
+from ya_gpt_bot.db.operations.users import insert_user_if_missing_cte
 from ya_gpt_bot.services.dtos import UserPreferences
 
 func: Callable
@@ -16,9 +17,14 @@ async def get_preferences(conn: AsyncConnection, user_id: int) -> UserPreference
     """Return preferences of the given user. Even if there are no preferences set,
     returns empty UserPreferences object.
     """
-    await ensure_user_exists(conn, user_id)
     preferences = (
-        (await conn.execute(select(t_user_preferences).where(t_user_preferences.c.user_id == user_id)))
+        (
+            await conn.execute(
+                select(t_user_preferences)
+                .where(t_user_preferences.c.user_id == user_id)
+                .add_cte(insert_user_if_missing_cte(user_id))
+            )
+        )
         .mappings()
         .one_or_none()
     )
@@ -32,35 +38,30 @@ async def delete_preferences(conn: AsyncConnection, user_id: int) -> None:
     await conn.execute(delete(t_user_preferences).where(t_user_preferences.c.user_id == user_id))
 
 
+async def _set_preference(conn: AsyncConnection, user_id: int, name: str, value: Any) -> None:
+    """Upsert single preference value creating the user if it does not exist. Foreign key is checked at the end
+    of the statement, so the user inserted by the CTE is already visible then.
+    """
+    statement = insert(t_user_preferences).values({"user_id": user_id, name: value})
+    await conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[t_user_preferences.c.user_id], set_={name: statement.excluded[name]}
+        ).add_cte(insert_user_if_missing_cte(user_id))
+    )
+
+
 async def set_temperature(conn: AsyncConnection, user_id: int, temperature: float) -> None:
     """Set user temperature preference."""
-    await ensure_user_exists(conn, user_id)
-    res = await conn.execute(
-        update(t_user_preferences).values(temperature=temperature).where(t_user_preferences.c.user_id == user_id)
-    )
-    if res.rowcount == 0:
-        await conn.execute(insert(t_user_preferences).values(temperature=temperature, user_id=user_id))
+    await _set_preference(conn, user_id, "temperature", temperature)
 
 
 async def set_instruction_text(conn: AsyncConnection, user_id: int, instruction_text: str) -> None:
     """Set user instruction text preference."""
-    await ensure_user_exists(conn, user_id)
     if instruction_text == "":
         instruction_text = None
-    res = await conn.execute(
-        update(t_user_preferences)
-        .values(instruction_text=instruction_text)
-        .where(t_user_preferences.c.user_id == user_id)
-    )
-    if res.rowcount == 0:
-        await conn.execute(insert(t_user_preferences).values(instruction_text=instruction_text, user_id=user_id))
+    await _set_preference(conn, user_id, "instruction_text", instruction_text)
 
 
 async def set_request_timeout(conn: AsyncConnection, user_id: int, timeout: int) -> None:
     """Set user timeout preference for YandexGPT request (used for debug purposes mostly)."""
-    await ensure_user_exists(conn, user_id)
-    res = await conn.execute(
-        update(t_user_preferences).values(timeout=timeout).where(t_user_preferences.c.user_id == user_id)
-    )
-    if res.rowcount == 0:
-        await conn.execute(insert(t_user_preferences).values(timeout=timeout, user_id=user_id))
+    await _set_preference(conn, user_id, "timeout", timeout)
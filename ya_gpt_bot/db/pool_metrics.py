@@ -0,0 +1,112 @@
+"""Connection pool with usage telemetry is defined here."""
+
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+
+@dataclass
+class Timings:
+    """Count, total and maximum duration (in seconds) of measured operations."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def average(self) -> float:
+        """Average duration, 0 if nothing was measured."""
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def add(self, duration: float) -> None:
+        """Account a single operation duration."""
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+
+@dataclass
+class PoolStats:  # pylint: disable=too-many-instance-attributes
+    """Connection pool usage statistics. `overflow` is a number of connections opened over `size`,
+    `acquire` timings include waiting for a free connection and opening a new one.
+    """
+
+    size: int
+    max_overflow: int
+    opened: int
+    checked_out: int
+    overflow: int
+    timeouts: int
+    acquire: Timings
+    connect: Timings
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """Asyncio queue pool measuring time spent to acquire connections and to open new ones."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.acquire_timings = Timings()
+        self.connect_timings = Timings()
+        self.timeouts = 0
+
+    def connect(self) -> PoolProxiedConnection:
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.acquire_timings.add(time.perf_counter() - started)
+
+    def stats(self) -> PoolStats:
+        """Return current pool usage statistics."""
+        return PoolStats(
+            self.size(),
+            self._max_overflow,
+            self.size() + self.overflow(),
+            self.checkedout(),
+            max(self.overflow(), 0),
+            self.timeouts,
+            Timings(**vars(self.acquire_timings)),
+            Timings(**vars(self.connect_timings)),
+        )
+
+
+def create_measured_engine(
+    url: URL, *, pool_size: int, max_overflow: int, pool_timeout: float, **kwargs: Any
+) -> AsyncEngine:
+    """Create async engine with `MeasuredQueuePool` of exactly the given size. Pool statistics are available
+    with `pool_stats`.
+    """
+    engine = create_async_engine(
+        url,
+        poolclass=MeasuredQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        **kwargs,
+    )
+
+    @event.listens_for(engine.sync_engine, "do_connect")
+    def measure_connect(dialect, _conn_rec, cargs, cparams):
+        started = time.perf_counter()
+        dbapi_connection = dialect.connect(*cargs, **cparams)
+        if isinstance(engine.pool, MeasuredQueuePool):
+            engine.pool.connect_timings.add(time.perf_counter() - started)
+        return dbapi_connection
+
+    return engine
+
+
+def pool_stats(engine: AsyncEngine) -> PoolStats | None:
+    """Return statistics of the engine pool, None if it is not created by `create_measured_engine`."""
+    if isinstance(engine.pool, MeasuredQueuePool):
+        return engine.pool.stats()
+    return None
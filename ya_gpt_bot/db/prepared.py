@@ -0,0 +1,76 @@
+"""Hot queries execution with asyncpg directly, bypassing SQLAlchemy statements compilation, is defined here."""
+
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.pool import PoolProxiedConnection
+
+
+@dataclass(frozen=True)
+class Query:
+    """SQL query with asyncpg (`$1`-style) parameters and a name unique among the queries."""
+
+    name: str
+    sql: str
+
+
+class PreparedStatements:
+    """Registry of SQL statements executed on the asyncpg connections underlying SQLAlchemy ones.
+
+    Statements are prepared with stable names once per connection and reused by all the later calls on it, they are
+    kept in the `info` of the pooled connection, so they are discarded with the connection when it is closed.
+    PgBouncer in transaction pooling mode does not keep named statements of a session, so they are not prepared
+    if `named` is False: statements are executed by asyncpg as is (unnamed prepared statements are used when its
+    statement cache is disabled, see `DatabaseConfig.pgbouncer`).
+
+    Statements are executed in the transaction of the SQLAlchemy connection, which is started if needed, so they
+    are committed or rolled back with the other statements of the connection (and the unit of work).
+    """
+
+    INFO_KEY = "ya_gpt_bot_prepared_statements"
+
+    def __init__(self, named: bool = True):
+        self.named = named
+
+    async def fetch(self, conn: AsyncConnection, query: Query, *args: Any) -> list[asyncpg.Record]:
+        """Execute query and return all its rows."""
+        pooled = await self._in_transaction(conn)
+        if not self.named:
+            return await pooled.driver_connection.fetch(query.sql, *args)
+        return await (await self._statement(pooled, query)).fetch(*args)
+
+    async def fetchval(self, conn: AsyncConnection, query: Query, *args: Any) -> Any:
+        """Execute query and return the first column of the first row."""
+        pooled = await self._in_transaction(conn)
+        if not self.named:
+            return await pooled.driver_connection.fetchval(query.sql, *args)
+        return await (await self._statement(pooled, query)).fetchval(*args)
+
+    async def executemany(self, conn: AsyncConnection, query: Query, args: Iterable[tuple[Any, ...]]) -> None:
+        """Execute query for every set of arguments in a single round trip."""
+        pooled = await self._in_transaction(conn)
+        if not self.named:
+            await pooled.driver_connection.executemany(query.sql, args)
+        else:
+            await (await self._statement(pooled, query)).executemany(args)
+
+    @staticmethod
+    async def _in_transaction(conn: AsyncConnection) -> PoolProxiedConnection:
+        """Return pooled connection underlying the given one with the transaction of it started on the server."""
+        if not conn.in_transaction():
+            await conn.begin()
+        pooled = await conn.get_raw_connection()
+        adapted = pooled.dbapi_connection
+        # asyncpg adapter sends BEGIN lazily before the first statement executed through it
+        if adapted is not None and adapted._transaction is None:  # pylint: disable=protected-access
+            await adapted._start_transaction()  # pylint: disable=protected-access
+        return pooled
+
+    async def _statement(self, pooled: PoolProxiedConnection, query: Query) -> PreparedStatement:
+        statements: dict[str, PreparedStatement] = pooled.info.setdefault(self.INFO_KEY, {})
+        if query.name not in statements:
+            statements[query.name] = await pooled.driver_connection.prepare(query.sql, name=f"ya_gpt_bot_{query.name}")
+        return statements[query.name]
@@ -0,0 +1,130 @@
+"""Read-only operations routing to the read replicas is defined here."""
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+_LAG_STATEMENT = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT FROM pg_stat_wal_receiver) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+"""Replication lag in seconds, 0 if all the received changes are replayed (the primary may be idle). NULL if
+the WAL receiver is not running: the replica is disconnected from the primary and its lag can not be measured.
+"""
+
+
+class ReplicaRouter:  # pylint: disable=too-many-instance-attributes
+    """Router of read-only operations between the primary database and its read replicas.
+
+    Replication lag of every replica is checked in background every `check_interval` seconds. Reads are spread
+    between the replicas lagging at most `max_lag` seconds, the primary is used if there are none (also until
+    the first check is done). Replicas disconnected from the primary are not used as their lag is unknown.
+
+    Data written recently (marked with `note_write` by a key such as table name and chat id) is read from
+    the primary for `max_lag` seconds, so the writes of the current and the previous updates are always seen.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        primary: AsyncEngine,
+        replicas: list[AsyncEngine],
+        max_lag: float,
+        check_interval: float = 5,
+        max_recent_writes: int = 100_000,
+        logger: Logger = global_logger,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self._max_recent_writes = max_recent_writes
+        self._logger = logger
+        self._lags: dict[AsyncEngine, float | None] = {replica: None for replica in replicas}
+        self._healthy: list[AsyncEngine] = []
+        self._checked = False
+        self._next = itertools.count()
+        self._recent_writes: OrderedDict[Hashable, float] = OrderedDict()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def lags(self) -> dict[AsyncEngine, float | None]:
+        """Last measured replication lag of every replica in seconds, None if it is unavailable."""
+        return dict(self._lags)
+
+    def note_write(self, key: Hashable) -> None:
+        """Mark data given by key as written just now, so it is read from the primary for a while."""
+        self._recent_writes[key] = time.monotonic()
+        self._recent_writes.move_to_end(key)
+        self._forget_old_writes()
+
+    def read_engine(self, *keys: Hashable) -> AsyncEngine:
+        """Return engine to execute read-only operation with: one of the replicas in sync, or the primary if
+        there are none or any of the data given by keys was written recently.
+        """
+        if len(self._healthy) == 0:
+            return self.primary
+        if any(key in self._recent_writes for key in keys):
+            self._forget_old_writes()
+            if any(key in self._recent_writes for key in keys):
+                return self.primary
+        return self._healthy[next(self._next) % len(self._healthy)]
+
+    def start(self) -> None:
+        """Start replication lag checking as a background task if there are replicas."""
+        if self._task is None and len(self.replicas) > 0:
+            self._task = asyncio.create_task(self._run(), name="replica-router")
+
+    async def stop(self) -> None:
+        """Stop replication lag checking, only the primary is used after that."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._healthy = []
+
+    async def check(self) -> None:
+        """Measure replication lag of every replica and update the replicas used for reading."""
+        for replica in self.replicas:
+            try:
+                async with replica.connect() as conn:
+                    lag = (await conn.execute(_LAG_STATEMENT)).scalar_one()
+                if lag is None and self._lags[replica] is not None:
+                    self._logger.warning("Replica {} is not receiving changes from the primary", replica.url.host)
+                self._lags[replica] = float(lag) if lag is not None else None
+            except Exception as exc:  # pylint: disable=broad-except
+                if self._lags[replica] is not None:
+                    self._logger.warning("Replica {} is unavailable: {!r}", replica.url.host, exc)
+                self._lags[replica] = None
+        healthy = [replica for replica, lag in self._lags.items() if lag is not None and lag <= self._max_lag]
+        if len(healthy) != len(self._healthy) or not self._checked:
+            self._logger.info("Replicas in sync: {} of {}", len(healthy), len(self.replicas))
+        self._healthy = healthy
+        self._checked = True
+
+    def _forget_old_writes(self) -> None:
+        expired = time.monotonic() - self._max_lag
+        while len(self._recent_writes) > 0 and (
+            len(self._recent_writes) > self._max_recent_writes or next(iter(self._recent_writes.values())) < expired
+        ):
+            self._recent_writes.popitem(last=False)
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self._check_interval)
@@ -0,0 +1,11 @@
+"""SQLite storage for single-node deployments is located here.
+
+Modules mirror `ya_gpt_bot.db.operations` ones: operations are synchronous functions executed on the database
+thread by `SQLiteDatabase.run`.
+"""
+
+from .database import SQLiteDatabase
+
+__all__ = [
+    "SQLiteDatabase",
+]
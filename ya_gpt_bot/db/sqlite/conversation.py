@@ -0,0 +1,87 @@
+"""Conversation SQLite operations are defined here."""
+
+import datetime
+import sqlite3
+
+from ya_gpt_bot.db.sqlite.database import from_micros, to_micros
+from ya_gpt_bot.services.dtos import ConversationMessage
+
+_LINE = "user_from || ',' || coalesce(user_to, '') || ',' || text"
+"""Conversation message line as it is passed to the model (see `conversation_service.format_message`)."""
+
+
+def save_messages(conn: sqlite3.Connection, messages: list[ConversationMessage]) -> None:
+    """Save messages in order. Sequence numbers and running lengths are taken from the chats counters
+    updated for every message.
+    """
+    for message in messages:
+        length = len(f"{message.from_name},{message.to_name or ''},{message.text}") + 1
+        seq, total_length = conn.execute(
+            "INSERT INTO conversation_counters (chat_id, last_seq, total_length) VALUES (?, 1, ?)"
+            " ON CONFLICT (chat_id) DO UPDATE SET last_seq = last_seq + 1,"
+            "  total_length = total_length + excluded.total_length"
+            " RETURNING last_seq, total_length",
+            (message.chat_id, length),
+        ).fetchone()
+        conn.execute(
+            "INSERT INTO conversation (chat_id, seq, user_from, user_to, message_timestamp, text, preceding_length)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                message.chat_id,
+                seq,
+                message.from_name,
+                message.to_name,
+                to_micros(message.message_timestamp),
+                message.text,
+                total_length - length,
+            ),
+        )
+
+
+def get_messages_within_context(
+    conn: sqlite3.Connection, chat_id: int, all_messages_length: int
+) -> list[tuple[str, datetime.datetime]]:
+    """Return the latest messages of the chat with total length (each with a newline) below `all_messages_length`
+    and their timestamps in chronological order.
+    """
+    rows = conn.execute(
+        f"SELECT {_LINE}, message_timestamp FROM conversation"
+        " WHERE chat_id = :chat_id AND preceding_length >"
+        "  (SELECT total_length - :length FROM conversation_counters WHERE chat_id = :chat_id)"
+        " ORDER BY preceding_length",
+        {"chat_id": chat_id, "length": all_messages_length},
+    )
+    return [(row[0], from_micros(row[1])) for row in rows]
+
+
+def get_messages_after(
+    conn: sqlite3.Connection, chat_id: int, after: datetime.datetime | None, max_length: int
+) -> tuple[str, datetime.datetime | None] | None:
+    """Return combined messages sent after the given timestamp and the timestamp of the last of them.
+    If messages do not fit in `max_length`, None is returned.
+    """
+    rows = conn.execute(
+        f"SELECT {_LINE}, message_timestamp FROM conversation"
+        " WHERE chat_id = ? AND message_timestamp > ? ORDER BY message_timestamp",
+        (chat_id, to_micros(after) if after is not None else -(2**63)),
+    )
+    messages: list[str] = []
+    total_length = 0
+    last_timestamp = after
+    for line, message_timestamp in rows:
+        total_length += len(line) + 1
+        if total_length > max_length:
+            return None
+        messages.append(line)
+        last_timestamp = from_micros(message_timestamp)
+    return "\n".join(messages), last_timestamp
+
+
+def get_recent_messages(conn: sqlite3.Connection, chat_id: int, limit: int) -> list[tuple[str, datetime.datetime]]:
+    """Return at most `limit` latest messages of the chat with their timestamps in chronological order."""
+    rows = conn.execute(
+        f"SELECT {_LINE}, message_timestamp FROM conversation"
+        " WHERE chat_id = ? ORDER BY message_timestamp DESC, seq DESC LIMIT ?",
+        (chat_id, limit),
+    ).fetchall()
+    return [(row[0], from_micros(row[1])) for row in reversed(rows)]
@@ -0,0 +1,190 @@
+"""SQLite database accessed from asyncio through a dedicated thread is defined here."""
+
+import asyncio
+import datetime
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+_T = TypeVar("_T")
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'PENDING',
+    direct INTEGER NOT NULL,
+    added_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'PENDING',
+    added_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS users_preferences (
+    user_id INTEGER PRIMARY KEY REFERENCES users (id),
+    temperature REAL CHECK (temperature >= 0.0 AND temperature <= 1.0),
+    instruction_text TEXT,
+    timeout INTEGER
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    reply_id INTEGER,
+    from_self INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    datetime INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, id)
+);
+CREATE INDEX IF NOT EXISTS ix_messages_chat_id_thread_id_depth ON messages (chat_id, thread_id, depth);
+CREATE TABLE IF NOT EXISTS conversation (
+    chat_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    user_from TEXT NOT NULL,
+    user_to TEXT,
+    message_timestamp INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    preceding_length INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, seq)
+);
+CREATE INDEX IF NOT EXISTS ix_conversation_chat_id_message_timestamp ON conversation (chat_id, message_timestamp);
+CREATE INDEX IF NOT EXISTS ix_conversation_chat_id_preceding_length ON conversation (chat_id, preceding_length);
+CREATE TABLE IF NOT EXISTS conversation_counters (
+    chat_id INTEGER PRIMARY KEY,
+    last_seq INTEGER NOT NULL,
+    total_length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS digest_schedules (
+    chat_id INTEGER PRIMARY KEY,
+    every_messages INTEGER CHECK (every_messages > 0),
+    every_minutes INTEGER CHECK (every_minutes > 0),
+    added_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS digests (
+    chat_id INTEGER PRIMARY KEY,
+    text TEXT,
+    covered_until INTEGER,
+    created_at INTEGER,
+    generation_seconds REAL,
+    last_attempt_at INTEGER NOT NULL,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS usage (
+    recorded_at INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_seconds REAL NOT NULL,
+    latency_le_1s INTEGER NOT NULL,
+    latency_le_2s INTEGER NOT NULL,
+    latency_le_5s INTEGER NOT NULL,
+    latency_le_10s INTEGER NOT NULL,
+    latency_le_30s INTEGER NOT NULL,
+    latency_le_60s INTEGER NOT NULL,
+    latency_gt_60s INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_usage_chat_id_recorded_at ON usage (chat_id, recorded_at);
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    hour INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_seconds REAL NOT NULL,
+    latency_le_1s INTEGER NOT NULL,
+    latency_le_2s INTEGER NOT NULL,
+    latency_le_5s INTEGER NOT NULL,
+    latency_le_10s INTEGER NOT NULL,
+    latency_le_30s INTEGER NOT NULL,
+    latency_le_60s INTEGER NOT NULL,
+    latency_gt_60s INTEGER NOT NULL,
+    PRIMARY KEY (hour, user_id, chat_id, model)
+);
+"""
+"""Tables mirroring the PostgreSQL ones (see `ya_gpt_bot.db.entities`) without partitioning. Timestamps compared
+by the queries are stored as integer microseconds since the epoch (see `to_micros`).
+"""
+
+
+def to_micros(moment: datetime.datetime) -> int:
+    """Return moment as microseconds since the epoch, naive moments are treated as UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return (moment - _EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def from_micros(micros: int | None) -> datetime.datetime | None:
+    """Return UTC moment given as microseconds since the epoch, None stays None."""
+    if micros is None:
+        return None
+    return _EPOCH + datetime.timedelta(microseconds=micros)
+
+
+def now_micros() -> int:
+    """Return current time as microseconds since the epoch."""
+    return to_micros(datetime.datetime.now(datetime.timezone.utc))
+
+
+class SQLiteDatabase:
+    """SQLite database file opened in WAL mode with a single connection owned by a dedicated thread.
+
+    Operations are plain functions taking `sqlite3.Connection` (see `ya_gpt_bot.db.sqlite` modules), they are
+    executed one by one on the database thread, each in a transaction of its own, so the event loop is never
+    blocked by the disk. Readers of other processes (e.g. `export` command) are not blocked by the writes in WAL
+    mode. Tables are created on the first operation if they do not exist.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self._busy_timeout = busy_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: sqlite3.Connection | None = None
+
+    async def run(self, operation: Callable[..., _T], *args: Any) -> _T:
+        """Execute `operation(conn, *args)` in a transaction on the database thread and return its result.
+        The transaction is committed if the operation succeeds and rolled back otherwise.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._execute, operation, args)
+
+    async def close(self) -> None:
+        """Close the connection and stop the database thread."""
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=self._busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")  # durable on application crash, WAL is synced on checkpoint
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, operation: Callable[..., _T], args: tuple[Any, ...]) -> _T:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = operation(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,129 @@
+"""Scheduled digests SQLite operations are defined here."""
+
+import datetime
+import sqlite3
+
+from ya_gpt_bot.db.sqlite.database import from_micros, now_micros, to_micros
+from ya_gpt_bot.services.dtos import DigestJob, DigestSchedule, StoredDigest
+
+_MINUTE = 60_000_000
+
+
+def set_schedule(conn: sqlite3.Connection, chat_id: int, schedule: DigestSchedule) -> None:
+    """Set digest schedule of the given chat, replacing the previous one."""
+    conn.execute(
+        "INSERT INTO digest_schedules (chat_id, every_messages, every_minutes) VALUES (?, ?, ?)"
+        " ON CONFLICT (chat_id) DO UPDATE SET every_messages = excluded.every_messages,"
+        "  every_minutes = excluded.every_minutes, updated_at = CURRENT_TIMESTAMP",
+        (chat_id, schedule.every_messages, schedule.every_minutes),
+    )
+
+
+def delete_schedule(conn: sqlite3.Connection, chat_id: int) -> bool:
+    """Delete digest schedule of the given chat. Return True if the schedule existed."""
+    return conn.execute("DELETE FROM digest_schedules WHERE chat_id = ?", (chat_id,)).rowcount == 1
+
+
+def get_schedule(conn: sqlite3.Connection, chat_id: int) -> DigestSchedule | None:
+    """Return digest schedule of the given chat or None if the chat has not opted-in."""
+    row = conn.execute(
+        "SELECT every_messages, every_minutes FROM digest_schedules WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+    return DigestSchedule(*row) if row is not None else None
+
+
+def get_due_chats(conn: sqlite3.Connection, retry_after: datetime.timedelta) -> list[int]:
+    """Return identifiers of chats which digest should be regenerated according to their schedules.
+
+    Chats which generation has been attempted less than `retry_after` ago are skipped, as well as the chats
+    without messages newer than the digest (time scheduled ones included).
+    """
+    rows = conn.execute(
+        """
+        SELECT s.chat_id
+        FROM digest_schedules s
+        LEFT JOIN digests d ON d.chat_id = s.chat_id
+        WHERE (d.last_attempt_at IS NULL OR d.last_attempt_at < :now - :retry_after)
+            AND (
+                s.every_minutes IS NOT NULL
+                    AND (d.created_at IS NULL OR d.created_at < :now - s.every_minutes * :minute)
+                    AND EXISTS (
+                        SELECT 1 FROM conversation c
+                        WHERE c.chat_id = s.chat_id AND c.message_timestamp > coalesce(d.covered_until, :min_moment)
+                    )
+                OR s.every_messages IS NOT NULL AND (
+                    SELECT count(*) FROM conversation c
+                    WHERE c.chat_id = s.chat_id AND c.message_timestamp > coalesce(d.covered_until, :min_moment)
+                ) >= s.every_messages
+            )
+        ORDER BY coalesce(d.created_at, :min_moment)
+        """,
+        {
+            "now": now_micros(),
+            "retry_after": retry_after // datetime.timedelta(microseconds=1),
+            "minute": _MINUTE,
+            "min_moment": -(2**63),
+        },
+    )
+    return [row[0] for row in rows]
+
+
+def get_digest(conn: sqlite3.Connection, chat_id: int) -> StoredDigest | None:
+    """Return the last successfully generated digest of the given chat."""
+    row = conn.execute(
+        "SELECT text, covered_until, created_at FROM digests WHERE chat_id = ? AND text IS NOT NULL", (chat_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return StoredDigest(row[0], from_micros(row[1]), from_micros(row[2]))
+
+
+def save_digest(
+    conn: sqlite3.Connection,
+    chat_id: int,
+    text: str,
+    covered_until: datetime.datetime | None,
+    generation_seconds: float,
+) -> None:
+    """Save successfully generated digest of the given chat."""
+    now = now_micros()
+    conn.execute(
+        "INSERT INTO digests (chat_id, text, covered_until, created_at, generation_seconds, last_attempt_at)"
+        " VALUES (?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (chat_id) DO UPDATE SET text = excluded.text, covered_until = excluded.covered_until,"
+        "  created_at = excluded.created_at, generation_seconds = excluded.generation_seconds,"
+        "  last_attempt_at = excluded.last_attempt_at, last_error = NULL",
+        (chat_id, text, to_micros(covered_until) if covered_until is not None else None, now, generation_seconds, now),
+    )
+
+
+def save_digest_error(conn: sqlite3.Connection, chat_id: int, error: str) -> None:
+    """Save failed digest generation attempt of the given chat keeping the previous digest text."""
+    conn.execute(
+        "INSERT INTO digests (chat_id, last_attempt_at, last_error) VALUES (?, ?, ?)"
+        " ON CONFLICT (chat_id) DO UPDATE SET last_attempt_at = excluded.last_attempt_at,"
+        "  last_error = excluded.last_error",
+        (chat_id, now_micros(), error),
+    )
+
+
+def get_jobs(conn: sqlite3.Connection) -> list[DigestJob]:
+    """Return all scheduled digest jobs with the state of their last generation."""
+    rows = conn.execute(
+        "SELECT s.chat_id, s.every_messages, s.every_minutes, d.created_at, d.covered_until, d.generation_seconds,"
+        "  d.last_attempt_at, d.last_error"
+        " FROM digest_schedules s LEFT JOIN digests d ON d.chat_id = s.chat_id"
+        " ORDER BY s.chat_id"
+    )
+    return [
+        DigestJob(
+            row[0],
+            DigestSchedule(row[1], row[2]),
+            from_micros(row[3]),
+            from_micros(row[4]),
+            row[5],
+            from_micros(row[6]),
+            row[7],
+        )
+        for row in rows
+    ]
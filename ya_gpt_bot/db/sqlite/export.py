@@ -0,0 +1,54 @@
+"""Stored messages and conversation SQLite export operations are defined here."""
+
+import datetime
+import sqlite3
+from typing import Any, Iterator
+
+from ya_gpt_bot.db.sqlite.database import from_micros, to_micros
+
+EXPORTED_TABLES: dict[str, str] = {"messages": "datetime", "conversation": "message_timestamp"}
+"""Exported tables by name with the timestamp columns used for filtering."""
+
+_BOOLEAN_COLUMNS = {"from_self"}
+
+
+def connect_read_only(path: str) -> sqlite3.Connection:
+    """Open a read-only connection to the database file, it does not block the bot writes in WAL mode."""
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def iter_rows(  # pylint: disable=too-many-arguments
+    conn: sqlite3.Connection,
+    table_name: str,
+    batch_size: int,
+    *,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    chat_ids: list[int] | None = None,
+) -> Iterator[list[dict[str, Any]]]:
+    """Yield rows of the table sent in [since, until) in batches of at most `batch_size` rows with the same
+    values as PostgreSQL ones (`ya_gpt_bot.db.operations.export.stream_rows`). Rows are not ordered.
+    """
+    timestamp = EXPORTED_TABLES[table_name]
+    conditions = ["true"]
+    params: list[Any] = []
+    if since is not None:
+        conditions.append(f"{timestamp} >= ?")
+        params.append(to_micros(since))
+    if until is not None:
+        conditions.append(f"{timestamp} < ?")
+        params.append(to_micros(until))
+    if chat_ids:
+        conditions.append(f"chat_id IN ({', '.join('?' * len(chat_ids))})")
+        params.extend(chat_ids)
+    cursor = conn.execute(f"SELECT * FROM {table_name} WHERE {' AND '.join(conditions)}", params)
+    columns = [description[0] for description in cursor.description]
+    while rows := cursor.fetchmany(batch_size):
+        yield [_convert_row(dict(zip(columns, row)), timestamp) for row in rows]
+
+
+def _convert_row(values: dict[str, Any], timestamp: str) -> dict[str, Any]:
+    values[timestamp] = from_micros(values[timestamp])
+    for column in _BOOLEAN_COLUMNS & values.keys():
+        values[column] = bool(values[column])
+    return values
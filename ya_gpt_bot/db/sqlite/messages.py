@@ -0,0 +1,58 @@
+"""Messages SQLite operations are defined here."""
+
+import sqlite3
+
+from ya_gpt_bot.db.operations.messages import thread_dialog
+from ya_gpt_bot.db.sqlite.database import now_micros
+from ya_gpt_bot.services.dtos import NewMessage
+
+
+def save_messages(conn: sqlite3.Connection, messages: list[NewMessage]) -> None:
+    """Save messages in order, already saved ones are skipped. Replied message is referenced only if it is
+    saved already (e.g. it is one of the previous given messages). Thread identifier and depth are taken from
+    the replied message.
+    """
+    now = now_micros()
+    conn.executemany(
+        """
+        INSERT INTO messages (chat_id, id, reply_id, from_self, text, datetime, thread_id, depth)
+        SELECT :chat_id, :id, replied.id, :from_self, :text, :now,
+            coalesce(replied.thread_id, :id), coalesce(replied.depth + 1, 0)
+        FROM (SELECT 1) single
+        LEFT JOIN messages replied ON replied.chat_id = :chat_id AND replied.id = :reply_id
+        WHERE true
+        ON CONFLICT DO NOTHING
+        """,
+        [
+            {
+                "chat_id": m.chat_id,
+                "id": m.message_id,
+                "reply_id": m.reply_id,
+                "from_self": m.from_self,
+                "text": m.text,
+                "now": now,
+            }
+            for m in messages
+        ],
+    )
+
+
+def get_dialog_chain(
+    conn: sqlite3.Connection, chat_id: int, reply_id: int, max_depth: int | None = None
+) -> list[tuple[str, bool]]:
+    """Return (text, from_self) pairs of the dialog ending with the given message without merging response parts.
+    Only `max_depth` last levels of the thread are considered if it is set.
+    """
+    rows = conn.execute(
+        """
+        SELECT m.id, m.reply_id, m.text, m.from_self
+        FROM messages replied
+        JOIN messages m ON m.chat_id = replied.chat_id AND m.thread_id = replied.thread_id
+            AND m.depth <= replied.depth AND m.datetime <= replied.datetime
+            AND (:max_depth IS NULL OR m.depth > replied.depth - :max_depth)
+        WHERE replied.chat_id = :chat_id AND replied.id = :reply_id
+        ORDER BY m.depth, m.id
+        """,
+        {"chat_id": chat_id, "reply_id": reply_id, "max_depth": max_depth},
+    )
+    return thread_dialog(((row[0], row[1], row[2], bool(row[3])) for row in rows), reply_id)
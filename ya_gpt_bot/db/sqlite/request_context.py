@@ -0,0 +1,46 @@
+"""Generation request context SQLite operations are defined here."""
+
+import sqlite3
+
+from ya_gpt_bot.db.operations.messages import merge_dialog
+from ya_gpt_bot.db.sqlite.messages import get_dialog_chain
+from ya_gpt_bot.db.sqlite.users import get_chat_status, get_user_status
+from ya_gpt_bot.services.dtos import ChatStatus, DialogEntry, RequestContext, UserPreferences, UserStatus
+
+
+def get_request_context(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    conn: sqlite3.Connection,
+    user_id: int,
+    chat_id: int,
+    reply_id: int | None,
+    direct: bool,
+    text: str,
+    known_user_status: UserStatus | None = None,
+    known_chat_status: ChatStatus | None = None,
+    known_dialog: tuple[tuple[str, bool], ...] | None = None,
+) -> RequestContext:
+    """Return statuses of the user and the chat (None for direct messages), user preferences and the dialog
+    which ends with the given reply-to message and the request text in a single transaction.
+
+    User and chat are created with `PENDING` status if they are not found. Statuses which are already known
+    are not queried, as well as the replied dialog if it is known.
+    """
+    user_status = known_user_status or get_user_status(conn, user_id, direct)
+    chat_status = None
+    if not direct:
+        chat_status = known_chat_status or get_chat_status(conn, chat_id)
+    row = conn.execute(
+        "SELECT temperature, instruction_text, timeout FROM users_preferences WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    chain = known_dialog or ()
+    if reply_id is not None and known_dialog is None:
+        chain = tuple(get_dialog_chain(conn, chat_id, reply_id))
+    dialog = merge_dialog(chain)
+    dialog.append(DialogEntry(text, False))
+    return RequestContext(
+        user_status=user_status,
+        chat_status=chat_status,
+        preferences=UserPreferences(*row) if row is not None else UserPreferences(),
+        dialog=dialog,
+        chain=chain,
+    )
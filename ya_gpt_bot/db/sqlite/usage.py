@@ -0,0 +1,48 @@
+"""Model usage accounting SQLite operations are defined here."""
+
+import datetime
+import sqlite3
+
+from ya_gpt_bot.db.entities.usage import LATENCY_BUCKET_COLUMNS
+from ya_gpt_bot.db.operations.usage import UsageGrouping, usage_counters, usage_row
+from ya_gpt_bot.db.sqlite.database import now_micros, to_micros
+from ya_gpt_bot.services.dtos import UsageRecord, UsageTotal
+
+_KEY_COLUMNS = ("hour", "user_id", "chat_id", "model")
+_COUNTERS_COLUMNS = ("requests", "input_tokens", "completion_tokens", "latency_seconds", *LATENCY_BUCKET_COLUMNS)
+_COLUMNS = ", ".join((*_KEY_COLUMNS, *_COUNTERS_COLUMNS))
+_PARAMETERS = ", ".join(f":{column}" for column in (*_KEY_COLUMNS, *_COUNTERS_COLUMNS))
+
+
+def save_usage(conn: sqlite3.Connection, records: list[UsageRecord]) -> None:
+    """Save usage records and add them to the hourly rollups."""
+    rows = [usage_row(record) | {"hour": to_micros(record.hour)} for record in records]
+    conn.executemany(
+        f"INSERT INTO usage (recorded_at, {_COLUMNS}) VALUES ({now_micros()}, {_PARAMETERS})",
+        rows,
+    )
+    conn.executemany(
+        f"INSERT INTO usage_hourly ({_COLUMNS}) VALUES ({_PARAMETERS})"
+        f" ON CONFLICT ({', '.join(_KEY_COLUMNS)}) DO UPDATE SET"
+        f" {', '.join(f'{column} = {column} + excluded.{column}' for column in _COUNTERS_COLUMNS)}",
+        rows,
+    )
+
+
+def get_usage_totals(
+    conn: sqlite3.Connection,
+    group_by: UsageGrouping,
+    since: datetime.datetime,
+    chat_id: int | None = None,
+    limit: int = 10,
+) -> list[UsageTotal]:
+    """Return usage since the given hour summed from the hourly rollups by users, chats or models, the ones
+    with the most tokens spent first. Usage of a single chat is returned if `chat_id` is set.
+    """
+    rows = conn.execute(
+        f"SELECT {group_by}, {', '.join(f'sum({column})' for column in _COUNTERS_COLUMNS)} FROM usage_hourly"
+        " WHERE hour >= :since AND (:chat_id IS NULL OR chat_id = :chat_id)"
+        f" GROUP BY {group_by} ORDER BY sum(input_tokens + completion_tokens) DESC LIMIT :limit",
+        {"since": to_micros(since), "chat_id": chat_id, "limit": limit},
+    )
+    return [UsageTotal(row[0], usage_counters(row[1:])) for row in rows]
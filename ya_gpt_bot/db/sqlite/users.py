@@ -0,0 +1,54 @@
+"""Users and chats SQLite operations are defined here."""
+
+import sqlite3
+
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+
+
+def ensure_user_exists(conn: sqlite3.Connection, user_id: int, direct: bool = False) -> None:
+    """Insert user with `pending` status if it does not exist."""
+    conn.execute(
+        "INSERT INTO users (id, status, direct) VALUES (?, 'PENDING', ?) ON CONFLICT (id) DO NOTHING",
+        (user_id, direct),
+    )
+
+
+def get_user_status(conn: sqlite3.Connection, user_id: int, direct: bool) -> UserStatus:
+    """Return status of a user given by id, create a new one with status `PENDING` if not found."""
+    ensure_user_exists(conn, user_id, direct)
+    return UserStatus(conn.execute("SELECT status FROM users WHERE id = ?", (user_id,)).fetchone()[0])
+
+
+def get_chat_status(conn: sqlite3.Connection, chat_id: int) -> ChatStatus:
+    """Return status of a chat (group/supergroup/etc) given by id, create a new one with status `PENDING`
+    if not found.
+    """
+    conn.execute("INSERT INTO chats (id, status) VALUES (?, 'PENDING') ON CONFLICT (id) DO NOTHING", (chat_id,))
+    return ChatStatus(conn.execute("SELECT status FROM chats WHERE id = ?", (chat_id,)).fetchone()[0])
+
+
+def set_user_status(conn: sqlite3.Connection, user_id: int, status: UserStatus) -> None:
+    """Set status of the given user, create a new one with the given status is not found."""
+    conn.execute(
+        "INSERT INTO users (id, status, direct) VALUES (?, ?, false)"
+        " ON CONFLICT (id) DO UPDATE SET status = excluded.status, updated_at = CURRENT_TIMESTAMP",
+        (user_id, status.value),
+    )
+
+
+def set_chat_status(conn: sqlite3.Connection, chat_id: int, status: ChatStatus) -> None:
+    """Set status of the given chat, create a new one with the given status is not found."""
+    conn.execute(
+        "INSERT INTO chats (id, status) VALUES (?, ?)"
+        " ON CONFLICT (id) DO UPDATE SET status = excluded.status, updated_at = CURRENT_TIMESTAMP",
+        (chat_id, status.value),
+    )
+
+
+def set_user_direct(conn: sqlite3.Connection, user_id: int) -> None:
+    """Set `direct=True` for a user with given id, create a new one with status `PENDING` is not found."""
+    conn.execute(
+        "INSERT INTO users (id, status, direct) VALUES (?, 'PENDING', true)"
+        " ON CONFLICT (id) DO UPDATE SET direct = true, updated_at = CURRENT_TIMESTAMP WHERE users.direct = false",
+        (user_id,),
+    )
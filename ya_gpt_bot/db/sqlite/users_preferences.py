@@ -0,0 +1,43 @@
+"""Users preferences SQLite operations are defined here."""
+
+import sqlite3
+from typing import Any
+
+from ya_gpt_bot.db.sqlite.users import ensure_user_exists
+from ya_gpt_bot.services.dtos import UserPreferences
+
+_PREFERENCES = ("temperature", "instruction_text", "timeout")
+
+
+def get_preferences(conn: sqlite3.Connection, user_id: int) -> UserPreferences:
+    """Return preferences of the given user. Even if there are no preferences set,
+    returns empty UserPreferences object.
+    """
+    ensure_user_exists(conn, user_id)
+    row = conn.execute(
+        "SELECT temperature, instruction_text, timeout FROM users_preferences WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    if row is None:
+        return UserPreferences()
+    return UserPreferences(*row)
+
+
+def delete_preferences(conn: sqlite3.Connection, user_id: int) -> None:
+    """Delete preferences of the given user. Do nothing if no preferences exist."""
+    conn.execute("DELETE FROM users_preferences WHERE user_id = ?", (user_id,))
+
+
+def set_preference(conn: sqlite3.Connection, user_id: int, name: str, value: Any) -> None:
+    """Upsert single preference value creating the user if it does not exist. Empty instruction text is saved
+    as null.
+    """
+    if name not in _PREFERENCES:
+        raise ValueError(f"Unknown preference: {name}")
+    if name == "instruction_text" and value == "":
+        value = None
+    ensure_user_exists(conn, user_id)
+    conn.execute(
+        f"INSERT INTO users_preferences (user_id, {name}) VALUES (?, ?)"
+        f" ON CONFLICT (user_id) DO UPDATE SET {name} = excluded.{name}",
+        (user_id, value),
+    )
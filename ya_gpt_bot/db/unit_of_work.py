@@ -0,0 +1,151 @@
+"""Unit of work sharing a single database connection between services during one update handling is defined here."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+_T = TypeVar("_T")
+
+_current_unit: ContextVar["UnitOfWork | None"] = ContextVar("current_unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """Connection shared by all services during a single update handling.
+
+    Connection is acquired lazily on the first database access. The transaction is committed and the connection
+    is returned to the pool on `release` (before long non-database operations such as model requests, a new one
+    is acquired on demand after that) and on leaving the context; on error the transaction is rolled back.
+    Callbacks registered with `after_transaction` are called once the current transaction ends.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._conn: AsyncConnection | None = None
+        self._closed = False
+        self._token = None
+        self._after_transaction: list[Callable[[], None]] = []
+
+    @property
+    def is_active(self) -> bool:
+        """Indicates whether the unit of work context has not been left yet."""
+        return not self._closed
+
+    def after_transaction(self, callback: Callable[[], None]) -> None:
+        """Call the callback when the current transaction is committed or rolled back (or right away if there
+        is no transaction), e.g. to drop values cached while the changes were not visible to others.
+        """
+        if self._conn is None:
+            callback()
+        else:
+            self._after_transaction.append(callback)
+
+    async def connection(self) -> AsyncConnection:
+        """Return the connection of the unit of work acquiring it from the pool if needed. Its transaction
+        is begun, so the statements executed on the underlying driver connection are a part of it as well.
+        """
+        if self._conn is None:
+            self._conn = await self.engine.connect()
+        if not self._conn.in_transaction():
+            await self._conn.begin()
+        return self._conn
+
+    async def commit(self) -> None:
+        """Commit the current transaction keeping the connection."""
+        if self._conn is not None:
+            try:
+                await self._conn.commit()
+            finally:
+                self._transaction_ended()
+
+    async def rollback(self) -> None:
+        """Rollback the current transaction keeping the connection."""
+        if self._conn is not None:
+            try:
+                await self._conn.rollback()
+            finally:
+                self._transaction_ended()
+
+    async def release(self, commit: bool = True) -> None:
+        """Commit (or rollback) the current transaction and return the connection to the pool."""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            if commit:
+                await conn.commit()
+        finally:
+            try:
+                await conn.close()
+            finally:
+                self._transaction_ended()
+
+    def _transaction_ended(self) -> None:
+        callbacks, self._after_transaction = self._after_transaction, []
+        for callback in callbacks:
+            callback()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self._token = _current_unit.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        _current_unit.reset(self._token)
+        self._closed = True
+        await self.release(commit=exc_type is None)
+
+
+def current_unit() -> UnitOfWork | None:
+    """Return active unit of work of the current update handling if there is one."""
+    unit = _current_unit.get()
+    if unit is None or not unit.is_active:
+        return None
+    return unit
+
+
+def call_after_transaction(callback: Callable[[], None]) -> None:
+    """Call the callback once the transaction of the current unit of work ends, or right away outside of a unit
+    (changes are committed by `connection_scope` then).
+    """
+    unit = current_unit()
+    if unit is None:
+        callback()
+    else:
+        unit.after_transaction(callback)
+
+
+async def release_connection() -> None:
+    """Commit and release connection of the current unit of work, if any. Should be called before long
+    non-database operations so the connection is not held idle.
+    """
+    unit = current_unit()
+    if unit is not None:
+        await unit.release()
+
+
+@asynccontextmanager
+async def connection_scope(engine: AsyncEngine) -> AsyncIterator[AsyncConnection]:
+    """Yield connection of the current unit of work if there is one for the given engine, changes are committed
+    at the unit boundaries then. Otherwise yield a new connection which changes are committed on scope exit.
+    """
+    unit = current_unit()
+    if unit is not None and unit.engine is engine:
+        yield await unit.connection()
+        return
+    async with engine.connect() as conn:
+        yield conn
+        await conn.commit()
+
+
+def create_task_outside_unit(coro: Awaitable[_T], name: str | None = None) -> asyncio.Task[_T]:
+    """Create task which does not share the connection of the current unit of work. Must be used for tasks
+    running concurrently with the update handling, as a connection cannot be used concurrently.
+    """
+
+    async def run() -> _T:
+        _current_unit.set(None)
+        return await coro
+
+    return asyncio.create_task(run(), name=name)
@@ -0,0 +1 @@
+"""Stored messages and conversation export to files is located here."""
@@ -0,0 +1,53 @@
+"""Streaming export of the stored tables is defined here."""
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+
+from ya_gpt_bot.export.writers import ExportWriter
+
+
+@dataclass
+class ExportStats:
+    """Exported table rows count, time spent and size of the written file in bytes."""
+
+    table: str
+    path: Path
+    rows: int = 0
+    seconds: float = 0.0
+    file_size: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Export throughput, 0 if nothing was exported."""
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+async def export_table(
+    table: str,
+    batches: AsyncIterator[list[dict[str, Any]]],
+    writer: ExportWriter,
+    report_interval: float = 10,
+    logger: Logger = global_logger,
+) -> ExportStats:
+    """Write all the batches with the writer and close it. Only a single batch is kept in memory at once,
+    progress is logged every `report_interval` seconds.
+    """
+    stats = ExportStats(table, writer.path)
+    started = time.perf_counter()
+    reported = started
+    with writer:
+        async for batch in batches:
+            writer.write(batch)
+            stats.rows += len(batch)
+            now = time.perf_counter()
+            if now - reported >= report_interval:
+                reported = now
+                logger.info("{}: {} rows exported, {:.0f} rows/s", table, stats.rows, stats.rows / (now - started))
+    stats.seconds = time.perf_counter() - started
+    stats.file_size = writer.path.stat().st_size
+    return stats
@@ -0,0 +1,88 @@
+"""Export files writers are defined here."""
+
+import abc
+import csv
+import datetime
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import Any, Literal
+
+ExportFormat = Literal["jsonl", "csv"]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ExportWriter(abc.ABC):
+    """Writer of exported rows batches to a text file, gzip-compressed if `compress` is set."""
+
+    extension: str
+
+    def __init__(self, path: Path, compress: bool = True):
+        self.path = path.with_name(f"{path.name}.{self.extension}{'.gz' if compress else ''}")
+        self._file: io.TextIOBase = (
+            gzip.open(self.path, "wt", encoding="utf-8", newline="")  # type: ignore[assignment]
+            if compress
+            else open(self.path, "w", encoding="utf-8", newline="")  # pylint: disable=consider-using-with
+        )
+
+    @abc.abstractmethod
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        """Write a batch of rows."""
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        self._file.close()
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+class JsonLinesWriter(ExportWriter):
+    """Writer of rows as JSON objects, one per line. Timestamps are written in ISO 8601 format."""
+
+    extension = "jsonl"
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows)
+
+
+class CsvWriter(ExportWriter):
+    """Writer of rows as CSV with a header of the first row columns. Empty values are NULLs, timestamps
+    are written in ISO 8601 format.
+    """
+
+    extension = "csv"
+
+    def __init__(self, path: Path, compress: bool = True):
+        super().__init__(path, compress)
+        self._writer: csv.DictWriter | None = None
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        if len(rows) == 0:
+            return
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=list(rows[0].keys()))
+            self._writer.writeheader()
+        self._writer.writerows(
+            {
+                column: value.isoformat() if isinstance(value, datetime.datetime) else value
+                for column, value in row.items()
+            }
+            for row in rows
+        )
+
+
+def get_writer(export_format: ExportFormat, path: Path, compress: bool = True) -> ExportWriter:
+    """Return writer of the given format to the file at path without extension."""
+    if export_format == "csv":
+        return CsvWriter(path, compress)
+    return JsonLinesWriter(path, compress)
@@ -0,0 +1,38 @@
+"""Model tokens usage reporting from GPT clients to the update being handled is defined here."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator
+
+
+@dataclass
+class TokenUsage:
+    """Tokens spent by a single model request."""
+
+    model: str
+    input_tokens: int
+    completion_tokens: int
+
+
+_current_usage: ContextVar[list[TokenUsage] | None] = ContextVar("current_token_usage", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[list[TokenUsage]]:
+    """Collect usage of all model requests made inside the context (including the tasks started there)
+    to the returned list.
+    """
+    usage: list[TokenUsage] = []
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def report_usage(usage: TokenUsage) -> None:
+    """Account usage of a model request in the current scope, it is ignored outside of `usage_scope`."""
+    current = _current_usage.get()
+    if current is not None:
+        current.append(usage)
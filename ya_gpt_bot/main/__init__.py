@@ -1,4 +1,6 @@
 """CLI logic is located here."""
 from .config import config_example  # isort: skip
 from .run_bot import run  # isort: skip
+from .maintenance import maintenance  # isort: skip
+from .export import export  # isort: skip
 from .group import cli  # isort: skip
@@ -0,0 +1,124 @@
+"""Stored messages and conversation export CLI command is defined here."""
+
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable
+
+import click
+
+from ya_gpt_bot.config.app_config import AppConfig
+from ya_gpt_bot.db.operations import export as db
+from ya_gpt_bot.db.sqlite import export as sqlite_db
+from ya_gpt_bot.export.exporter import ExportStats, export_table
+from ya_gpt_bot.export.writers import ExportFormat, get_writer
+
+from .group import cli
+from .run_bot import configure_logging
+
+BatchesSource = Callable[[str], AsyncIterator[list[dict[str, Any]]]]
+
+
+def _as_utc(moment: datetime.datetime | None) -> datetime.datetime | None:
+    if moment is None or moment.tzinfo is not None:
+        return moment
+    return moment.replace(tzinfo=datetime.timezone.utc)
+
+
+@asynccontextmanager
+async def _postgres_batches(
+    config: AppConfig, batch_size: int, filters: dict[str, Any]
+) -> AsyncIterator[BatchesSource]:
+    # the whole tables may be read, so a replica is used if there is one not to load the primary
+    replicas = config.db.get_replica_engines()
+    engine = replicas[0] if len(replicas) > 0 else config.db.get_background_engine()
+
+    async def batches(table: str) -> AsyncIterator[list[dict[str, Any]]]:
+        async with engine.connect() as conn:
+            async for batch in db.stream_rows(conn, table, batch_size, **filters):
+                yield batch
+
+    try:
+        yield batches
+    finally:
+        for replica in replicas:
+            await replica.dispose()
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def _sqlite_batches(config: AppConfig, batch_size: int, filters: dict[str, Any]) -> AsyncIterator[BatchesSource]:
+    conn = sqlite_db.connect_read_only(config.db.sqlite_path)
+
+    async def batches(table: str) -> AsyncIterator[list[dict[str, Any]]]:
+        for batch in sqlite_db.iter_rows(conn, table, batch_size, **filters):
+            yield batch
+
+    try:
+        yield batches
+    finally:
+        conn.close()
+
+
+@cli.command("export")
+@click.argument("config_file", type=click.Path(exists=True, dir_okay=False, path_type=Path), default="config.yaml")
+@click.option(
+    "--output-dir",
+    "-o",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=Path("."),
+    show_default=True,
+    help="Directory to write `<table>.<format>[.gz]` files to",
+)
+@click.option(
+    "--table",
+    "tables",
+    type=click.Choice(list(db.EXPORTED_TABLES)),
+    multiple=True,
+    help="Table to export, may be repeated  [default: all]",
+)
+@click.option("--format", "export_format", type=click.Choice(["jsonl", "csv"]), default="jsonl", show_default=True)
+@click.option("--compress/--no-compress", default=True, show_default=True, help="Compress files with gzip")
+@click.option("--since", type=click.DateTime(), help="Export rows sent at or after the moment (UTC if no zone)")
+@click.option("--until", type=click.DateTime(), help="Export rows sent before the moment (UTC if no zone)")
+@click.option("--chat-id", "chat_ids", type=int, multiple=True, help="Export rows of the chat, may be repeated")
+@click.option("--batch-size", type=click.IntRange(min=1), default=5000, show_default=True, help="Rows per fetch")
+def export(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    config_file: Path,
+    output_dir: Path,
+    tables: tuple[str, ...],
+    export_format: ExportFormat,
+    compress: bool,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+    chat_ids: tuple[int, ...],
+    batch_size: int,
+):
+    """Export stored messages and conversation history to files. Rows are streamed in batches with constant
+    memory, the time range limits the scanned partitions.
+    """
+    config = AppConfig.load(config_file)
+    logger = configure_logging(config.logging)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    filters = {"since": _as_utc(since), "until": _as_utc(until), "chat_ids": list(chat_ids)}
+    source = _sqlite_batches if config.db.backend == "sqlite" else _postgres_batches
+
+    async def run_export() -> list[ExportStats]:
+        results = []
+        async with source(config, batch_size, filters) as batches:
+            for table in tables or db.EXPORTED_TABLES:
+                writer = get_writer(export_format, output_dir / table, compress)
+                results.append(await export_table(table, batches(table), writer, logger=logger))
+        return results
+
+    for stats in asyncio.run(run_export()):
+        logger.info(
+            "{}: {} rows exported to {} ({:.1f} MB) in {:.1f}s, {:.0f} rows/s",
+            stats.table,
+            stats.rows,
+            stats.path,
+            stats.file_size / 2**20,
+            stats.seconds,
+            stats.rows_per_second,
+        )
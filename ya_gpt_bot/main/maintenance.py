@@ -0,0 +1,37 @@
+"""Database maintenance CLI command is defined here."""
+
+import asyncio
+from pathlib import Path
+
+import click
+
+from ya_gpt_bot.background.maintenance import MaintenanceRun, MaintenanceScheduler
+from ya_gpt_bot.config.app_config import AppConfig
+
+from .group import cli
+from .run_bot import configure_logging
+
+
+@cli.command("maintenance")
+@click.argument("config_file", type=click.Path(exists=True, dir_okay=False, path_type=Path), default="config.yaml")
+def maintenance(config_file: Path):
+    """Create time partitions and prune old data by the retention rules once (the same as the bot does
+    in background).
+    """
+    config = AppConfig.load(config_file)
+    logger = configure_logging(config.logging)
+
+    async def run_once() -> MaintenanceRun | None:
+        engine = config.db.get_engine()
+        try:
+            return await MaintenanceScheduler(engine, config.maintenance, logger).run_once()
+        finally:
+            await engine.dispose()
+
+    run = asyncio.run(run_once())
+    if run is None:
+        logger.warning("Maintenance is already running in another process")
+        return
+    logger.info("Partitions created: {}, dropped: {}", run.created_partitions, run.dropped_partitions)
+    for rule, deleted in run.deleted.items():
+        logger.info("{}: {} rows deleted in {:.1f}s", rule, deleted, run.durations[rule])
@@ -0,0 +1 @@
+"""Full-text search over the saved chat history is located here."""
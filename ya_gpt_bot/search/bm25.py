@@ -0,0 +1,92 @@
+"""Incremental in-memory BM25 index is defined here."""
+
+import heapq
+import math
+import re
+from collections import Counter, deque
+from typing import Generic, TypeVar
+
+_T = TypeVar("_T")
+
+_token_re = re.compile(r"\w+")
+
+
+def tokenize(text: str, stem_length: int = 6, max_tokens: int = 256) -> list[str]:
+    """Split text to lowercase terms. Terms are stemmed by truncating to `stem_length` characters which is a cheap
+    approximation of a stemmer for inflected languages, one-letter tokens are dropped.
+    """
+    return [token[:stem_length] for token in _token_re.findall(text.lower().replace("ё", "е")[: max_tokens * 16])][
+        :max_tokens
+    ]
+
+
+class _Document(Generic[_T]):  # pylint: disable=too-few-public-methods
+    __slots__ = ("terms", "length", "payload")
+
+    def __init__(self, terms: dict[str, int], length: int, payload: _T):
+        self.terms = terms
+        self.length = length
+        self.payload = payload
+
+
+class BM25Index(Generic[_T]):  # pylint: disable=too-many-instance-attributes
+    """BM25 index of at most `max_documents` latest added documents. Documents are added one by one, the oldest ones
+    are evicted from the index when the limit is reached.
+    """
+
+    def __init__(self, max_documents: int, k1: float = 1.5, b: float = 0.75):
+        self.max_documents = max_documents
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = {}
+        """Term -> document id -> term frequency in the document."""
+        self._documents: dict[int, _Document[_T]] = {}
+        self._order: deque[int] = deque()
+        self._next_id = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, text: str, payload: _T) -> None:
+        """Add document with the given text to the index, `payload` is returned on search."""
+        terms = Counter(tok for tok in tokenize(text) if len(tok) > 1)
+        if len(terms) == 0:
+            return
+        doc_id = self._next_id
+        self._next_id += 1
+        length = sum(terms.values())
+        self._documents[doc_id] = _Document(dict(terms), length, payload)
+        self._order.append(doc_id)
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+        while len(self._documents) > self.max_documents:
+            self._evict(self._order.popleft())
+
+    def _evict(self, doc_id: int) -> None:
+        document = self._documents.pop(doc_id)
+        self._total_length -= document.length
+        for term in document.terms:
+            posting = self._postings[term]
+            del posting[doc_id]
+            if len(posting) == 0:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int) -> list[_T]:
+        """Return payloads of at most `limit` documents most relevant to the query in order of addition."""
+        if len(self._documents) == 0:
+            return []
+        documents_count = len(self._documents)
+        avg_length = self._total_length / documents_count
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            idf = math.log(1 + (documents_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self._documents[doc_id].length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [self._documents[doc_id].payload for doc_id, _ in sorted(best)]
@@ -0,0 +1,166 @@
+"""In-process LRU caches are defined here."""
+
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, Hashable, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+@dataclass
+class CacheStats:
+    """Cache usage statistics."""
+
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    memory_bytes: int | None = None
+    max_memory_bytes: int | None = None
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of cache hits among all lookups, 0 if there were none."""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class _Entry(Generic[_V]):  # pylint: disable=too-few-public-methods
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: _V, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class TTLCache(Generic[_K, _V]):
+    """Cache holding at most `max_size` least recently used entries, each for at most `ttl` seconds."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[_K, _Entry[_V]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def invalidations(self) -> int:
+        """Number of invalidations so far, to be passed to `set` by the loads which may have read stale values."""
+        return self._invalidations
+
+    def get(self, key: _K) -> _V | None:
+        """Return cached value or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry.value
+
+    def set(self, key: _K, value: _V, invalidations: int | None = None) -> None:
+        """Put value to the cache evicting the least recently used entry if the cache is full. The value is not put
+        if `invalidations` is given and some values were invalidated since, as the value might have been loaded
+        before the change the invalidation was made for.
+        """
+        if invalidations is not None and invalidations != self._invalidations:
+            return
+        self._entries[key] = _Entry(value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: _K) -> None:
+        """Remove value from the cache if it is present."""
+        self._entries.pop(key, None)
+        self._invalidations += 1
+
+    def clear(self) -> None:
+        """Remove all values from the cache."""
+        self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """Return cache usage statistics."""
+        return CacheStats(len(self._entries), self.max_size, self._hits, self._misses)
+
+
+DialogChain = tuple[tuple[str, bool], ...]
+"""Dialog messages as (text, from_self) pairs in chronological order (response parts are not merged)."""
+
+
+class DialogCache:
+    """Dialogs of recently touched threads keyed by (chat_id, message_id) of the last message of the dialog.
+
+    Least recently used dialogs are evicted to keep the approximate memory taken by texts within `max_bytes`.
+    Dialogs are extended by `append` as new messages of a cached dialog are saved, so a follow-up to a recent
+    response does not need to read the thread from the database.
+    """
+
+    ENTRY_OVERHEAD = 200
+    """Approximate size of the key, the dictionary item and the tuples of a dialog besides texts, bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[int, int], tuple[DialogChain, int]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: int, message_id: int) -> DialogChain | None:
+        """Return dialog ending with the given message or None if it is not cached."""
+        entry = self._entries.get((chat_id, message_id))
+        if entry is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end((chat_id, message_id))
+        self._hits += 1
+        return entry[0]
+
+    def set(self, chat_id: int, message_id: int, dialog: DialogChain) -> None:
+        """Put dialog ending with the given message evicting the least recently used ones if needed."""
+        self._remove((chat_id, message_id))
+        size = self.ENTRY_OVERHEAD + sum(sys.getsizeof(text) + 8 for text, _ in dialog)
+        if size > self.max_bytes:
+            return
+        self._entries[(chat_id, message_id)] = (dialog, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def append(self, chat_id: int, message_id: int, reply_id: int | None, messages: DialogChain) -> None:
+        """Cache dialog ending with the new message `message_id` replying to `reply_id` if the replied dialog
+        is cached or the message starts a new one. `messages` are the new message texts (all parts of a response).
+        """
+        if reply_id is None:
+            self.set(chat_id, message_id, messages)
+            return
+        entry = self._entries.get((chat_id, reply_id))
+        if entry is not None:
+            self.set(chat_id, message_id, entry[0] + messages)
+
+    def clear(self) -> None:
+        """Remove all dialogs from the cache."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        """Return cache usage statistics."""
+        return CacheStats(len(self._entries), 0, self._hits, self._misses, self._bytes, self.max_bytes)
+
+    def _remove(self, key: tuple[int, int]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
@@ -0,0 +1,48 @@
+"""Conversation store protocol is defined here."""
+
+import datetime
+from abc import abstractmethod
+from typing import Protocol
+
+from aiogram.types import Message
+
+
+class ConversationStore(Protocol):
+    """Store of chats conversations used for digests and history search."""
+
+    @abstractmethod
+    def get_instruction_prompt(self) -> str:
+        """Return instructions for a GPT service."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def saving_text(self, message: Message) -> str | None:
+        """Return text of the message to save to the conversation, None if it should not be saved."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def save_message(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, chat_id: int, from_name: str, to_name: str, message_timestamp: datetime.datetime, text: str
+    ):
+        """Save message to the chat conversation."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_chat_messages_window(self, chat_id: int, context_length: int) -> tuple[str, datetime.datetime | None]:
+        """Return combined messages fitting in the context and the timestamp of the last of them."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_chat_messages_after(
+        self, chat_id: int, after: datetime.datetime | None, max_length: int
+    ) -> tuple[str, datetime.datetime | None] | None:
+        """Return combined messages sent after the given timestamp and the timestamp of the last of them.
+
+        If messages do not fit in `max_length`, None is returned.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_recent_messages(self, chat_id: int, limit: int) -> list[tuple[str, datetime.datetime]]:
+        """Return at most `limit` latest messages of the chat with their timestamps in chronological order."""
+        raise NotImplementedError()
@@ -1,5 +1,6 @@
 """Data Transfer Objects are defined here."""
-from dataclasses import dataclass
+import datetime
+from dataclasses import dataclass, field
 from enum import Enum
 
 
@@ -51,3 +52,138 @@ class UserPreferences:
     temperature: float | None = None
     instruction_text: str | None = None
     timeout: str | None = None
+
+
+@dataclass
+class DigestSchedule:
+    """Background digest schedule of a chat. At least one of the conditions is set."""
+
+    every_messages: int | None = None
+    every_minutes: int | None = None
+
+
+@dataclass
+class StoredDigest:
+    """Digest generated earlier and saved to the storage."""
+
+    text: str
+    covered_until: datetime.datetime | None
+    created_at: datetime.datetime
+
+
+@dataclass
+class DigestJob:  # pylint: disable=too-many-instance-attributes
+    """State of a background digest job of a chat."""
+
+    chat_id: int
+    schedule: DigestSchedule
+    created_at: datetime.datetime | None
+    covered_until: datetime.datetime | None
+    generation_seconds: float | None
+    last_attempt_at: datetime.datetime | None
+    last_error: str | None
+
+
+@dataclass
+class DialogEntry:
+    """Dialog entry with indication whether the message was sent by the GPT bot."""
+
+    message: str
+    from_self: bool
+
+
+@dataclass
+class NewMessage:
+    """Message to be saved: a request to GPT or a (part of) model response."""
+
+    message_id: int
+    reply_id: int | None
+    chat_id: int
+    text: str
+    from_self: bool
+
+
+@dataclass
+class ConversationMessage:
+    """Chat message saved for digests and history search."""
+
+    chat_id: int
+    from_name: str
+    to_name: str | None
+    message_timestamp: datetime.datetime
+    text: str
+
+
+@dataclass
+class RequestContext:
+    """Everything needed to handle a generation request: statuses of the user and the chat (None in direct
+    messages), user preferences and the dialog finishing with the request text.
+    """
+
+    user_status: UserStatus
+    chat_status: ChatStatus | None
+    preferences: UserPreferences
+    dialog: list[DialogEntry]
+    chain: tuple[tuple[str, bool], ...] = ()
+    "Replied dialog as (text, from_self) pairs with response parts not merged, empty if the request is not a reply"
+
+
+LATENCY_BUCKETS_SECONDS = (1, 2, 5, 10, 30, 60)
+"""Upper bounds of the update handling latency buckets, the last bucket counts the longer updates."""
+
+
+@dataclass
+class UsageCounters:
+    """Model requests, tokens and handling latency of updates accounted together."""
+
+    requests: int = 0
+    input_tokens: int = 0
+    completion_tokens: int = 0
+    latency_seconds: float = 0.0
+    "Total handling time of the updates"
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_SECONDS) + 1))
+    "Numbers of updates by `LATENCY_BUCKETS_SECONDS`"
+
+    @property
+    def updates(self) -> int:
+        """Number of accounted updates."""
+        return sum(self.latency_buckets)
+
+    def add(self, other: "UsageCounters") -> None:
+        """Add counters of the other instance to these ones."""
+        self.requests += other.requests
+        self.input_tokens += other.input_tokens
+        self.completion_tokens += other.completion_tokens
+        self.latency_seconds += other.latency_seconds
+        self.latency_buckets = [mine + theirs for mine, theirs in zip(self.latency_buckets, other.latency_buckets)]
+
+    def latency_percentile(self, share: float) -> float | None:
+        """Return upper bound of the latency bucket containing the given share (0..1) of the updates,
+        infinity if it is the last one and None if there are no updates.
+        """
+        needed = share * self.updates
+        seen = 0
+        for bound, count in zip((*LATENCY_BUCKETS_SECONDS, float("inf")), self.latency_buckets):
+            seen += count
+            if count > 0 and seen >= needed:
+                return bound
+        return None
+
+
+@dataclass
+class UsageRecord:
+    """Usage of a model by a user in a chat during an hour (given by its start)."""
+
+    hour: datetime.datetime
+    user_id: int
+    chat_id: int
+    model: str
+    counters: UsageCounters
+
+
+@dataclass
+class UsageTotal:
+    """Usage summed by a user, a chat or a model given by `key`."""
+
+    key: int | str
+    counters: UsageCounters
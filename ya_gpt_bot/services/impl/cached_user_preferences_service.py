@@ -0,0 +1,49 @@
+"""User preferences service caching preferences in memory is defined here."""
+
+from ya_gpt_bot.db.unit_of_work import call_after_transaction
+from ya_gpt_bot.services.cache import TTLCache
+from ya_gpt_bot.services.dtos import UserPreferences
+from ya_gpt_bot.services.user_preferences_service import UserPreferencesService
+
+
+class CachedUserPreferencesService(UserPreferencesService):
+    """User preferences service wrapper caching preferences. Cached values are invalidated when preferences
+    are set through this service and once again when the transaction of the change ends, so the value read
+    concurrently before the change is committed is not cached. Changes made by other bot replicas are seen
+    after the cache TTL.
+    """
+
+    def __init__(self, user_preferences_service: UserPreferencesService, max_size: int = 10_000, ttl: float = 300):
+        self._user_preferences_service = user_preferences_service
+        self.preferences: TTLCache[int, UserPreferences] = TTLCache(max_size, ttl)
+
+    async def get_preferences(self, user_id: int) -> UserPreferences:
+        preferences = self.preferences.get(user_id)
+        if preferences is None:
+            invalidations = self.preferences.invalidations
+            preferences = await self._user_preferences_service.get_preferences(user_id)
+            self.preferences.set(user_id, preferences, invalidations)
+        return preferences
+
+    async def reset_preferences(self, user_id: int) -> None:
+        await self._user_preferences_service.reset_preferences(user_id)
+        self._invalidate(user_id)
+
+    async def set_temperature(self, user_id: int, temperature: float) -> None:
+        await self._user_preferences_service.set_temperature(user_id, temperature)
+        self._invalidate(user_id)
+
+    async def set_instruction_text(self, user_id: int, instruction_text: str) -> None:
+        await self._user_preferences_service.set_instruction_text(user_id, instruction_text)
+        self._invalidate(user_id)
+
+    async def set_request_timeout(self, user_id: int, timeout: int) -> None:
+        await self._user_preferences_service.set_request_timeout(user_id, timeout)
+        self._invalidate(user_id)
+
+    async def shutdown(self) -> None:
+        await self._user_preferences_service.shutdown()
+
+    def _invalidate(self, user_id: int) -> None:
+        self.preferences.invalidate(user_id)
+        call_after_transaction(lambda: self.preferences.invalidate(user_id))
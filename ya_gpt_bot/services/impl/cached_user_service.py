@@ -0,0 +1,54 @@
+"""User service caching statuses in memory is defined here."""
+
+from ya_gpt_bot.db.unit_of_work import call_after_transaction
+from ya_gpt_bot.services.cache import TTLCache
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+from ya_gpt_bot.services.user_service import UserService
+
+
+class CachedUserService(UserService):
+    """User service wrapper caching user and chat statuses. Cached values are invalidated when statuses
+    are set through this service and once again when the transaction of the change ends, so the value read
+    concurrently before the change is committed is not cached. Changes made by other bot replicas are seen
+    after the cache TTL.
+    """
+
+    def __init__(self, user_service: UserService, max_size: int = 10_000, ttl: float = 300):
+        self._user_service = user_service
+        self.user_statuses: TTLCache[int, UserStatus] = TTLCache(max_size, ttl)
+        self.chat_statuses: TTLCache[int, ChatStatus] = TTLCache(max_size, ttl)
+
+    async def get_user_status(self, user_id: int, direct: bool) -> UserStatus:
+        status = self.user_statuses.get(user_id)
+        if status is None:
+            invalidations = self.user_statuses.invalidations
+            status = await self._user_service.get_user_status(user_id, direct)
+            self.user_statuses.set(user_id, status, invalidations)
+        return status
+
+    async def get_chat_status(self, chat_id: int) -> ChatStatus:
+        status = self.chat_statuses.get(chat_id)
+        if status is None:
+            invalidations = self.chat_statuses.invalidations
+            status = await self._user_service.get_chat_status(chat_id)
+            self.chat_statuses.set(chat_id, status, invalidations)
+        return status
+
+    async def set_user_status(self, user_id: int, status: UserStatus) -> None:
+        await self._user_service.set_user_status(user_id, status)
+        _invalidate(self.user_statuses, user_id)
+
+    async def set_chat_status(self, chat_id: int, status: ChatStatus) -> None:
+        await self._user_service.set_chat_status(chat_id, status)
+        _invalidate(self.chat_statuses, chat_id)
+
+    async def set_user_direct(self, user_id: int) -> None:
+        await self._user_service.set_user_direct(user_id)
+
+    async def shutdown(self) -> None:
+        await self._user_service.shutdown()
+
+
+def _invalidate(cache: TTLCache, key: int) -> None:
+    cache.invalidate(key)
+    call_after_transaction(lambda: cache.invalidate(key))
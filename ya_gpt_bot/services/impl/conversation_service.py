@@ -1,15 +1,25 @@
 """Service to get and update conversations."""
 
+import asyncio
 import datetime
+from collections import OrderedDict, deque
 from textwrap import dedent
 from typing import Callable
 
 from aiogram.types import Message
-from sqlalchemy import delete, func, insert, select
-from sqlalchemy.exc import IntegrityError
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy import TIMESTAMP, BigInteger, String, column, func, select, values
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncEngine
 
-from ya_gpt_bot.db.entities.conversation import t_conversation
+from ya_gpt_bot.db.entities.conversation import t_conversation, t_conversation_counters
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.unit_of_work import connection_scope, create_task_outside_unit
+from ya_gpt_bot.services.conversation_store import ConversationStore
+from ya_gpt_bot.services.dtos import ConversationMessage
+from ya_gpt_bot.services.write_buffer import WriteBuffer
 
 func: Callable
 
@@ -34,15 +44,202 @@ DEFAULT_INSTRUCTION_PROMPT = dedent(
 )
 
 
-class ConversationService:
+def _full_message_expr():
+    """Return expression of a conversation message line as it is passed to the model."""
+    return func.concat(
+        t_conversation.c.user_from,
+        ",",
+        func.coalesce(t_conversation.c.user_to, ""),
+        ",",
+        t_conversation.c.text,
+    ).label("full_message")
+
+
+def format_message(from_name: str, to_name: str | None, text: str) -> str:
+    """Return conversation message line as it is passed to the model."""
+    return f"{from_name},{to_name or ''},{text}"
+
+
+def _insert_messages_statement(messages: list[ConversationMessage]) -> Insert:
+    """Return statement saving messages with a single multi-row insert. Sequence numbers and running lengths
+    are taken from the chats counters updated by the same statement.
+    """
+    counters: dict[int, tuple[int, int]] = {}
+    rows = []
+    for message in reversed(messages):  # number of the chat messages and their total length after each message
+        length = len(format_message(message.from_name, message.to_name, message.text)) + 1
+        later_count, later_length = counters.get(message.chat_id, (0, 0))
+        rows.append(
+            (
+                message.chat_id,
+                message.from_name,
+                message.to_name,
+                message.message_timestamp,
+                message.text,
+                later_count,
+                later_length + length,
+            )
+        )
+        counters[message.chat_id] = (later_count + 1, later_length + length)
+    rows.reverse()
+
+    counters_update = insert(t_conversation_counters).values(
+        [
+            {"chat_id": chat_id, "last_seq": count, "total_length": total_length}
+            for chat_id, (count, total_length) in counters.items()
+        ]
+    )
+    counters_cte = (
+        counters_update.on_conflict_do_update(
+            index_elements=[t_conversation_counters.c.chat_id],
+            set_={
+                "last_seq": t_conversation_counters.c.last_seq + counters_update.excluded.last_seq,
+                "total_length": t_conversation_counters.c.total_length + counters_update.excluded.total_length,
+            },
+        )
+        .returning(
+            t_conversation_counters.c.chat_id,
+            t_conversation_counters.c.last_seq,
+            t_conversation_counters.c.total_length,
+        )
+        .cte("counters")
+    )
+    new_messages = values(
+        column("chat_id", BigInteger),
+        column("user_from", String),
+        column("user_to", String),
+        column("message_timestamp", TIMESTAMP(timezone=True)),
+        column("text", String),
+        column("later_count", BigInteger),
+        column("length_from", BigInteger),
+        name="new_messages",
+    ).data(rows)
+    return insert(t_conversation).from_select(
+        ["chat_id", "user_from", "user_to", "message_timestamp", "text", "seq", "preceding_length"],
+        select(
+            new_messages.c.chat_id,
+            new_messages.c.user_from,
+            new_messages.c.user_to,
+            new_messages.c.message_timestamp,
+            new_messages.c.text,
+            counters_cte.c.last_seq - new_messages.c.later_count,
+            counters_cte.c.total_length - new_messages.c.length_from,
+        ).join(counters_cte, counters_cte.c.chat_id == new_messages.c.chat_id),
+    )
+
+
+# TODO: implement
+def saving_text(message: Message) -> str | None:
+    """Return text of the message to save to the conversation, None if the message is not a part of it
+    or the user does not want to save their messages for the digest.
+    """
+    if message.chat.type == "private":
+        return None
+    text = message.text
+    if message.caption is not None:
+        text = f"(Изображение) {message.caption}"
+    if text is None or text == "" or text.startswith("/"):  # bot commands are not a part of the conversation
+        return None
+    return text
+
+
+def _is_rejected(exc: Exception) -> bool:
+    """Return True if the database rejects the written messages themselves (data exception or constraint violation,
+    e.g. text with a NUL character or no partition for the timestamp), so writing them again is useless.
+    """
+    if isinstance(exc, (DataError, IntegrityError)):
+        return True
+    sqlstate = getattr(getattr(exc, "orig", None), "sqlstate", None)
+    return isinstance(sqlstate, str) and sqlstate[:2] in ("22", "23")
+
+
+class _ChatHistory:
+    """Latest conversation lines of a chat with their timestamps, total length of lines (each with a newline)
+    is kept below `capacity`. Lines older than `covered_after` may be missing.
+    """
+
+    __slots__ = ("capacity", "lines", "timestamps", "length", "covered_after")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.lines: deque[str] = deque()
+        self.timestamps: deque[datetime.datetime] = deque()
+        self.length = 0
+        self.covered_after: datetime.datetime | None = None
+
+    def append(self, line: str, message_timestamp: datetime.datetime) -> None:
+        """Add the newest line evicting the oldest ones which do not fit anymore."""
+        self.lines.append(line)
+        self.timestamps.append(message_timestamp)
+        self.length += len(line) + 1
+        while self.length >= self.capacity:
+            self.length -= len(self.lines.popleft()) + 1
+            evicted = self.timestamps.popleft()
+            if self.covered_after is None or evicted > self.covered_after:
+                self.covered_after = evicted
+
+    def window(self, max_length: int) -> list[tuple[str, datetime.datetime]]:
+        """Return the latest lines with total length below `max_length` in chronological order."""
+        result = []
+        length = 0
+        for line, message_timestamp in zip(reversed(self.lines), reversed(self.timestamps)):
+            length += len(line) + 1
+            if length >= max_length:
+                break
+            result.append((line, message_timestamp))
+        result.reverse()
+        return result
+
+
+class ConversationService(ConversationStore):  # pylint: disable=too-many-instance-attributes
     """Service to get and update conversations."""
 
-    def __init__(self, engine: AsyncEngine, instruction_prompt: str = ...):
-        """Initialize ConversationService with database engine and optional instruction."""
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        engine: AsyncEngine,
+        instruction_prompt: str = ...,
+        write_buffer_size: int = 0,
+        write_batch_size: int = 500,
+        write_interval: float = 1.0,
+        write_max_wait: float = 5.0,
+        history_capacity: int = 0,
+        history_max_chats: int = 1000,
+        replica_router: ReplicaRouter | None = None,
+        logger: Logger = global_logger,
+    ):
+        """Initialize ConversationService with database engine and optional instruction.
+
+        If `write_buffer_size` is positive, saved messages are buffered in memory and written in batches
+        in background (see `WriteBuffer`), buffered messages of a chat are written before its conversation is read.
+
+        If `history_capacity` is positive, latest messages of at most `history_max_chats` recently read chats
+        are kept in memory (up to `history_capacity` characters per chat, loaded from the database on the first
+        read) and the context windows not longer than the capacity are served without database reads.
+
+        If `replica_router` is set, conversations are read from the replicas chosen by it.
+        """
         self._engine = engine
+        self._replica_router = replica_router
+        self._logger = logger
         if instruction_prompt is ...:
             instruction_prompt = DEFAULT_INSTRUCTION_PROMPT
         self._instruction_prompt = instruction_prompt
+        self._buffer: WriteBuffer[ConversationMessage] | None = None
+        if write_buffer_size > 0:
+            self._buffer = WriteBuffer(
+                self._write_buffered,
+                write_buffer_size,
+                write_batch_size,
+                write_interval,
+                write_max_wait,
+                rejects=_is_rejected,
+                logger=logger,
+            )
+        self._history_capacity = history_capacity
+        self._history_max_chats = history_max_chats
+        self._histories: OrderedDict[int, _ChatHistory] = OrderedDict()
+        self._loading: dict[int, asyncio.Task] = {}
+        self._warming: dict[int, list[tuple[str, datetime.datetime]]] = {}
 
     def get_instruction_prompt(self) -> str:
         """Return instructions for a GPT service."""
@@ -50,105 +247,209 @@ class ConversationService:
 
     async def get_chat_messages_history(self, chat_id: int, context_length: int) -> str:
         """Return combined messages."""
-        messages = await self._get_messages_within_context(chat_id, context_length - len(self._instruction_prompt) - 1)
+        messages_joined, _ = await self.get_chat_messages_window(chat_id, context_length)
+        return messages_joined
+
+    async def get_chat_messages_window(self, chat_id: int, context_length: int) -> tuple[str, datetime.datetime | None]:
+        """Return combined messages fitting in the context and the timestamp of the last of them."""
+        max_length = context_length - len(self._instruction_prompt) - 1
+        if max_length < self._history_capacity:
+            history = await self._get_history(chat_id)
+            messages = history.window(max_length)
+        else:
+            messages = await self._get_messages_within_context(chat_id, max_length)
         if not messages:
-            return ""
+            return "", None
 
-        messages_joined = "\n".join(messages)
-        return messages_joined
+        messages_joined = "\n".join(m[0] for m in messages)
+        return messages_joined, messages[-1][1]
 
-    async def _get_messages_within_context(self, chat_id: int, all_messages_length: int) -> list[str]:
-        """Return messages withing defined context from the chat and clear messages that are out of context."""
-        async with self._engine.connect() as conn:
-            agg_cte = (
-                select(
-                    (
-                        func.length(t_conversation.c.user_from)
-                        + 1
-                        + func.length(func.coalesce(t_conversation.c.user_to, ""))
-                        + 1
-                        + func.length(t_conversation.c.text)
-                        + 1
-                    ).label("full_message_length"),
-                    t_conversation.c.message_timestamp.label("ts"),
-                )
-                .where(t_conversation.c.chat_id == chat_id)
-                .cte("agg")
-            )
+    async def get_chat_messages_after(
+        self, chat_id: int, after: datetime.datetime | None, max_length: int
+    ) -> tuple[str, datetime.datetime | None] | None:
+        """Return combined messages sent after the given timestamp and the timestamp of the last of them.
+
+        If messages do not fit in `max_length`, None is returned.
+        """
+        statement = (
+            select(_full_message_expr(), t_conversation.c.message_timestamp)
+            .where(t_conversation.c.chat_id == chat_id)
+            .order_by(t_conversation.c.message_timestamp)
+        )
+        if after is not None:
+            statement = statement.where(t_conversation.c.message_timestamp > after)
+            history = self._histories.get(chat_id)
+            if history is not None and history.covered_after is not None and after >= history.covered_after:
+                return self._history_after(history, after, max_length)
+        await self._flush(chat_id)
+        messages: list[str] = []
+        total_length = 0
+        last_timestamp = after
+        async with connection_scope(self._read_engine(chat_id)) as conn:
+            for full_message, message_timestamp in await conn.execute(statement):
+                total_length += len(full_message) + 1
+                if total_length > max_length:
+                    return None
+                messages.append(full_message)
+                last_timestamp = message_timestamp
+        return "\n".join(messages), last_timestamp
 
-            windowed_cte = select(
-                agg_cte.c.ts,
-                (
-                    func.sum(agg_cte.c.full_message_length).over(order_by=agg_cte.c.ts.desc()) < all_messages_length
-                ).label("fit_in_context"),
-            ).cte("windowed")
+    @staticmethod
+    def _history_after(
+        history: _ChatHistory, after: datetime.datetime, max_length: int
+    ) -> tuple[str, datetime.datetime | None] | None:
+        messages: list[str] = []
+        total_length = 0
+        last_timestamp = after
+        for line, message_timestamp in zip(history.lines, history.timestamps):
+            if message_timestamp <= after:
+                continue
+            total_length += len(line) + 1
+            if total_length > max_length:
+                return None
+            messages.append(line)
+            last_timestamp = message_timestamp
+        return "\n".join(messages), last_timestamp
 
-            result = (
+    async def _get_history(self, chat_id: int) -> _ChatHistory:
+        """Return in-memory history of the chat loading it from the database if needed. Concurrent reads of a chat
+        which is not loaded yet wait for the same load.
+        """
+        history = self._histories.get(chat_id)
+        if history is not None:
+            self._histories.move_to_end(chat_id)
+            return history
+        if chat_id not in self._loading:
+            self._warming[chat_id] = []
+            self._loading[chat_id] = create_task_outside_unit(self._load_history(chat_id))
+        return await asyncio.shield(self._loading[chat_id])
+
+    async def _load_history(self, chat_id: int) -> _ChatHistory:
+        try:
+            return await self._fill_history(chat_id)
+        finally:
+            del self._loading[chat_id]
+            del self._warming[chat_id]
+
+    async def _fill_history(self, chat_id: int) -> _ChatHistory:
+        """Load history of the chat from the database adding the messages saved while loading."""
+        messages = await self._get_messages_within_context(chat_id, self._history_capacity)
+        history = _ChatHistory(self._history_capacity)
+        for line, message_timestamp in messages:
+            history.append(line, message_timestamp)
+        if len(messages) > 0:  # older messages may have been deleted or just not loaded
+            history.covered_after = messages[0][1]
+        last_timestamp = messages[-1][1] if len(messages) > 0 else None
+        last_lines = {line for line, message_timestamp in messages if message_timestamp == last_timestamp}
+        for line, message_timestamp in self._warming[chat_id]:  # saved while loading, may be loaded already
+            if last_timestamp is not None and (
+                message_timestamp < last_timestamp or message_timestamp == last_timestamp and line in last_lines
+            ):
+                continue
+            history.append(line, message_timestamp)
+        self._histories[chat_id] = history
+        while len(self._histories) > self._history_max_chats:
+            self._histories.popitem(last=False)
+        return history
+
+    async def get_recent_messages(self, chat_id: int, limit: int) -> list[tuple[str, datetime.datetime]]:
+        """Return at most `limit` latest messages of the chat with their timestamps in chronological order."""
+        await self._flush(chat_id)
+        async with connection_scope(self._read_engine(chat_id)) as conn:
+            rows = (
                 await conn.execute(
-                    select(func.min(windowed_cte.c.ts).label("min_ts")).where(windowed_cte.c.fit_in_context)
-                )
-            ).fetchone()
-            min_ts = result[0] if result else None
-
-            if min_ts:
-                full_message_expr = func.concat(
-                    t_conversation.c.user_from,
-                    ",",
-                    func.coalesce(t_conversation.c.user_to, ""),
-                    ",",
-                    t_conversation.c.text,
-                ).label("full_message")
-                select_results = await conn.execute(
-                    select(full_message_expr)
-                    .where(t_conversation.c.message_timestamp >= min_ts, t_conversation.c.chat_id == chat_id)
-                    .order_by(t_conversation.c.message_timestamp)
+                    select(_full_message_expr(), t_conversation.c.message_timestamp)
+                    .where(t_conversation.c.chat_id == chat_id)
+                    .order_by(t_conversation.c.message_timestamp.desc())
+                    .limit(limit)
                 )
+            ).fetchall()
+        return [(row[0], row[1]) for row in reversed(rows)]
+
+    async def _get_messages_within_context(
+        self, chat_id: int, all_messages_length: int
+    ) -> list[tuple[str, datetime.datetime]]:
+        """Return messages withing defined context from the chat with their timestamps. Messages out of context
+        are not deleted here, old messages are pruned by the background maintenance (see `MaintenanceScheduler`).
+
+        Message fits if the total length of it and all the newer ones (`total_length - preceding_length`) is less
+        than `all_messages_length`, so the window is a single range scan by the running length.
+        """
+        await self._flush(chat_id)
+        async with connection_scope(self._read_engine(chat_id)) as conn:
+            bound = (
+                select(t_conversation_counters.c.total_length - all_messages_length)
+                .where(t_conversation_counters.c.chat_id == chat_id)
+                .scalar_subquery()
+            )
+            messages = (
                 await conn.execute(
-                    delete(t_conversation).where(
-                        t_conversation.c.message_timestamp < min_ts, t_conversation.c.chat_id == chat_id
-                    )
+                    select(_full_message_expr(), t_conversation.c.message_timestamp)
+                    .where(t_conversation.c.chat_id == chat_id, t_conversation.c.preceding_length > bound)
+                    .order_by(t_conversation.c.preceding_length)
                 )
-                await conn.commit()
-                return [m[0] for m in select_results.fetchall()]
+            ).fetchall()
+            return [(m[0], m[1]) for m in messages]
 
     async def save_message(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self, chat_id: int, from_name: str, to_name: str, message_timestamp: datetime.datetime, text: str
     ):
-        """Save messages to conversation table."""
-        no_tz = message_timestamp
+        """Save messages to conversation table. If the write buffer is enabled, message is only buffered here."""
+        message = ConversationMessage(chat_id, from_name, to_name, message_timestamp, text)
+        if self._buffer is not None:
+            if not await self._buffer.put(message):
+                return  # dropped, so it is not served from memory either
+        else:
+            async with connection_scope(self._engine) as conn:
+                await conn.execute(_insert_messages_statement([message]))
+            self._note_writes([message])
+        if chat_id in self._histories:
+            self._histories[chat_id].append(format_message(from_name, to_name, text), message_timestamp)
+        elif chat_id in self._warming:
+            self._warming[chat_id].append((format_message(from_name, to_name, text), message_timestamp))
+
+    async def _write_buffered(self, messages: list[ConversationMessage]) -> None:
+        """Write buffered messages with a connection of their own, so they are committed independently of
+        the update handling which may have triggered the flush.
+        """
         async with self._engine.connect() as conn:
+            await conn.execute(_insert_messages_statement(messages))
+            await conn.commit()
+        self._note_writes(messages)
+
+    def _note_writes(self, messages: list[ConversationMessage]) -> None:
+        if self._replica_router is not None:
+            for chat_id in {message.chat_id for message in messages}:
+                self._replica_router.note_write(("conversation", chat_id))
+
+    def _read_engine(self, chat_id: int) -> AsyncEngine:
+        """Return engine to read conversation of the chat with, a replica if it is in sync with the recent writes."""
+        if self._replica_router is None:
+            return self._engine
+        return self._replica_router.read_engine(("conversation", chat_id))
+
+    def start_write_buffer(self) -> None:
+        """Start background writing of the buffered messages if the write buffer is enabled."""
+        if self._buffer is not None:
+            self._buffer.start()
+
+    async def stop_write_buffer(self) -> None:
+        """Write all buffered messages and stop background writing."""
+        if self._buffer is not None:
+            await self._buffer.stop()
+
+    async def _flush(self, chat_id: int) -> None:
+        """Write buffered messages of the chat before reading its conversation. If they can not be written now,
+        the conversation is read without them (they are written later by the background task).
+        """
+        if self._buffer is not None:
             try:
-                await conn.execute(
-                    insert(t_conversation).values(
-                        chat_id=chat_id,
-                        user_from=from_name,
-                        user_to=to_name,
-                        message_timestamp=no_tz,
-                        text=text,
-                    )
-                )
-            except IntegrityError:
-                await conn.rollback()
-                await conn.execute(
-                    insert(t_conversation).values(
-                        chat_id=chat_id,
-                        user_from=from_name,
-                        user_to=to_name,
-                        message_timestamp=no_tz,
-                        text=text,
-                    )
+                await self._buffer.flush_matching(lambda message: message.chat_id == chat_id)
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.warning(
+                    "Conversation of chat {} is read without its buffered messages: {!r}", chat_id, exc
                 )
 
-            await conn.commit()
-
-    # TODO: implement
-    def saving_text(self, message: Message) -> str | None:  # pylint: disable=unused-argument
+    def saving_text(self, message: Message) -> str | None:
         """Check if user wants to save their messages for the digest."""
-        if message.chat.type == "private":
-            return None
-        text = message.text
-        if message.caption is not None:
-            text = f"(Изображение) {message.caption}"
-        if text is None or text == "":
-            return None
-        return text
+        return saving_text(message)
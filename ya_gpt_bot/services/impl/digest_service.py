@@ -0,0 +1,201 @@
+"""Service to generate, store and schedule chat digests."""
+
+import asyncio
+import datetime
+import time
+from textwrap import dedent
+from typing import Awaitable, Callable
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import ya_gpt_bot.db.operations.digests as db
+from ya_gpt_bot.db.unit_of_work import connection_scope, release_connection
+from ya_gpt_bot.gpt.client import GPTClient
+from ya_gpt_bot.services.cache import TTLCache
+from ya_gpt_bot.services.conversation_store import ConversationStore
+from ya_gpt_bot.services.dtos import DigestJob, DigestSchedule, StoredDigest
+
+CONTEXT_LENGTH = 2**13
+
+TOP_UP_INSTRUCTION_PROMPT = dedent(
+    """
+    Первым блоком будет передано ранее составленное краткое содержание беседы в чате, следующим - новые сообщения
+    из этого чата в формате "ник отправителя,ник получателя,текст сообщения".
+    Дополни краткое содержание с учетом новых сообщений, сохранив его стиль и никнеймы участников.
+    Не начинай ответ со слов "в данном фрагменте/тексте/чате", в ответе верни только обновленное краткое содержание.
+    """
+)
+
+
+class DigestService:  # pylint: disable=too-many-instance-attributes
+    """Service to get digests of chats answering from the stored result when it is possible. Digests and
+    schedules are stored in PostgreSQL, subclasses override the storage methods to use other databases.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        engine: AsyncEngine | None,
+        conversation_service: ConversationStore,
+        gpt_client: GPTClient,
+        background_gpt_client: GPTClient | None = None,
+        context_length: int = CONTEXT_LENGTH,
+        top_up_length: int = 2**11,
+        posted_digest_ttl: float = 600,
+        max_posted_digests: int = 10_000,
+    ):
+        """Initialize DigestService. `background_gpt_client` is used for scheduled digests, `gpt_client` is used
+        if it is not set.
+
+        Posted digest message is reused for `posted_digest_ttl` seconds unless new messages arrive to the chat,
+        messages of at most `max_posted_digests` recently posted digests are kept.
+        `engine` is not used by the subclasses overriding all the storage methods, so it may be None for them.
+        """
+        self._engine = engine
+        self._conversation_service = conversation_service
+        self._gpt_client = gpt_client
+        self._background_gpt_client = background_gpt_client or gpt_client
+        self._context_length = context_length
+        self._top_up_length = top_up_length
+        self._in_flight: dict[int, asyncio.Future[int | None]] = {}
+        self._outdated_in_flight: set[int] = set()
+        self._posted: TTLCache[int, int] = TTLCache(max_posted_digests, posted_digest_ttl)
+
+    def note_new_message(self, chat_id: int) -> None:
+        """Mark the posted digest of the chat (or the one being prepared) outdated as a new message has arrived."""
+        self._posted.invalidate(chat_id)
+        if chat_id in self._in_flight:
+            self._outdated_in_flight.add(chat_id)
+
+    async def post_digest(
+        self, chat_id: int, post: Callable[[str | None], Awaitable[int | None]], logger: Logger = global_logger
+    ) -> tuple[int | None, bool]:
+        """Get digest of the chat and post it with the given `post` function returning the posted message id.
+
+        Concurrent requests of the same chat are coalesced to a single computation and a single post, the posted
+        digest is reused until new messages arrive or it expires. Return id of the message with the digest and
+        a flag indicating whether it was posted by this call.
+        """
+        posted_message_id = self._posted.get(chat_id)
+        if posted_message_id is not None:
+            logger.debug("Digest of chat {} is already posted as message {}", chat_id, posted_message_id)
+            return posted_message_id, False
+
+        if chat_id in self._in_flight:
+            logger.debug("Waiting for digest of chat {} requested by other user", chat_id)
+            return await asyncio.shield(self._in_flight[chat_id]), False
+
+        future: asyncio.Future[int | None] = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # mark exception as retrieved
+        self._in_flight[chat_id] = future
+        try:
+            message_id = await post(await self.get_digest(chat_id, logger))
+            if message_id is not None and chat_id not in self._outdated_in_flight:
+                self._posted.set(chat_id, message_id)
+            future.set_result(message_id)
+            return message_id, True
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            del self._in_flight[chat_id]
+            self._outdated_in_flight.discard(chat_id)
+
+    async def get_digest(self, chat_id: int, logger: Logger = global_logger) -> str | None:
+        """Return digest of the chat on user request: the stored one with a small incremental top-up if there are
+        not many new messages, fully generated one otherwise. If there are no messages, None is returned.
+        """
+        stored = await self._get_stored_digest(chat_id)
+        if stored is not None:
+            new_messages = await self._conversation_service.get_chat_messages_after(
+                chat_id, stored.covered_until, self._top_up_length
+            )
+            if new_messages is not None:
+                messages, covered_until = new_messages
+                if messages == "":
+                    logger.debug("Returning stored digest for chat {} as is", chat_id)
+                    return stored.text
+                logger.debug("Topping up stored digest for chat {} with {} characters", chat_id, len(messages))
+                start_time = time.time()
+                await release_connection()
+                text = await self._gpt_client.request(
+                    [f"{stored.text}\n\n{messages}"],
+                    creativity_override=0.0,
+                    instruction_text_override=TOP_UP_INSTRUCTION_PROMPT,
+                )
+                await self._save_digest(chat_id, text, covered_until, time.time() - start_time)
+                return text
+        return await self._generate_digest(chat_id, self._gpt_client)
+
+    async def generate_scheduled_digest(self, chat_id: int, logger: Logger = global_logger) -> bool:
+        """Generate and store digest of the chat in background. Return True on success, errors are saved
+        to be shown to admins.
+        """
+        try:
+            if await self._generate_digest(chat_id, self._background_gpt_client) is None:
+                await self._save_digest_error(chat_id, "no messages")  # so the attempt is not repeated right away
+                return False
+            return True
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Could not generate scheduled digest for chat {}: {!r}", chat_id, exc)
+            await self._save_digest_error(chat_id, repr(exc))
+            return False
+
+    async def _generate_digest(self, chat_id: int, gpt_client: GPTClient) -> str | None:
+        start_time = time.time()
+        messages, covered_until = await self._conversation_service.get_chat_messages_window(
+            chat_id, self._context_length
+        )
+        if not messages:
+            return None
+        await release_connection()
+        text = await gpt_client.request(
+            messages,
+            creativity_override=0.0,
+            instruction_text_override=self._conversation_service.get_instruction_prompt(),
+        )
+        await self._save_digest(chat_id, text, covered_until, time.time() - start_time)
+        return text
+
+    async def _get_stored_digest(self, chat_id: int) -> StoredDigest | None:
+        async with connection_scope(self._engine) as conn:
+            return await db.get_digest(conn, chat_id)
+
+    async def _save_digest(
+        self, chat_id: int, text: str, covered_until: datetime.datetime | None, generation_seconds: float
+    ) -> None:
+        async with connection_scope(self._engine) as conn:
+            await db.save_digest(conn, chat_id, text, covered_until, generation_seconds)
+
+    async def _save_digest_error(self, chat_id: int, error: str) -> None:
+        async with connection_scope(self._engine) as conn:
+            await db.save_digest_error(conn, chat_id, error)
+
+    async def get_schedule(self, chat_id: int) -> DigestSchedule | None:
+        """Return digest schedule of the given chat or None if the chat has not opted-in."""
+        async with connection_scope(self._engine) as conn:
+            return await db.get_schedule(conn, chat_id)
+
+    async def set_schedule(self, chat_id: int, schedule: DigestSchedule) -> None:
+        """Set digest schedule of the given chat, replacing the previous one."""
+        async with connection_scope(self._engine) as conn:
+            await db.set_schedule(conn, chat_id, schedule)
+
+    async def delete_schedule(self, chat_id: int) -> bool:
+        """Delete digest schedule of the given chat. Return True if the schedule existed."""
+        async with connection_scope(self._engine) as conn:
+            return await db.delete_schedule(conn, chat_id)
+
+    async def get_due_chats(self, retry_after: datetime.timedelta) -> list[int]:
+        """Return identifiers of chats which digest should be regenerated according to their schedules."""
+        async with connection_scope(self._engine) as conn:
+            return await db.get_due_chats(conn, retry_after)
+
+    async def get_jobs(self) -> list[DigestJob]:
+        """Return all scheduled digest jobs with the state of their last generation."""
+        async with connection_scope(self._engine) as conn:
+            return await db.get_jobs(conn)
@@ -0,0 +1,132 @@
+"""Service to answer questions about the chat history is defined here."""
+
+import asyncio
+import datetime
+from collections import OrderedDict
+from textwrap import dedent
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+
+from ya_gpt_bot.db.unit_of_work import create_task_outside_unit, release_connection
+from ya_gpt_bot.gpt.client import GPTClient
+from ya_gpt_bot.search.bm25 import BM25Index
+from ya_gpt_bot.services.conversation_store import ConversationStore
+
+ASK_INSTRUCTION_PROMPT = dedent(
+    """
+    Первым блоком будут переданы сообщения из чата, найденные по вопросу пользователя, в формате
+    "ник отправителя,ник получателя,текст сообщения", последним - сам вопрос.
+    Ответь на вопрос, опираясь только на эти сообщения, и укажи никнеймы участников, если это уместно.
+    Если в сообщениях нет ответа на вопрос, так и скажи, не придумывай ответ.
+    """
+)
+
+
+class HistoryIndexNotReady(RuntimeError):
+    """History index of the chat is being built and is not ready yet."""
+
+
+class HistorySearchService:  # pylint: disable=too-many-instance-attributes
+    """Service answering questions about the chat history using only the relevant messages retrieved from per-chat
+    BM25 indexes.
+
+    Indexes are kept for at most `max_chats` recently used chats and contain at most `max_documents` latest messages
+    each. Index of a chat is built lazily from the saved conversation on the first question and then is updated
+    incrementally with every saved message.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        conversation_service: ConversationStore,
+        gpt_client: GPTClient,
+        max_chats: int = 64,
+        max_documents: int = 50_000,
+        top_k: int = 30,
+        context_length: int = 6000,
+        build_timeout: float = 3.0,
+    ):
+        self._conversation_service = conversation_service
+        self._gpt_client = gpt_client
+        self._max_chats = max_chats
+        self._max_documents = max_documents
+        self._top_k = top_k
+        self._context_length = context_length
+        self._build_timeout = build_timeout
+        self._indexes: OrderedDict[int, BM25Index[str]] = OrderedDict()
+        self._building: dict[int, asyncio.Task] = {}
+        self._pending: dict[int, list[tuple[str, datetime.datetime]]] = {}
+
+    def add_message(self, chat_id: int, line: str, message_timestamp: datetime.datetime) -> None:
+        """Add saved conversation message to the index of the chat if it is loaded."""
+        index = self._indexes.get(chat_id)
+        if index is not None:
+            index.add(line, line)
+        elif chat_id in self._building:
+            self._pending[chat_id].append((line, message_timestamp))
+
+    async def search(self, chat_id: int, question: str) -> list[str]:
+        """Return messages of the chat relevant to the question in chronological order.
+
+        Raise `HistoryIndexNotReady` if the index could not be built within the `build_timeout`, building continues
+        in background then.
+        """
+        index = self._indexes.get(chat_id)
+        if index is None:
+            if chat_id not in self._building:
+                self._building[chat_id] = create_task_outside_unit(self._build_index(chat_id))
+                self._pending[chat_id] = []
+            try:
+                index = await asyncio.wait_for(asyncio.shield(self._building[chat_id]), self._build_timeout)
+            except asyncio.TimeoutError as exc:
+                raise HistoryIndexNotReady() from exc
+        if chat_id in self._indexes:  # may have been evicted by another chat index while waiting
+            self._indexes.move_to_end(chat_id)
+        return index.search(question, self._top_k)
+
+    async def answer(self, chat_id: int, question: str, logger: Logger = global_logger) -> str | None:
+        """Answer the question using relevant messages of the chat. None is returned if nothing is found."""
+        messages = await self.search(chat_id, question)
+        logger.debug("Found {} messages relevant to the question in chat {}", len(messages), chat_id)
+        if len(messages) == 0:
+            return None
+        budget = self._context_length - len(question)
+        snippets: list[str] = []
+        for message in reversed(messages):  # prefer the latest ones if they do not fit
+            budget -= len(message) + 1
+            if budget < 0:
+                break
+            snippets.append(message)
+        snippets.reverse()
+        await release_connection()
+        return await self._gpt_client.request(
+            ["\n".join(snippets) + f"\n\nВопрос: {question}"],
+            creativity_override=0.0,
+            instruction_text_override=ASK_INSTRUCTION_PROMPT,
+        )
+
+    async def _build_index(self, chat_id: int) -> BM25Index[str]:
+        try:
+            messages = await self._conversation_service.get_recent_messages(chat_id, self._max_documents)
+            index = await asyncio.get_running_loop().run_in_executor(None, self._fill_index, messages)
+            last_timestamp = messages[-1][1] if len(messages) > 0 else None
+            last_lines = {line for line, ts in messages if ts == last_timestamp}
+            for line, message_timestamp in self._pending[chat_id]:  # saved while loading, may be loaded already
+                if last_timestamp is not None and (
+                    message_timestamp < last_timestamp or message_timestamp == last_timestamp and line in last_lines
+                ):
+                    continue
+                index.add(line, line)
+            self._indexes[chat_id] = index
+            while len(self._indexes) > self._max_chats:
+                self._indexes.popitem(last=False)
+            return index
+        finally:
+            del self._building[chat_id]
+            del self._pending[chat_id]
+
+    def _fill_index(self, messages: list[tuple[str, datetime.datetime]]) -> BM25Index[str]:
+        index: BM25Index[str] = BM25Index(self._max_documents)
+        for line, _ in messages:
+            index.add(line, line)
+        return index
@@ -1,22 +1,40 @@
 """User service protocol is defined here."""
 
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
 import ya_gpt_bot.db.operations.messages as db
-from ya_gpt_bot.db.operations.messages import DialogEntry
+from ya_gpt_bot.db.operations.messages import DialogEntry, NewMessage
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.unit_of_work import connection_scope
+from ya_gpt_bot.services.cache import DialogCache
 from ya_gpt_bot.services.messages_service import MessagesService
 
 
 class MessagesServicePostgres(MessagesService):
-    """Service to get and update messages."""
+    """Service to get and update messages. Recently touched dialogs are kept in the `dialog_cache` if it is set.
+    Dialogs are read from the replicas chosen by `replica_router` if it is set.
+    """
 
-    def __init__(self, engine: AsyncEngine):
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        dialog_cache: DialogCache | None = None,
+        replica_router: ReplicaRouter | None = None,
+    ):
         self.engine = engine
+        self.dialog_cache = dialog_cache
+        self.replica_router = replica_router
 
     async def get_dialog(self, chat_id: int, reply_id: int) -> list[DialogEntry]:
         """Return status of a user given by id, create a new one with status `PENDING` if not found."""
-        async with self.engine.connect() as conn:
-            return await db.get_dialog(conn, chat_id, reply_id)
+        if self.dialog_cache is not None and (chain := self.dialog_cache.get(chat_id, reply_id)) is not None:
+            return db.merge_dialog(chain)
+        engine = self.engine if self.replica_router is None else self.replica_router.read_engine(("messages", chat_id))
+        async with connection_scope(engine) as conn:
+            chain = await self._load_chain(conn, chat_id, reply_id)
+        if self.dialog_cache is not None and len(chain) > 0:
+            self.dialog_cache.set(chat_id, reply_id, tuple(chain))
+        return db.merge_dialog(chain)
 
     async def save_message(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self,
@@ -27,5 +45,36 @@ class MessagesServicePostgres(MessagesService):
         from_self: bool,
     ) -> None:
         """Save message (from user talking with GPT or model responsing to user)."""
-        async with self.engine.connect() as conn:
-            await db.save_message(conn, message_id, reply_id, chat_id, text, from_self)
+        await self.save_messages([NewMessage(message_id, reply_id, chat_id, text, from_self)])
+
+    async def save_messages(self, messages: list[NewMessage]) -> None:
+        """Save multiple messages at once (e.g. request and all parts of the response to it)."""
+        async with connection_scope(self.engine) as conn:
+            await self._insert(conn, messages)
+        if self.replica_router is not None:
+            for chat_id in {message.chat_id for message in messages}:
+                self.replica_router.note_write(("messages", chat_id))
+        self._remember(messages)
+
+    async def _load_chain(self, conn: AsyncConnection, chat_id: int, reply_id: int) -> list[tuple[str, bool]]:
+        return await db.get_dialog_chain(conn, chat_id, reply_id)
+
+    async def _insert(self, conn: AsyncConnection, messages: list[NewMessage]) -> None:
+        await db.save_messages(conn, messages)
+
+    def _remember(self, messages: list[NewMessage]) -> None:
+        """Extend cached dialogs with the saved messages, every response part continues the dialog with the whole
+        response. Requests must precede responses to them.
+        """
+        if self.dialog_cache is None:
+            return
+        responses: dict[tuple[int, int | None], list[NewMessage]] = {}
+        for message in messages:
+            if message.from_self:
+                responses.setdefault((message.chat_id, message.reply_id), []).append(message)
+        for message in messages:
+            if message.from_self:
+                texts = tuple((part.text, True) for part in responses[(message.chat_id, message.reply_id)])
+            else:
+                texts = ((message.text, False),)
+            self.dialog_cache.append(message.chat_id, message.message_id, message.reply_id, texts)
@@ -0,0 +1,31 @@
+"""Messages service implementation executing queries as prepared asyncpg statements is defined here."""
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+import ya_gpt_bot.db.operations.prepared as db
+from ya_gpt_bot.db.operations.messages import NewMessage
+from ya_gpt_bot.db.prepared import PreparedStatements
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.services.cache import DialogCache
+from ya_gpt_bot.services.impl.messages_service import MessagesServicePostgres
+
+
+class PreparedMessagesService(MessagesServicePostgres):
+    """Service to get and update messages with asyncpg directly (see `PreparedStatements`). Recently touched
+    dialogs are kept in the `dialog_cache` if it is set.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        statements: PreparedStatements,
+        dialog_cache: DialogCache | None = None,
+        replica_router: ReplicaRouter | None = None,
+    ):
+        super().__init__(engine, dialog_cache, replica_router)
+        self.statements = statements
+
+    async def _load_chain(self, conn: AsyncConnection, chat_id: int, reply_id: int) -> list[tuple[str, bool]]:
+        return await db.get_dialog_chain(self.statements, conn, chat_id, reply_id)
+
+    async def _insert(self, conn: AsyncConnection, messages: list[NewMessage]) -> None:
+        await db.save_messages(self.statements, conn, messages)
@@ -0,0 +1,25 @@
+"""User preferences service implementation executing hot queries as prepared asyncpg statements is defined here."""
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import ya_gpt_bot.db.operations.prepared as db
+from ya_gpt_bot.db.prepared import PreparedStatements
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.unit_of_work import connection_scope
+from ya_gpt_bot.services.dtos import UserPreferences
+from ya_gpt_bot.services.impl.user_preferences_service import UserPreferencesServicePostgres
+
+
+class PreparedUserPreferencesService(UserPreferencesServicePostgres):
+    """Service to get and update user preferences in PostgreSQL database. Preferences reads are executed
+    with asyncpg directly (see `PreparedStatements`), rare updates are executed with SQLAlchemy.
+    """
+
+    def __init__(
+        self, engine: AsyncEngine, statements: PreparedStatements, replica_router: ReplicaRouter | None = None
+    ):
+        super().__init__(engine, replica_router)
+        self.statements = statements
+
+    async def get_preferences(self, user_id: int) -> UserPreferences:
+        async with connection_scope(self.engine) as conn:
+            return await db.get_preferences(self.statements, conn, user_id)
@@ -0,0 +1,31 @@
+"""User service implementation executing hot queries as prepared asyncpg statements is defined here."""
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import ya_gpt_bot.db.operations.prepared as db
+from ya_gpt_bot.db.prepared import PreparedStatements
+from ya_gpt_bot.db.unit_of_work import connection_scope
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+from ya_gpt_bot.services.impl.user_service import UserServicePostgres
+
+
+class PreparedUserService(UserServicePostgres):
+    """Service to get and update user information in PostgreSQL database. Statuses reads and `direct` flag
+    updates are executed with asyncpg directly (see `PreparedStatements`), rare status changes are executed
+    with SQLAlchemy.
+    """
+
+    def __init__(self, engine: AsyncEngine, statements: PreparedStatements):
+        super().__init__(engine)
+        self.statements = statements
+
+    async def get_user_status(self, user_id: int, direct: bool) -> UserStatus:
+        async with connection_scope(self.engine) as conn:
+            return await db.get_user_status(self.statements, conn, user_id, direct)
+
+    async def get_chat_status(self, chat_id: int) -> ChatStatus:
+        async with connection_scope(self.engine) as conn:
+            return await db.get_chat_status(self.statements, conn, chat_id)
+
+    async def set_user_direct(self, user_id: int) -> None:
+        async with connection_scope(self.engine) as conn:
+            return await db.set_user_direct(self.statements, conn, user_id)
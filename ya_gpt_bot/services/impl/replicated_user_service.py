@@ -0,0 +1,40 @@
+"""User service reading statuses from the replicated in-memory registry is defined here."""
+
+from ya_gpt_bot.background.status_registry import StatusRegistry
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+from ya_gpt_bot.services.user_service import UserService
+
+
+class ReplicatedUserService(UserService):
+    """User service wrapper returning statuses from `StatusRegistry` without database access. Unknown users
+    and chats (which are created by the wrapped service) and all requests while the registry is not ready
+    are passed to the wrapped service. Status changes reach the registry through database notifications.
+    """
+
+    def __init__(self, user_service: UserService, status_registry: StatusRegistry):
+        self._user_service = user_service
+        self._status_registry = status_registry
+
+    async def get_user_status(self, user_id: int, direct: bool) -> UserStatus:
+        status = self._status_registry.get_user_status(user_id)
+        if status is None:
+            status = await self._user_service.get_user_status(user_id, direct)
+        return status
+
+    async def get_chat_status(self, chat_id: int) -> ChatStatus:
+        status = self._status_registry.get_chat_status(chat_id)
+        if status is None:
+            status = await self._user_service.get_chat_status(chat_id)
+        return status
+
+    async def set_user_status(self, user_id: int, status: UserStatus) -> None:
+        await self._user_service.set_user_status(user_id, status)
+
+    async def set_chat_status(self, chat_id: int, status: ChatStatus) -> None:
+        await self._user_service.set_chat_status(chat_id, status)
+
+    async def set_user_direct(self, user_id: int) -> None:
+        await self._user_service.set_user_direct(user_id)
+
+    async def shutdown(self) -> None:
+        await self._user_service.shutdown()
@@ -0,0 +1,53 @@
+"""Request context service implementation for PostgreSQL is defined here."""
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import ya_gpt_bot.db.operations.request_context as db
+from ya_gpt_bot.background.status_registry import StatusRegistry
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.unit_of_work import connection_scope
+from ya_gpt_bot.services.cache import DialogCache
+from ya_gpt_bot.services.dtos import RequestContext
+from ya_gpt_bot.services.request_context_service import RequestContextService
+
+
+class RequestContextServicePostgres(RequestContextService):  # pylint: disable=too-few-public-methods
+    """Service to load generation request context with a single PostgreSQL statement. Statuses known
+    to the `status_registry` and dialogs found in the `dialog_cache` are not queried.
+
+    If both statuses are known, the statement is read-only and it is executed on the replica chosen
+    by `replica_router` if it is set, otherwise missing user and chat are created by it on the primary.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        status_registry: StatusRegistry | None = None,
+        dialog_cache: DialogCache | None = None,
+        replica_router: ReplicaRouter | None = None,
+    ):
+        self.engine = engine
+        self.status_registry = status_registry
+        self.dialog_cache = dialog_cache
+        self.replica_router = replica_router
+
+    async def get_context(
+        self, user_id: int, chat_id: int, reply_id: int | None, direct: bool, text: str
+    ) -> RequestContext:
+        user_status = chat_status = None
+        if self.status_registry is not None:
+            user_status = self.status_registry.get_user_status(user_id)
+            chat_status = self.status_registry.get_chat_status(chat_id)
+        dialog = None
+        if self.dialog_cache is not None and reply_id is not None:
+            dialog = self.dialog_cache.get(chat_id, reply_id)
+        engine = self.engine
+        if self.replica_router is not None and user_status is not None and (direct or chat_status is not None):
+            engine = self.replica_router.read_engine(("messages", chat_id), ("users_preferences", user_id))
+        async with connection_scope(engine) as conn:
+            context = await db.get_request_context(
+                conn, user_id, chat_id, reply_id, direct, text, user_status, chat_status, known_dialog=dialog
+            )
+        if self.dialog_cache is not None and dialog is None and len(context.chain) > 0:
+            self.dialog_cache.set(chat_id, reply_id, context.chain)
+        return context
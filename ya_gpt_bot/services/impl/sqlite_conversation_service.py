@@ -0,0 +1,49 @@
+"""Conversation service implementation for SQLite is defined here."""
+
+import datetime
+
+from aiogram.types import Message
+
+import ya_gpt_bot.db.sqlite.conversation as db
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.services.conversation_store import ConversationStore
+from ya_gpt_bot.services.dtos import ConversationMessage
+from ya_gpt_bot.services.impl.conversation_service import DEFAULT_INSTRUCTION_PROMPT, saving_text
+
+
+class ConversationServiceSQLite(ConversationStore):
+    """Service to get and update conversations in SQLite database as storage. Messages are written at once,
+    as local commits are cheap, and conversations are always read from the database.
+    """
+
+    def __init__(self, database: SQLiteDatabase, instruction_prompt: str = DEFAULT_INSTRUCTION_PROMPT):
+        self.database = database
+        self._instruction_prompt = instruction_prompt
+
+    def get_instruction_prompt(self) -> str:
+        return self._instruction_prompt
+
+    def saving_text(self, message: Message) -> str | None:
+        return saving_text(message)
+
+    async def save_message(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, chat_id: int, from_name: str, to_name: str, message_timestamp: datetime.datetime, text: str
+    ):
+        await self.database.run(
+            db.save_messages, [ConversationMessage(chat_id, from_name, to_name, message_timestamp, text)]
+        )
+
+    async def get_chat_messages_window(self, chat_id: int, context_length: int) -> tuple[str, datetime.datetime | None]:
+        max_length = context_length - len(self._instruction_prompt) - 1
+        messages = await self.database.run(db.get_messages_within_context, chat_id, max_length)
+        if not messages:
+            return "", None
+        return "\n".join(m[0] for m in messages), messages[-1][1]
+
+    async def get_chat_messages_after(
+        self, chat_id: int, after: datetime.datetime | None, max_length: int
+    ) -> tuple[str, datetime.datetime | None] | None:
+        return await self.database.run(db.get_messages_after, chat_id, after, max_length)
+
+    async def get_recent_messages(self, chat_id: int, limit: int) -> list[tuple[str, datetime.datetime]]:
+        return await self.database.run(db.get_recent_messages, chat_id, limit)
@@ -0,0 +1,63 @@
+"""Digest service storing digests and schedules in SQLite is defined here."""
+
+import datetime
+
+import ya_gpt_bot.db.sqlite.digests as db
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.gpt.client import GPTClient
+from ya_gpt_bot.services.conversation_store import ConversationStore
+from ya_gpt_bot.services.dtos import DigestJob, DigestSchedule, StoredDigest
+from ya_gpt_bot.services.impl.digest_service import CONTEXT_LENGTH, DigestService
+
+
+class DigestServiceSQLite(DigestService):
+    """Service to get digests of chats answering from the stored result when it is possible. Digests and
+    schedules are stored in SQLite database along with the conversations.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        database: SQLiteDatabase,
+        conversation_service: ConversationStore,
+        gpt_client: GPTClient,
+        background_gpt_client: GPTClient | None = None,
+        context_length: int = CONTEXT_LENGTH,
+        top_up_length: int = 2**11,
+        posted_digest_ttl: float = 600,
+    ):
+        super().__init__(
+            None,
+            conversation_service,
+            gpt_client,
+            background_gpt_client,
+            context_length=context_length,
+            top_up_length=top_up_length,
+            posted_digest_ttl=posted_digest_ttl,
+        )
+        self.database = database
+
+    async def _get_stored_digest(self, chat_id: int) -> StoredDigest | None:
+        return await self.database.run(db.get_digest, chat_id)
+
+    async def _save_digest(
+        self, chat_id: int, text: str, covered_until: datetime.datetime | None, generation_seconds: float
+    ) -> None:
+        await self.database.run(db.save_digest, chat_id, text, covered_until, generation_seconds)
+
+    async def _save_digest_error(self, chat_id: int, error: str) -> None:
+        await self.database.run(db.save_digest_error, chat_id, error)
+
+    async def get_schedule(self, chat_id: int) -> DigestSchedule | None:
+        return await self.database.run(db.get_schedule, chat_id)
+
+    async def set_schedule(self, chat_id: int, schedule: DigestSchedule) -> None:
+        await self.database.run(db.set_schedule, chat_id, schedule)
+
+    async def delete_schedule(self, chat_id: int) -> bool:
+        return await self.database.run(db.delete_schedule, chat_id)
+
+    async def get_due_chats(self, retry_after: datetime.timedelta) -> list[int]:
+        return await self.database.run(db.get_due_chats, retry_after)
+
+    async def get_jobs(self) -> list[DigestJob]:
+        return await self.database.run(db.get_jobs)
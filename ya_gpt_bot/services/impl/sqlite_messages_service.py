@@ -0,0 +1,32 @@
+"""Messages service implementation for SQLite is defined here."""
+
+import ya_gpt_bot.db.sqlite.messages as db
+from ya_gpt_bot.db.operations.messages import DialogEntry, NewMessage, merge_dialog
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.services.messages_service import MessagesService
+
+
+class MessagesServiceSQLite(MessagesService):
+    """Service to get and update messages in SQLite database as storage."""
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    async def get_dialog(self, chat_id: int, reply_id: int) -> list[DialogEntry]:
+        """Return dialog ending with the given message."""
+        return merge_dialog(await self.database.run(db.get_dialog_chain, chat_id, reply_id))
+
+    async def save_message(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        message_id: int,
+        reply_id: int | None,
+        chat_id: int,
+        text: str,
+        from_self: bool,
+    ) -> None:
+        """Save message (from user talking with GPT or model responsing to user)."""
+        await self.save_messages([NewMessage(message_id, reply_id, chat_id, text, from_self)])
+
+    async def save_messages(self, messages: list[NewMessage]) -> None:
+        """Save multiple messages at once (e.g. request and all parts of the response to it)."""
+        await self.database.run(db.save_messages, messages)
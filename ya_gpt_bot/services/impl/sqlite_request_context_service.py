@@ -0,0 +1,18 @@
+"""Request context service implementation for SQLite is defined here."""
+
+import ya_gpt_bot.db.sqlite.request_context as db
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.services.dtos import RequestContext
+from ya_gpt_bot.services.request_context_service import RequestContextService
+
+
+class RequestContextServiceSQLite(RequestContextService):  # pylint: disable=too-few-public-methods
+    """Service to load generation request context in a single SQLite transaction."""
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    async def get_context(
+        self, user_id: int, chat_id: int, reply_id: int | None, direct: bool, text: str
+    ) -> RequestContext:
+        return await self.database.run(db.get_request_context, user_id, chat_id, reply_id, direct, text)
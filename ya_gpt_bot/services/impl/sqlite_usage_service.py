@@ -0,0 +1,48 @@
+"""Usage service implementation for SQLite is defined here."""
+import datetime
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+
+import ya_gpt_bot.db.sqlite.usage as db
+from ya_gpt_bot.db.operations.usage import UsageGrouping
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.gpt.usage import TokenUsage
+from ya_gpt_bot.services.dtos import UsageRecord, UsageTotal
+from ya_gpt_bot.services.usage_aggregator import UsageAggregator
+from ya_gpt_bot.services.usage_service import UsageService
+
+
+class UsageServiceSQLite(UsageService):
+    """Service to account model usage in memory and write it to SQLite database in batches. Reports are read
+    from the hourly rollups.
+    """
+
+    def __init__(
+        self,
+        database: SQLiteDatabase,
+        flush_interval: float = 5.0,
+        max_pending_keys: int = 100_000,
+        logger: Logger = global_logger,
+    ):
+        self.database = database
+        self.aggregator = UsageAggregator(self._write, flush_interval, max_pending_keys, logger)
+
+    def record_usage(self, user_id: int, chat_id: int, usage: list[TokenUsage], latency: float) -> None:
+        self.aggregator.add(user_id, chat_id, usage, latency)
+
+    async def get_usage_totals(
+        self, group_by: UsageGrouping, since: datetime.datetime, chat_id: int | None = None, limit: int = 10
+    ) -> list[UsageTotal]:
+        await self.aggregator.flush()
+        hour = since.replace(minute=0, second=0, microsecond=0)
+        return await self.database.run(db.get_usage_totals, group_by, hour, chat_id, limit)
+
+    def start(self) -> None:
+        self.aggregator.start()
+
+    async def stop(self) -> None:
+        await self.aggregator.stop()
+
+    async def _write(self, records: list[UsageRecord]) -> None:
+        await self.database.run(db.save_usage, records)
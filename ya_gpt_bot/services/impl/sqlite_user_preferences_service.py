@@ -0,0 +1,28 @@
+"""User preferences service implementation for SQLite is defined here."""
+
+import ya_gpt_bot.db.sqlite.users_preferences as db
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.services.dtos import UserPreferences
+from ya_gpt_bot.services.user_preferences_service import UserPreferencesService
+
+
+class UserPreferencesServiceSQLite(UserPreferencesService):
+    """Service to get and update user preferences for YandexGPT text generation in SQLite database as storage."""
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    async def get_preferences(self, user_id: int) -> UserPreferences:
+        return await self.database.run(db.get_preferences, user_id)
+
+    async def reset_preferences(self, user_id: int) -> None:
+        await self.database.run(db.delete_preferences, user_id)
+
+    async def set_temperature(self, user_id: int, temperature: float) -> None:
+        await self.database.run(db.set_preference, user_id, "temperature", temperature)
+
+    async def set_instruction_text(self, user_id: int, instruction_text: str) -> None:
+        await self.database.run(db.set_preference, user_id, "instruction_text", instruction_text)
+
+    async def set_request_timeout(self, user_id: int, timeout: int) -> None:
+        await self.database.run(db.set_preference, user_id, "timeout", timeout)
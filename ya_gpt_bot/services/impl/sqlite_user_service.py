@@ -0,0 +1,28 @@
+"""User service implementation for SQLite is defined here."""
+
+import ya_gpt_bot.db.sqlite.users as db
+from ya_gpt_bot.db.sqlite import SQLiteDatabase
+from ya_gpt_bot.services.dtos import ChatStatus, UserStatus
+from ya_gpt_bot.services.user_service import UserService
+
+
+class UserServiceSQLite(UserService):
+    """Service to get and update users information in SQLite database as storage."""
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    async def get_user_status(self, user_id: int, direct: bool) -> UserStatus:
+        return await self.database.run(db.get_user_status, user_id, direct)
+
+    async def get_chat_status(self, chat_id: int) -> ChatStatus:
+        return await self.database.run(db.get_chat_status, chat_id)
+
+    async def set_user_status(self, user_id: int, status: UserStatus) -> None:
+        await self.database.run(db.set_user_status, user_id, status)
+
+    async def set_chat_status(self, chat_id: int, status: ChatStatus) -> None:
+        await self.database.run(db.set_chat_status, chat_id, status)
+
+    async def set_user_direct(self, user_id: int) -> None:
+        await self.database.run(db.set_user_direct, user_id)
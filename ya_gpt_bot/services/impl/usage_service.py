@@ -0,0 +1,65 @@
+"""Usage service implementation for PostgreSQL database is defined here."""
+import datetime
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import ya_gpt_bot.db.operations.usage as db
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.unit_of_work import connection_scope
+from ya_gpt_bot.gpt.usage import TokenUsage
+from ya_gpt_bot.services.dtos import UsageRecord, UsageTotal
+from ya_gpt_bot.services.usage_aggregator import UsageAggregator
+from ya_gpt_bot.services.usage_service import UsageService
+
+
+class UsageServicePostgres(UsageService):
+    """Service to account model usage in memory and write it to PostgreSQL database in batches. Reports are read
+    from the hourly rollups.
+
+    Usage is written with `write_engine` (the background jobs pool) if it is given, reports are read with `engine`
+    of the updates handling or from the replicas chosen by `replica_router` if it is set.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        engine: AsyncEngine,
+        write_engine: AsyncEngine | None = None,
+        flush_interval: float = 5.0,
+        max_pending_keys: int = 100_000,
+        replica_router: ReplicaRouter | None = None,
+        logger: Logger = global_logger,
+    ):
+        self.engine = engine
+        self.write_engine = write_engine or engine
+        self.replica_router = replica_router
+        self.aggregator = UsageAggregator(self._write, flush_interval, max_pending_keys, logger)
+
+    def record_usage(self, user_id: int, chat_id: int, usage: list[TokenUsage], latency: float) -> None:
+        self.aggregator.add(user_id, chat_id, usage, latency)
+
+    async def get_usage_totals(
+        self, group_by: db.UsageGrouping, since: datetime.datetime, chat_id: int | None = None, limit: int = 10
+    ) -> list[UsageTotal]:
+        await self.aggregator.flush()
+        hour = since.replace(minute=0, second=0, microsecond=0)
+        engine = self.engine if self.replica_router is None else self.replica_router.read_engine("usage")
+        async with connection_scope(engine) as conn:
+            return await db.get_usage_totals(conn, group_by, hour, chat_id, limit)
+
+    def start(self) -> None:
+        self.aggregator.start()
+
+    async def stop(self) -> None:
+        await self.aggregator.stop()
+
+    async def _write(self, records: list[UsageRecord]) -> None:
+        """Write usage with a connection of its own, so it is committed independently of the update handling
+        which may have triggered the flush.
+        """
+        async with self.write_engine.connect() as conn:
+            await db.save_usage(conn, records)
+            await conn.commit()
+        if self.replica_router is not None:
+            self.replica_router.note_write("usage")
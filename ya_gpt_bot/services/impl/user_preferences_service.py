@@ -2,45 +2,48 @@
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 import ya_gpt_bot.db.operations.users_preferences as db
+from ya_gpt_bot.db.replicas import ReplicaRouter
+from ya_gpt_bot.db.unit_of_work import connection_scope
 from ya_gpt_bot.services.dtos import UserPreferences
 from ya_gpt_bot.services.user_preferences_service import UserPreferencesService
 
 
 class UserPreferencesServicePostgres(UserPreferencesService):
-    """Service to get and update user preferences for YandexGPT text generation in PostgreSQL database as storage."""
+    """Service to get and update user preferences for YandexGPT text generation in PostgreSQL database as storage.
+    Updates are noted by `replica_router` if it is set, so the preferences are read from the primary for a while.
+    """
 
-    def __init__(self, engine: AsyncEngine):
+    def __init__(self, engine: AsyncEngine, replica_router: ReplicaRouter | None = None):
         self.engine = engine
+        self.replica_router = replica_router
 
     async def get_preferences(self, user_id: int) -> UserPreferences:
-        async with self.engine.connect() as conn:
-            res = await db.get_preferences(conn, user_id)
-            await conn.commit()
-            return res
+        async with connection_scope(self.engine) as conn:
+            return await db.get_preferences(conn, user_id)
 
     async def reset_preferences(self, user_id: int) -> None:
-        async with self.engine.connect() as conn:
-            res = await db.delete_preferences(conn, user_id)
-            await conn.commit()
-            return res
+        async with connection_scope(self.engine) as conn:
+            await db.delete_preferences(conn, user_id)
+        self._note_write(user_id)
 
     async def set_temperature(self, user_id: int, temperature: float) -> None:
-        async with self.engine.connect() as conn:
-            res = await db.set_temperature(conn, user_id, temperature)
-            await conn.commit()
-            return res
+        async with connection_scope(self.engine) as conn:
+            await db.set_temperature(conn, user_id, temperature)
+        self._note_write(user_id)
 
     async def set_instruction_text(self, user_id: int, instruction_text: str) -> None:
-        async with self.engine.connect() as conn:
-            res = await db.set_instruction_text(conn, user_id, instruction_text)
-            await conn.commit()
-            return res
+        async with connection_scope(self.engine) as conn:
+            await db.set_instruction_text(conn, user_id, instruction_text)
+        self._note_write(user_id)
 
     async def set_request_timeout(self, user_id: int, timeout: int) -> None:
-        async with self.engine.connect() as conn:
-            res = await db.set_request_timeout(conn, user_id, timeout)
-            await conn.commit()
-            return res
+        async with connection_scope(self.engine) as conn:
+            await db.set_request_timeout(conn, user_id, timeout)
+        self._note_write(user_id)
 
     async def shutdown(self) -> None:
         await self.engine.dispose()
+
+    def _note_write(self, user_id: int) -> None:
+        if self.replica_router is not None:
+            self.replica_router.note_write(("users_preferences", user_id))
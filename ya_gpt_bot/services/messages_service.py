@@ -3,7 +3,7 @@
 from abc import abstractmethod
 from typing import Protocol
 
-from ya_gpt_bot.db.operations.messages import DialogEntry
+from ya_gpt_bot.db.operations.messages import DialogEntry, NewMessage
 
 
 class MessagesService(Protocol):
@@ -25,3 +25,8 @@ class MessagesService(Protocol):
     ) -> None:
         """Save message (from user talking with GPT or model responsing to user)."""
         raise NotImplementedError()
+
+    @abstractmethod
+    async def save_messages(self, messages: list[NewMessage]) -> None:
+        """Save multiple messages at once (e.g. request and all parts of the response to it)."""
+        raise NotImplementedError()
@@ -0,0 +1,20 @@
+"""Request context service protocol is defined here."""
+
+from abc import abstractmethod
+from typing import Protocol
+
+from ya_gpt_bot.services.dtos import RequestContext
+
+
+class RequestContextService(Protocol):  # pylint: disable=too-few-public-methods
+    """Service to load everything needed to handle a generation request at once."""
+
+    @abstractmethod
+    async def get_context(
+        self, user_id: int, chat_id: int, reply_id: int | None, direct: bool, text: str
+    ) -> RequestContext:
+        """Return statuses of the user and the chat (None for direct messages), user preferences and the dialog
+        finishing with the given reply-to message and the request text. Users and chats which are not found
+        are created with `PENDING` status.
+        """
+        raise NotImplementedError()
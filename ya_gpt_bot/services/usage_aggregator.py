@@ -0,0 +1,122 @@
+"""In-memory model usage aggregation written to the database in batches is defined here."""
+
+import asyncio
+import bisect
+import datetime
+from typing import Awaitable, Callable
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+
+from ya_gpt_bot.db.unit_of_work import create_task_outside_unit
+from ya_gpt_bot.gpt.usage import TokenUsage
+from ya_gpt_bot.services.dtos import LATENCY_BUCKETS_SECONDS, UsageCounters, UsageRecord
+
+_UsageKey = tuple[datetime.datetime, int, int, str]
+
+
+class UsageAggregator:  # pylint: disable=too-many-instance-attributes
+    """Accumulator of model usage counters by hour, user, chat and model which are written by `write` every
+    `flush_interval` seconds by a background task, so an update handling costs no database writes.
+
+    At most `max_keys` counters are kept in memory. When there are too many of them (the database is slow or
+    unavailable), usage of the new keys is dropped. Counters of a failed write are merged back and written again
+    after a growing delay.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[UsageRecord]], Awaitable[None]],
+        flush_interval: float = 5.0,
+        max_keys: int = 100_000,
+        logger: Logger = global_logger,
+    ):
+        self._write = write
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._logger = logger
+        self._counters: dict[_UsageKey, UsageCounters] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def add(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        user_id: int,
+        chat_id: int,
+        usage: list[TokenUsage],
+        latency: float,
+        moment: datetime.datetime | None = None,
+    ) -> None:
+        """Account model requests made during an update handling which took `latency` seconds. The update
+        latency is accounted for every model used.
+        """
+        moment = moment or datetime.datetime.now(datetime.timezone.utc)
+        hour = moment.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_SECONDS, latency)
+        for model in dict.fromkeys(request.model for request in usage):
+            update = UsageCounters(latency_seconds=latency)
+            update.latency_buckets[bucket] = 1
+            for request in usage:
+                if request.model == model:
+                    update.requests += 1
+                    update.input_tokens += request.input_tokens
+                    update.completion_tokens += request.completion_tokens
+            self._merge((hour, user_id, chat_id, model), update)
+
+    def start(self) -> None:
+        """Start background writing task."""
+        if self._task is None:
+            self._task = create_task_outside_unit(self._run(), name="usage-aggregator")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Stop background writing and write all accumulated counters for at most `timeout` seconds."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except Exception as exc:  # pylint: disable=broad-except
+            self._logger.error("Usage of {} users and chats is lost on shutdown: {!r}", len(self._counters), exc)
+
+    async def flush(self) -> None:
+        """Write all accumulated counters now (e.g. before reading the usage)."""
+        async with self._lock:
+            counters, self._counters = self._counters, {}
+            if len(counters) == 0:
+                return
+            try:
+                await self._write([UsageRecord(*key, value) for key, value in counters.items()])
+            except BaseException:
+                for key, value in counters.items():
+                    self._merge(key, value)
+                raise
+
+    def _merge(self, key: _UsageKey, update: UsageCounters) -> None:
+        counters = self._counters.get(key)
+        if counters is not None:
+            counters.add(update)
+        elif len(self._counters) < self.max_keys:
+            self._counters[key] = update
+        else:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                self._logger.warning("Usage aggregator is full, {} updates are dropped so far", self.dropped)
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            await asyncio.sleep(self.flush_interval if failures == 0 else min(self.flush_interval * 2**failures, 60))
+            try:
+                await self.flush()
+                failures = 0
+            except Exception as exc:  # pylint: disable=broad-except
+                failures += 1
+                self._logger.warning("Could not write usage of {} users and chats: {!r}", len(self._counters), exc)
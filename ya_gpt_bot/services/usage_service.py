@@ -0,0 +1,38 @@
+"""Model usage accounting service protocol is defined here."""
+import datetime
+from abc import abstractmethod
+from typing import Protocol
+
+from ya_gpt_bot.db.operations.usage import UsageGrouping
+from ya_gpt_bot.gpt.usage import TokenUsage
+from ya_gpt_bot.services.dtos import UsageTotal
+
+
+class UsageService(Protocol):
+    """Service to account model tokens and update handling latency by users, chats and models."""
+
+    @abstractmethod
+    def record_usage(self, user_id: int, chat_id: int, usage: list[TokenUsage], latency: float) -> None:
+        """Account model requests made during an update handling which took `latency` seconds. Usage is written
+        to the storage in background.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_usage_totals(
+        self, group_by: UsageGrouping, since: datetime.datetime, chat_id: int | None = None, limit: int = 10
+    ) -> list[UsageTotal]:
+        """Return usage since the given moment (rounded down to an hour) summed by users, chats or models,
+        the ones with the most tokens spent first. Usage of a single chat is returned if `chat_id` is set.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def start(self) -> None:
+        """Start background writing of the accounted usage."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Write all accounted usage and stop background writing."""
+        raise NotImplementedError()
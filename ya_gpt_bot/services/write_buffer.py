@@ -0,0 +1,184 @@
+"""Write-behind buffer batching database writes off the request handling path is defined here."""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from loguru import logger as global_logger
+from loguru._logger import Logger
+
+from ya_gpt_bot.db.unit_of_work import create_task_outside_unit
+
+_T = TypeVar("_T")
+
+
+class WriteBuffer(Generic[_T]):  # pylint: disable=too-many-instance-attributes
+    """Buffer of items which are written by `write` in batches by a background task as soon as `batch_size` items
+    are gathered or every `flush_interval` seconds.
+
+    At most `max_size` items are kept in memory. When the buffer is full (the database is slow or unavailable),
+    `put` waits for at most `max_wait` seconds for the space to free up and drops the item then. Items of a failed
+    batch are kept in the buffer in the original order and written again after a growing delay.
+
+    A batch which is rejected (`rejects` returns True for the error, e.g. it has an item violating a constraint)
+    or has failed `max_attempts` times in a row is written by halves, so a single item the database does not
+    accept never blocks the others. Such an item is dropped and logged as an error with its contents.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        write: Callable[[list[_T]], Awaitable[None]],
+        max_size: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_wait: float = 5.0,
+        max_attempts: int = 5,
+        rejects: Callable[[Exception], bool] = lambda exc: False,
+        logger: Logger = global_logger,
+    ):
+        self._write = write
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self._rejects = rejects
+        self._logger = logger
+        self._items: deque[_T] = deque()
+        self._head_batches: deque[int] = deque()  # sizes of the next batches if they are not the default ones
+        self._attempts = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def start(self) -> None:
+        """Start background flushing task."""
+        if self._task is None:
+            self._task = create_task_outside_unit(self._run(), name="write-buffer")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Stop background flushing and write all buffered items for at most `timeout` seconds."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except Exception as exc:  # pylint: disable=broad-except
+            self._logger.error("{} buffered items are lost on shutdown: {!r}", len(self._items), exc)
+
+    async def put(self, item: _T) -> bool:
+        """Add item to the buffer, return False if it is dropped as the buffer has stayed full for `max_wait`."""
+        if len(self._items) >= self.max_size:
+            self._wakeup.set()
+            try:
+                async with self._space:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: len(self._items) < self.max_size), self.max_wait
+                    )
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                if self.dropped % 100 == 1:
+                    self._logger.warning("Write buffer is full, {} items are dropped so far", self.dropped)
+                return False
+        self._items.append(item)
+        if len(self._items) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self) -> None:
+        """Write all buffered items now (e.g. before reading the data they belong to)."""
+        while len(self._items) > 0:
+            await self._write_batch()
+
+    async def flush_matching(self, matches: Callable[[_T], bool]) -> None:
+        """Write the buffered items matching the predicate now (e.g. the ones of the data about to be read) leaving
+        the others to the background writing. Matching items are written in the original order, the ones which
+        have not been written are returned to the head of the buffer on error. All the items are written if a failed
+        batch is being written again, so it is not broken up.
+        """
+        async with self._lock:
+            retrying = len(self._head_batches) > 0
+            if not retrying:
+                matching = [item for item in self._items if matches(item)]
+                if len(matching) == 0:
+                    return
+                self._items = deque(item for item in self._items if not matches(item))
+                for start in range(0, len(matching), self.batch_size):
+                    try:
+                        await self._write(matching[start : start + self.batch_size])
+                    except BaseException:
+                        self._items.extendleft(reversed(matching[start:]))
+                        raise
+        if retrying:
+            await self.flush()
+            return
+        async with self._space:
+            self._space.notify_all()
+
+    async def _write_batch(self) -> None:
+        async with self._lock:
+            size = self._head_batches.popleft() if len(self._head_batches) > 0 else self.batch_size
+            batch = [self._items.popleft() for _ in range(min(size, len(self._items)))]
+            if len(batch) == 0:
+                return
+            try:
+                await self._write(batch)
+                self._attempts = 0
+            except Exception as exc:  # pylint: disable=broad-except
+                self._attempts += 1
+                if not self._rejects(exc) and self._attempts < self.max_attempts:
+                    self._put_back(batch)
+                    raise
+                self._attempts = 0
+                self._split(batch, exc)
+            except BaseException:
+                self._put_back(batch)
+                raise
+        async with self._space:
+            self._space.notify_all()
+
+    def _put_back(self, batch: list[_T]) -> None:
+        """Return items of the batch to the head of the buffer to be written as the same batch again."""
+        self._items.extendleft(reversed(batch))
+        self._head_batches.appendleft(len(batch))
+
+    def _split(self, batch: list[_T], exc: Exception) -> None:
+        """Return items of the failed batch to the buffer as two batches, drop the item if it is the only one."""
+        if len(batch) == 1:
+            self.rejected += 1
+            self._logger.error(
+                "Write buffer item is dropped as it can not be written: {!r}, error: {!r}", batch[0], exc
+            )
+            return
+        self._logger.warning("Batch of {} items can not be written, writing it by halves: {!r}", len(batch), exc)
+        self._items.extendleft(reversed(batch))
+        half = len(batch) // 2
+        self._head_batches.extendleft((len(batch) - half, half))
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            if failures == 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:  # do not hammer the failing database even if the buffer fills up
+                await asyncio.sleep(min(self.flush_interval * 2**failures, 60))
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                failures = 0
+            except Exception as exc:  # pylint: disable=broad-except
+                failures += 1
+                self._logger.warning("Could not write {} buffered items: {!r}", len(self._items), exc)
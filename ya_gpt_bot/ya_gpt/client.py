@@ -12,6 +12,7 @@ from loguru import logger as global_logger
 from loguru._logger import Logger
 
 from ya_gpt_bot.gpt.client import ArtClient, GPTClient
+from ya_gpt_bot.gpt.usage import TokenUsage, report_usage
 from ya_gpt_bot.gpt.waiter import AsyncWaiter
 from ya_gpt_bot.ya_gpt import exceptions as ya_exc
 from ya_gpt_bot.ya_gpt.models.art_generation import ArtGenerationRequest
@@ -155,6 +156,7 @@ class YaGPTClient(GPTClient):
             raise ya_exc.TextGenerationError(
                 response.http_code or response.code or response.grpc_code, response.message
             )
+        report_usage(TokenUsage(self.model, response.usage.inputTextTokens, response.usage.completionTokens))
         return response.alternatives[0].message.text
 
 
@@ -284,6 +286,7 @@ class AsyncYaGPTClient(GPTClient):
             raise ya_exc.TextGenerationError(
                 response.http_code or response.code or response.grpc_code, response.message
             )
+        report_usage(TokenUsage(self.model, response.usage.inputTextTokens, response.usage.completionTokens))
         return response.alternatives[0].message.text
 
 